@@ -1,113 +1,214 @@
 import os
 import sys
 import glob
+import argparse
+import functools
+import threading
 from datetime import datetime
 from pathlib import Path
 from dotenv import load_dotenv
 from .services.pdf_extractor import PDFExtractor
-from .services.ai_analyzer import AIAnalyzer
+from .services.extraction_cache import cache_from_env
+from .services.response_cache import response_cache_from_env
+from .services.ai_analyzer import AIAnalyzer, parse_stats
+from .services.llm_scheduler import shared_scheduler
 from .services.report_generator import ReportGenerator
+from .services.pipeline import Pipeline, Stage
 
-def process_pdf(pdf_path, output_dir, project_id, location):
+# Serializes the multi-line case summaries when several cases finish concurrently
+_print_lock = threading.Lock()
+
+def extract_case(pdf_path, extraction_cache=None):
+    """Extract the case information and content from a PDF.
+
+    Module-level so it can run in a worker process in parallel batch mode.
+    """
+    return PDFExtractor(pdf_path, cache=extraction_cache).parse()
+
+def print_report_summary(audit_report, output_md):
+    """Display a summary of an audit report in the terminal."""
+    print(f"Audit report generated successfully: {output_md}\n")
+    
+    print("=== Case Quality Audit Report ===\n")
+    print(f"Case Number: {audit_report.case_info.case_number}")
+    print(f"Customer: {audit_report.case_info.customer_name}")
+    print(f"Product: {audit_report.case_info.product_name} {audit_report.case_info.product_version}\n")
+    
+    print("Ratings:")
+    print(f"Initial Response: {audit_report.ratings.initial_response}/5")
+    print(f"Problem Diagnosis: {audit_report.ratings.problem_diagnosis}/5")
+    print(f"Technical Accuracy: {audit_report.ratings.technical_accuracy}/5")
+    print(f"Solution Quality: {audit_report.ratings.solution_quality}/5")
+    print(f"Communication: {audit_report.ratings.communication}/5")
+    print(f"Overall Experience: {audit_report.ratings.overall_experience}/5\n")
+    
+    print("Recommendations:")
+    # Format recommendations as individual lines
+    recommendations = audit_report.recommendations.split(".")
+    for rec in recommendations:
+        rec = rec.strip()
+        if rec and not rec.isdigit():
+            # Clean up numbered format if present
+            if rec[0].isdigit() and len(rec) > 1 and rec[1] in ['.', ' ', ')']:
+                rec = rec[2:].strip() if rec[1] in ['.', ')'] else rec[1:].strip()
+            print(f"- {rec}")
+    
+    # Inform user about viewing the Markdown report
+    print(f"\nFor a detailed report with all feedback, see {output_md}")
+    print("You can view this Markdown file in any Markdown viewer or editor.")
+    print("="*60 + "\n")
+
+def analyze_extracted_case(parsed_document, analyzer):
+    """Analyze an extracted case with AI and return its audit report."""
+    case_number = parsed_document.case_info.case_number
+    print(f"Analyzing case {case_number} with AI...")
+    analysis_info = {}
+    audit_report = analyzer.analyze_case(parsed_document.text, parsed_document.case_info,
+                                         analysis_info=analysis_info)
+    token_usage = analysis_info.get("token_usage", {})
+    print(f"Case {case_number}: {analysis_info.get('llm_model')} ({analysis_info.get('prompt_strategy')} prompt), "
+          f"~{token_usage.get('estimated_input_tokens')} input tokens estimated, "
+          f"{token_usage.get('prompt_tokens', 'n/a')} counted, {token_usage.get('output_tokens', 'n/a')} output")
+    return audit_report
+
+def render_report(audit_report, output_dir):
+    """Generate the Markdown report for an audit and display its summary."""
+    # Use the case number in the output filename
+    case_number = audit_report.case_info.case_number
+    output_md = os.path.join(output_dir, f"case_{case_number}_audit.md")
+    
+    print(f"Generating Markdown report for case {case_number}...")
+    report_generator = ReportGenerator(output_md)
+    report_generator.generate_report(audit_report)
+    
+    with _print_lock:
+        print_report_summary(audit_report, output_md)
+    return output_md
+
+def audit_case(parsed_document, output_dir, analyzer):
+    """Analyze an extracted case with AI and generate its Markdown report."""
+    try:
+        audit_report = analyze_extracted_case(parsed_document, analyzer)
+        render_report(audit_report, output_dir)
+        return True
+    except Exception as e:
+        print(f"ERROR: AI analysis failed for case {parsed_document.case_info.case_number}: {str(e)}")
+        print("No audit report will be generated for this case.")
+        print("="*60 + "\n")
+        return False
+
+def process_pdf(pdf_path, output_dir, project_id, location, extraction_cache=None, analyzer=None):
     """Process a single PDF file and generate an audit report."""
     try:
         filename = os.path.basename(pdf_path)
         print(f"Extracting information from PDF: {filename}...")
         
-        # Extract case information from PDF
-        pdf_extractor = PDFExtractor(pdf_path)
-        case_info = pdf_extractor.extract_case_info()
-        case_content = pdf_extractor.extract_text()
-        
-        # Use the case number in the output filename
-        case_number = case_info.case_number
-        output_md = os.path.join(output_dir, f"case_{case_number}_audit.md")
-        
-        # Analyze the case with AI
-        print("Analyzing case with AI...")
-        analyzer = AIAnalyzer(project_id=project_id, location=location)
+        # Extract case information from PDF (parsed once, shared by both lookups)
+        parsed_document = extract_case(pdf_path, extraction_cache)
         
-        try:
-            audit_report = analyzer.analyze_case(case_content, case_info)
-            
-            # Generate the Markdown report
-            print("Generating Markdown report...")
-            report_generator = ReportGenerator(output_md)
-            report_generator.generate_report(audit_report)
-            
-            print(f"Audit report generated successfully: {output_md}\n")
-            
-            # Display a summary in the terminal
-            print("=== Case Quality Audit Report ===\n")
-            print(f"Case Number: {audit_report.case_info.case_number}")
-            print(f"Customer: {audit_report.case_info.customer_name}")
-            print(f"Product: {audit_report.case_info.product_name} {audit_report.case_info.product_version}\n")
-            
-            print("Ratings:")
-            print(f"Initial Response: {audit_report.ratings.initial_response}/5")
-            print(f"Problem Diagnosis: {audit_report.ratings.problem_diagnosis}/5")
-            print(f"Technical Accuracy: {audit_report.ratings.technical_accuracy}/5")
-            print(f"Solution Quality: {audit_report.ratings.solution_quality}/5")
-            print(f"Communication: {audit_report.ratings.communication}/5")
-            print(f"Overall Experience: {audit_report.ratings.overall_experience}/5\n")
-            
-            print("Recommendations:")
-            # Format recommendations as individual lines
-            recommendations = audit_report.recommendations.split(".")
-            for rec in recommendations:
-                rec = rec.strip()
-                if rec and not rec.isdigit():
-                    # Clean up numbered format if present
-                    if rec[0].isdigit() and len(rec) > 1 and rec[1] in ['.', ' ', ')']:
-                        rec = rec[2:].strip() if rec[1] in ['.', ')'] else rec[1:].strip()
-                    print(f"- {rec}")
-            
-            # Inform user about viewing the Markdown report
-            print(f"\nFor a detailed report with all feedback, see {output_md}")
-            print("You can view this Markdown file in any Markdown viewer or editor.")
-            print("="*60 + "\n")
-            
-            return True
-        except Exception as e:
-            print(f"ERROR: AI analysis failed: {str(e)}")
-            print("No audit report will be generated for this case.")
-            print("="*60 + "\n")
-            return False
+        if analyzer is None:
+            analyzer = AIAnalyzer(project_id=project_id, location=location)
+        return audit_case(parsed_document, output_dir, analyzer)
         
     except Exception as e:
         print(f"Error processing case from PDF {os.path.basename(pdf_path)}: {e}")
         return False
 
+def process_pdfs_parallel(pdf_files, output_dir, analyzer, workers, llm_concurrency, extraction_cache=None):
+    """Process PDFs through the extract -> analyze -> render pipeline.
+
+    Returns the (successful, failed) counts. CPU-bound extraction runs in a pool of
+    worker processes, analysis is bounded to llm_concurrency concurrent Gemini calls,
+    and the bounded queues between stages keep extraction from running too far ahead.
+    """
+    counts = {"successful": 0, "failed": 0}
+    counts_lock = threading.Lock()
+    
+    def on_result(pdf_file, output_md):
+        with counts_lock:
+            counts["successful"] += 1
+    
+    def on_error(pdf_file, stage_name, error):
+        with _print_lock:
+            if stage_name == "extract":
+                print(f"Error processing case from PDF {os.path.basename(pdf_file)}: {error}")
+            else:
+                print(f"ERROR: {stage_name} failed for {os.path.basename(pdf_file)}: {error}")
+                print("No audit report will be generated for this case.")
+                print("="*60 + "\n")
+        with counts_lock:
+            counts["failed"] += 1
+    
+    pipeline = Pipeline(
+        [
+            Stage("extract", functools.partial(extract_case, extraction_cache=extraction_cache),
+                  workers=workers, use_processes=True),
+            Stage("analyze", functools.partial(analyze_extracted_case, analyzer=analyzer),
+                  workers=llm_concurrency),
+            Stage("render", functools.partial(render_report, output_dir=output_dir)),
+        ],
+        on_result=on_result,
+        on_error=on_error,
+    )
+    pipeline.run(pdf_files)
+    
+    for stage_name, stage_stats in pipeline.stats().items():
+        print(f"Stage {stage_name}: {stage_stats['completed']} completed, {stage_stats['failed']} failed, "
+              f"{stage_stats['items_per_second']} items/s")
+    scheduler_stats = shared_scheduler().stats()
+    print(f"Gemini calls: {scheduler_stats['calls']}, retries: {scheduler_stats['retries']}, "
+          f"throttled for {scheduler_stats['throttled_seconds']}s")
+    
+    return counts["successful"], counts["failed"]
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Generate quality audit reports for TIBCO case PDFs")
+    parser.add_argument("path", nargs="?", default=None,
+                        help="A case PDF, or a directory of case PDFs (default: PDF_INPUT_DIR from .env)")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Number of processes used to extract PDFs (default: 1, process files one at a time)")
+    parser.add_argument("--llm-concurrency", type=int, default=None,
+                        help="Maximum number of concurrent AI analyses in parallel mode (default: same as --workers)")
+    parser.add_argument("--no-response-cache", action="store_true",
+                        help="Always call the model instead of reusing cached AI responses")
+    return parser.parse_args()
+
 def main():
+    args = parse_args()
+    if args.workers < 1 or (args.llm_concurrency is not None and args.llm_concurrency < 1):
+        print("Error: --workers and --llm-concurrency must be at least 1")
+        sys.exit(1)
+    
     # Load environment variables
     # Look for .env file in the project root directory (one level up from app/)
     root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
     env_path = os.path.join(root_dir, '.env')
     load_dotenv(env_path)
     
-    # Get input directory from environment
-    pdf_input_dir = os.getenv('PDF_INPUT_DIR')
+    # A PDF or directory given on the command line, otherwise the input directory from the environment
+    pdf_input = args.path or os.getenv('PDF_INPUT_DIR')
     
-    if not pdf_input_dir:
-        print("Error: PDF_INPUT_DIR must be set in .env file")
+    if not pdf_input:
+        print("Error: pass a case PDF or directory, or set PDF_INPUT_DIR in .env file")
         print("Please create a .env file based on .env.example")
         sys.exit(1)
     
-    # Check if directory exists
-    if not os.path.isdir(pdf_input_dir):
-        print(f"Error: PDF input directory not found: {pdf_input_dir}")
-        print("Please ensure the directory exists")
-        sys.exit(1)
-    
-    # Find all PDF files in the input directory
-    pdf_files = glob.glob(os.path.join(pdf_input_dir, "*.pdf"))
-    
-    if not pdf_files:
-        print(f"No PDF files found in {pdf_input_dir}")
-        print("Please add TIBCO case PDFs to the directory")
+    if os.path.isfile(pdf_input):
+        pdf_files = [pdf_input]
+    elif os.path.isdir(pdf_input):
+        # Find all PDF files in the input directory
+        pdf_files = glob.glob(os.path.join(pdf_input, "*.pdf"))
+        
+        if not pdf_files:
+            print(f"No PDF files found in {pdf_input}")
+            print("Please add TIBCO case PDFs to the directory")
+            sys.exit(1)
+    else:
+        print(f"Error: PDF file or directory not found: {pdf_input}")
+        print("Please ensure the path exists")
         sys.exit(1)
     
-    print(f"Found {len(pdf_files)} PDF file(s) in {pdf_input_dir}")
+    print(f"Found {len(pdf_files)} PDF file(s) in {pdf_input}")
     
     # Output directory for audit reports
     output_dir = os.path.join(root_dir, "audit_reports")
@@ -119,21 +220,40 @@ def main():
     project_id = os.getenv('PROJECT_ID', 'webfocus-devops')
     location = os.getenv('LOCATION', 'global')
     
-    # Process each PDF file
-    successful = 0
-    failed = 0
+    # Reuse earlier extractions of byte-identical PDFs
+    extraction_cache = cache_from_env(root_dir)
+    
+    # Reuse earlier AI responses for identical prompts
+    response_cache = None if args.no_response_cache else response_cache_from_env(root_dir)
     
-    for pdf_file in pdf_files:
-        print(f"Processing {os.path.basename(pdf_file)}...")
-        if process_pdf(pdf_file, output_dir, project_id, location):
-            successful += 1
-        else:
-            failed += 1
+    # A single analyzer is shared by every case
+    analyzer = AIAnalyzer(project_id=project_id, location=location, response_cache=response_cache)
+    
+    if args.workers > 1:
+        llm_concurrency = args.llm_concurrency or args.workers
+        print(f"Processing with {args.workers} extraction workers and up to {llm_concurrency} concurrent analyses")
+        successful, failed = process_pdfs_parallel(
+            pdf_files, output_dir, analyzer, args.workers, llm_concurrency, extraction_cache
+        )
+    else:
+        # Process each PDF file
+        successful = 0
+        failed = 0
+        
+        for pdf_file in pdf_files:
+            print(f"Processing {os.path.basename(pdf_file)}...")
+            if process_pdf(pdf_file, output_dir, project_id, location, extraction_cache, analyzer):
+                successful += 1
+            else:
+                failed += 1
     
     # Print summary
     print(f"Processing complete! Processed {len(pdf_files)} file(s)")
     print(f"Successful: {successful}")
     print(f"Failed: {failed}")
+    parse_counts = parse_stats.stats()
+    print(f"AI responses parsed: {parse_counts['structured']} structured, {parse_counts['lenient']} repaired, "
+          f"{parse_counts['failed']} unparseable")
     
     # Exit with error code if any processing failed
     if failed > 0:
@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, create_model
 from datetime import datetime
 from typing import List, Optional
 
@@ -32,4 +32,20 @@ class AuditReport(BaseModel):
     communication_feedback: str
     overall_feedback: str
     recommendations: str
-    case_summary: Optional[str] = ""  # A quick highlight of the case - what was the issue and how it was solved 
\ No newline at end of file
+    case_summary: Optional[str] = ""  # A quick highlight of the case - what was the issue and how it was solved 
+
+# The part of an AuditReport the model writes, used as the structured-output schema.
+# Derived from AuditReport so the schema can't drift from the report fields.
+AuditAssessment = create_model(
+    "AuditAssessment",
+    **{name: (field.annotation, ...) for name, field in AuditReport.model_fields.items() if name != "case_info"}
+)
+
+class ParsedDocument(BaseModel):
+    page_texts: List[str]
+    case_info: CaseInfo
+
+    @property
+    def text(self) -> str:
+        """Full document text, one newline-terminated block per page."""
+        return "".join(page + "\n" for page in self.page_texts)
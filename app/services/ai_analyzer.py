@@ -1,22 +1,89 @@
 from google import genai
 from google.genai import types
+import asyncio
 import json
+import os
 import re
-from ..models.audit import AuditReport, AuditRatings, CaseInfo
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, List, Optional
+from pydantic import ValidationError, create_model
+from ..models.audit import AuditAssessment, AuditReport, AuditRatings, CaseInfo
+from .genai_clients import client_registry
+from .response_cache import ResponseCache
+from .prompt_budget import PromptBudget, PromptPlan, budget_from_env, estimate_tokens, truncate_middle
+from .llm_scheduler import LLMScheduler, shared_scheduler
+from .stream_json import IncrementalJSONParser, MalformedStreamError
+
+# Map-reduce analysis: output cap per chunk summary, and the size of the raw excerpt
+# used in place of a summary that could not be generated
+SUMMARY_MAX_OUTPUT_TOKENS = 1024
+FALLBACK_EXCERPT_TOKENS = 1500
+
+# Fields of the model's assessment that are validated, and re-requested when missing or invalid
+RATING_FIELDS = list(AuditRatings.model_fields)
+TEXT_FIELDS = [name for name in AuditAssessment.model_fields if name != "ratings"]
+REPAIR_MAX_OUTPUT_TOKENS = 1024
+FIELD_DESCRIPTIONS = {
+    "initial_response": "rating from 1-5 (5 being best) of how timely and effective the initial response was",
+    "problem_diagnosis": "rating from 1-5 (5 being best) of how effective the approach to diagnosing the issue was",
+    "technical_accuracy": "rating from 1-5 (5 being best) of how accurate and relevant the technical guidance was",
+    "solution_quality": "rating from 1-5 (5 being best) of how effective the solution was",
+    "communication": "rating from 1-5 (5 being best) of how clear, professional and timely the communication was",
+    "overall_experience": "rating from 1-5 (5 being best) of the customer's overall experience",
+    "overall_feedback": "an overall assessment of the support on this case",
+    "recommendations": "3-5 specific, actionable recommendations as a single numbered string",
+    "case_summary": "a brief 3-5 line summary: the main technical issue, how it was resolved, key milestones and the people involved",
+}
+
+class ResponseParseStats:
+    """Process-wide counts of how model responses were parsed into reports.
+
+    "structured" responses validated directly against the AuditAssessment schema,
+    "lenient" ones needed the fence-stripping/regex repair in _clean_json_response,
+    "partial" ones were cut off but kept the fields completed while streaming,
+    "aborted" streams were stopped early as malformed, and "failed" ones could
+    not be parsed at all (the LLM call was wasted).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counts = {"structured": 0, "lenient": 0, "partial": 0, "aborted": 0, "failed": 0}
+
+    def record(self, outcome: str):
+        with self._lock:
+            self.counts[outcome] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = sum(self.counts.values())
+            failures = self.counts["failed"] + self.counts["aborted"]
+            return {**self.counts, "failure_rate": round(failures / total, 4) if total else 0.0}
+
+parse_stats = ResponseParseStats()
 
 class AIAnalyzer:
-    def __init__(self, project_id: str = "webfocus-devops", location: str = "global"):
+    def __init__(self, project_id: str = "webfocus-devops", location: str = "global",
+                 response_cache: Optional[ResponseCache] = None, prompt_budget: Optional[PromptBudget] = None,
+                 map_concurrency: Optional[int] = None, scheduler: Optional[LLMScheduler] = None,
+                 structured_output: Optional[bool] = None):
         self.project_id = project_id
         self.location = location
+        # Picks the model per case (and chunks or truncates oversized cases) from the estimated prompt size
+        self.prompt_budget = prompt_budget or budget_from_env("gemini-2.0-flash-001")
+        self.model_name = self.prompt_budget.model_name
+        self.response_cache = response_cache
+        # Chunk summaries of one case requested at once in map-reduce mode
+        self.map_concurrency = map_concurrency or int(os.getenv('MAP_REDUCE_CONCURRENCY') or '8')
+        # Rate limits, retries and circuit breaking shared by every analyzer in the process
+        self.scheduler = scheduler or shared_scheduler()
+        # Constrain responses to the AuditAssessment JSON schema instead of repairing free-form JSON
+        if structured_output is None:
+            structured_output = os.getenv('GEMINI_STRUCTURED_OUTPUT', 'true').lower() in ('1', 'true', 'yes')
+        self.structured_output = structured_output
         try:
-            # Initialize the Vertex AI client, which will use application default credentials
-            self.client = genai.Client(
-                vertexai=True,
-                project=project_id,
-                location=location,
-            )
-            self.model_name = "gemini-2.0-flash-001"
-            print("Google AI API initialized successfully")
+            # Reuse the process-wide Vertex AI client (and its connections) for this project
+            self.client = client_registry.get_client(project_id, location)
         except Exception as e:
             print(f"Error configuring Google AI API: {e}")
             self.client = None
@@ -51,10 +118,9 @@ class AIAnalyzer:
             except json.JSONDecodeError as e:
                 raise ValueError(f"Failed to parse AI model response as JSON: {e}\nResponse: {text}")
 
-    def analyze_case(self, case_content: str, case_info: CaseInfo) -> AuditReport:
-        """Analyze the case and generate audit report with ratings."""
-        
-        prompt = f"""
+    def _build_prompt(self, case_content: str, case_info: CaseInfo) -> str:
+        """Build the rating prompt for a case."""
+        return f"""
         Please evaluate the quality of support for this TIBCO support case. 
         Analyze the case content below from a quality assurance perspective, focus on:
 
@@ -114,25 +180,45 @@ class AIAnalyzer:
         {case_content}
         """
 
-        # Check if client is available
-        if self.client is None:
-            raise RuntimeError("Google AI client not available. Authentication may have failed.")
-            
-        # Call the Gemini API using the same approach as in case_auditor.py
-        print("Processing AI response...")
-        
-        contents = [
+    def _build_contents(self, case_content: str, case_info: CaseInfo) -> list:
+        """Build the rating prompt for a case as Gemini request contents."""
+        prompt = self._build_prompt(case_content, case_info)
+        return [
             types.Content(
                 role="user",
                 parts=[types.Part(text=prompt)]
             )
         ]
-        
-        generate_content_config = types.GenerateContentConfig(
+
+    def _build_summary_prompt(self, chunk: str, index: int, total: int, case_info: CaseInfo) -> str:
+        """Build the prompt summarizing one part of a case history too long to rate in one pass."""
+        return f"""
+        You are helping audit the quality of support on a TIBCO support case whose history
+        is too long to review in one pass. Below is part {index} of {total} of the case history.
+
+        Summarize this part for the auditor in at most 300 words. Keep:
+        - Who wrote each message (customer or engineer, with names) and when
+        - The technical problem, the diagnostic steps taken and the solutions proposed
+        - Response delays, follow-ups and escalations
+        - The tone and clarity of the engineer's communication
+
+        Reply with the summary text only.
+
+        Case details:
+        Product: {case_info.product_name} {case_info.product_version}
+        Subject: {case_info.subject}
+
+        Case history (part {index} of {total}):
+        {chunk}
+        """
+
+    def _generation_config(self) -> types.GenerateContentConfig:
+        """Generation settings shared by the sync and async analysis paths."""
+        config = types.GenerateContentConfig(
             temperature=0.7,
             top_p=1,
             seed=0,
-            max_output_tokens=2048,
+            max_output_tokens=self.prompt_budget.max_output_tokens,
             response_modalities=["TEXT"],
             safety_settings=[
                 types.SafetySetting(category="HARM_CATEGORY_HATE_SPEECH", threshold="OFF"),
@@ -141,18 +227,527 @@ class AIAnalyzer:
                 types.SafetySetting(category="HARM_CATEGORY_HARASSMENT", threshold="OFF")
             ],
         )
+        if self.structured_output:
+            config.response_mime_type = "application/json"
+            config.response_schema = AuditAssessment
+        return config
+
+    def _summary_config(self) -> types.GenerateContentConfig:
+        return self._generation_config().model_copy(update={
+            "temperature": 0.2,
+            "max_output_tokens": SUMMARY_MAX_OUTPUT_TOKENS,
+            # Summaries are plain text
+            "response_mime_type": None,
+            "response_schema": None,
+        })
+
+    def _check_client(self):
+        # Check if client is available
+        if self.client is None:
+            raise RuntimeError("Google AI client not available. Authentication may have failed.")
+
+    def _plan_request(self, case_content: str, case_info: CaseInfo, analysis_info: Optional[dict]) -> PromptPlan:
+        """Fit the case into the prompt budget."""
+        overhead_tokens = estimate_tokens(self._build_prompt("", case_info))
+        plan = self.prompt_budget.plan(case_content, overhead_tokens)
+        self._record(
+            analysis_info,
+            llm_model=plan.model_name,
+            prompt_strategy=plan.strategy,
+            token_usage={"estimated_input_tokens": plan.estimated_input_tokens,
+                         "omitted_chars": plan.omitted_chars},
+        )
+        return plan
+
+    def _plan_reduce(self, map_plan: PromptPlan, summaries: List[str], case_info: CaseInfo,
+                     analysis_info: Optional[dict]) -> PromptPlan:
+        """Plan the rating request over the chunk summaries of a map-reduce plan."""
+        total = len(summaries)
+        combined = "\n\n".join(
+            f"[Summary of part {index} of {total} of the case history]\n{summary.strip()}"
+            for index, summary in enumerate(summaries, 1)
+        )
+        overhead_tokens = estimate_tokens(self._build_prompt("", case_info))
+        plan = self.prompt_budget.plan(combined, overhead_tokens, allow_map_reduce=False)
+        if analysis_info is not None:
+            analysis_info["llm_model"] = plan.model_name
+            summary_overhead = estimate_tokens(self._build_summary_prompt("", total, total, case_info))
+            map_tokens = sum(summary_overhead + estimate_tokens(chunk) for chunk in map_plan.chunks)
+            analysis_info["token_usage"].update(
+                estimated_input_tokens=map_tokens + plan.estimated_input_tokens,
+                omitted_chars=plan.omitted_chars,
+            )
+        return plan
+
+    @staticmethod
+    def _record_usage(analysis_info: Optional[dict], usage_metadata):
+        """Add the token counts Gemini reported for a call next to the local estimate."""
+        if analysis_info is None or usage_metadata is None:
+            return
+        token_usage = analysis_info.setdefault("token_usage", {})
+        for key, count in (("prompt_tokens", usage_metadata.prompt_token_count),
+                           ("output_tokens", usage_metadata.candidates_token_count),
+                           ("total_tokens", usage_metadata.total_token_count)):
+            token_usage[key] = token_usage.get(key, 0) + (count or 0)
+
+    def _summary_request(self, model_name: str, chunk: str, index: int, total: int, case_info: CaseInfo):
+        """Return (contents, config, cache key) for summarizing one chunk."""
+        prompt = self._build_summary_prompt(chunk, index, total, case_info)
+        contents = [types.Content(role="user", parts=[types.Part(text=prompt)])]
+        config = self._summary_config()
+        cache_key = ResponseCache.make_key(model_name, prompt, config) if self.response_cache else None
+        return contents, config, cache_key
+
+    def _summarize_chunk(self, model_name: str, chunk: str, index: int, total: int,
+                         case_info: CaseInfo, use_cache: bool):
+        """Summarize one chunk; returns (summary or None if every attempt failed, usage metadata)."""
+        contents, config, cache_key = self._summary_request(model_name, chunk, index, total, case_info)
+        if cache_key and use_cache:
+            cached_text = self.response_cache.get(cache_key)
+            if cached_text:
+                return cached_text, None
+        
+        self._check_client()
+        try:
+            response = self.scheduler.call(
+                lambda: self.client.models.generate_content(model=model_name, contents=contents, config=config),
+                self._estimate_request_tokens(contents), f"Summary of part {index} of {total}",
+            )
+        except Exception as e:
+            print(f"Error summarizing part {index} of {total}: {e}")
+            return None, None
+        if not response.text:
+            print(f"Empty summary for part {index} of {total}")
+            return None, response.usage_metadata
+        self._store_response(cache_key, model_name, response.text)
+        return response.text, response.usage_metadata
+
+    async def _summarize_chunk_async(self, model_name: str, chunk: str, index: int, total: int,
+                                     case_info: CaseInfo, use_cache: bool, slots: asyncio.Semaphore):
+        contents, config, cache_key = self._summary_request(model_name, chunk, index, total, case_info)
+        if cache_key and use_cache:
+            cached_text = await asyncio.to_thread(self.response_cache.get, cache_key)
+            if cached_text:
+                return cached_text, None
         
+        self._check_client()
+        async with slots:
+            try:
+                response = await self.scheduler.call_async(
+                    lambda: self.client.aio.models.generate_content(model=model_name, contents=contents, config=config),
+                    self._estimate_request_tokens(contents), f"Summary of part {index} of {total}",
+                )
+            except Exception as e:
+                print(f"Error summarizing part {index} of {total}: {e}")
+                return None, None
+        if not response.text:
+            print(f"Empty summary for part {index} of {total}")
+            return None, response.usage_metadata
+        await asyncio.to_thread(self._store_response, cache_key, model_name, response.text)
+        return response.text, response.usage_metadata
+
+    @staticmethod
+    def _estimate_request_tokens(contents: list) -> int:
+        return sum(estimate_tokens(part.text) for content in contents for part in content.parts if part.text)
+
+    def _stream_response(self, model_name: str, contents: list, config: types.GenerateContentConfig,
+                         on_field: Optional[Callable[[str, Any], None]] = None):
+        """Stream one JSON response, parsing it as it arrives.
+
+        Returns the response text, the token counts reported with it, and the parser
+        holding the fields completed so far. Completed top-level fields are passed to
+        on_field. Once the JSON object is closed the rest of the stream is only read
+        for its token counts, which arrive with the final chunk.
+        """
+        parser = IncrementalJSONParser(strict=self.structured_output)
         # Use the API exactly as in case_auditor.py
         response_text = ""
+        usage_metadata = None
         for chunk in self.client.models.generate_content_stream(
-            model=self.model_name,
+            model=model_name,
             contents=contents,
-            config=generate_content_config,
+            config=config,
         ):
-            response_text += chunk.text
+            # Token counts arrive with the final chunk
+            usage_metadata = chunk.usage_metadata or usage_metadata
+            if not parser.complete:
+                response_text += chunk.text or ""
+                self._feed_parser(parser, chunk.text or "", on_field)
+        return self._streamed_text(response_text, parser), usage_metadata, parser
+
+    async def _stream_response_async(self, model_name: str, contents: list, config: types.GenerateContentConfig,
+                                     on_field: Optional[Callable[[str, Any], None]] = None):
+        parser = IncrementalJSONParser(strict=self.structured_output)
+        response_text = ""
+        usage_metadata = None
+        async for chunk in await self.client.aio.models.generate_content_stream(
+            model=model_name,
+            contents=contents,
+            config=config,
+        ):
+            usage_metadata = chunk.usage_metadata or usage_metadata
+            if not parser.complete:
+                response_text += chunk.text or ""
+                self._feed_parser(parser, chunk.text or "", on_field)
+        return self._streamed_text(response_text, parser), usage_metadata, parser
+
+    @staticmethod
+    def _feed_parser(parser: IncrementalJSONParser, text: str,
+                     on_field: Optional[Callable[[str, Any], None]]) -> bool:
+        """Feed a chunk to the parser; returns True once the JSON object is complete."""
+        try:
+            completed = parser.feed(text)
+        except MalformedStreamError as e:
+            # Stop paying for output that can't be used
+            print(f"Aborting malformed AI response stream: {e}")
+            parse_stats.record("aborted")
+            raise
+        if on_field is not None:
+            for name, value in completed:
+                try:
+                    on_field(name, value)
+                except Exception as e:
+                    print(f"Error in AI response field handler: {e}")
+        return parser.complete
+
+    @staticmethod
+    def _streamed_text(response_text: str, parser: IncrementalJSONParser) -> str:
+        # Once the object is closed, keep just the JSON (without fences or trailing text)
+        return parser.document if parser.complete else response_text
+
+    def _summarize_chunks(self, plan: PromptPlan, case_info: CaseInfo, use_cache: bool,
+                          analysis_info: Optional[dict]) -> List[str]:
+        """Map step: summarize every chunk of the case, up to map_concurrency at once."""
+        total = len(plan.chunks)
+        print(f"Summarizing {total} parts of the case history...")
+        with ThreadPoolExecutor(max_workers=min(self.map_concurrency, total)) as executor:
+            results = list(executor.map(
+                lambda numbered: self._summarize_chunk(plan.model_name, numbered[1], numbered[0], total,
+                                                       case_info, use_cache),
+                enumerate(plan.chunks, 1)
+            ))
+        return self._collect_summaries(plan, results, analysis_info)
+
+    async def _summarize_chunks_async(self, plan: PromptPlan, case_info: CaseInfo, use_cache: bool,
+                                      analysis_info: Optional[dict]) -> List[str]:
+        total = len(plan.chunks)
+        print(f"Summarizing {total} parts of the case history...")
+        slots = asyncio.Semaphore(self.map_concurrency)
+        results = await asyncio.gather(*(
+            self._summarize_chunk_async(plan.model_name, chunk, index, total, case_info, use_cache, slots)
+            for index, chunk in enumerate(plan.chunks, 1)
+        ))
+        return self._collect_summaries(plan, results, analysis_info)
+
+    def _collect_summaries(self, plan: PromptPlan, results: list, analysis_info: Optional[dict]) -> List[str]:
+        """Record chunk usage and fill in failed chunks so one bad call doesn't fail the case."""
+        summaries = []
+        failed = 0
+        for chunk, (summary, usage_metadata) in zip(plan.chunks, results):
+            self._record_usage(analysis_info, usage_metadata)
+            if summary is None:
+                failed += 1
+                excerpt, _ = truncate_middle(chunk, FALLBACK_EXCERPT_TOKENS)
+                summary = f"(No summary available - excerpt of the original text)\n{excerpt}"
+            summaries.append(summary)
+        
+        if failed == len(results):
+            raise RuntimeError("Could not summarize any part of the case history")
+        self._record(analysis_info, map_reduce={"chunks": len(results), "failed_chunks": failed})
+        return summaries
+
+    def _lookup_cached_report(self, model_name: str, contents: list, config: types.GenerateContentConfig,
+                              case_info: CaseInfo, use_cache: bool, analysis_info: Optional[dict]):
+        """Return (cache key, cached report or None), recording the cache outcome in analysis_info."""
+        if self.response_cache is None:
+            self._record(analysis_info, response_cache="disabled")
+            return None, None
+        
+        prompt = "".join(part.text for content in contents for part in content.parts if part.text)
+        cache_key = ResponseCache.make_key(model_name, prompt, config)
+        if not use_cache:
+            # Skip the lookup but still refresh the entry with the new response
+            self._record(analysis_info, response_cache="bypass")
+            return cache_key, None
+        
+        cached_text = self.response_cache.get(cache_key)
+        if cached_text is not None:
+            try:
+                # Counted in parse_stats when the response first arrived
+                report = self._build_report(cached_text, case_info, analysis_info, record_stats=False)
+                print("Using cached AI response")
+                self._record(analysis_info, response_cache="hit")
+                return cache_key, report
+            except Exception as e:
+                print(f"Discarding unusable cached AI response: {e}")
+                self.response_cache.discard(cache_key)
+        
+        self._record(analysis_info, response_cache="miss")
+        return cache_key, None
+
+    def _store_response(self, cache_key: Optional[str], model_name: str, response_text: str):
+        if self.response_cache is not None and cache_key is not None:
+            self.response_cache.put(cache_key, model_name, response_text)
+
+    @staticmethod
+    def _record(analysis_info: Optional[dict], **fields):
+        if analysis_info is not None:
+            analysis_info.update(fields)
+
+    def analyze_case(self, case_content: str, case_info: CaseInfo, use_cache: bool = True,
+                     analysis_info: Optional[dict] = None,
+                     on_field: Optional[Callable[[str, Any], None]] = None) -> AuditReport:
+        """Analyze the case and generate audit report with ratings.
+
+        The model and any truncation are chosen by the prompt budget, and a cached
+        response for the same model, prompt and config is reused unless use_cache
+        is False. Details such as the model, cache outcome and estimated and actual
+        token usage are added to analysis_info when a dict is passed.
+        
+        Cases above the prompt budget's map-reduce threshold are split along
+        interaction boundaries, the parts are summarized concurrently, and the
+        rating prompt runs over the combined summaries.
+        
+        The response is parsed while it streams: on_field(name, value) is called as
+        each top-level field (e.g. "ratings") completes.
+        """
+        plan = self._plan_request(case_content, case_info, analysis_info)
+        if plan.chunks:
+            summaries = self._summarize_chunks(plan, case_info, use_cache, analysis_info)
+            plan = self._plan_reduce(plan, summaries, case_info, analysis_info)
+        contents = self._build_contents(plan.case_content, case_info)
+        config = self._generation_config()
+        cache_key, report = self._lookup_cached_report(plan.model_name, contents, config, case_info,
+                                                       use_cache, analysis_info)
+        if report is not None:
+            self._emit_fields(report, on_field)
+            return report
+        
+        self._check_client()
+        
+        # Call the Gemini API using the same approach as in case_auditor.py, under the
+        # shared rate limits (transient failures such as 429s are retried)
+        print("Processing AI response...")
+        response_text, usage_metadata, parser = self.scheduler.call(
+            lambda: self._stream_response(plan.model_name, contents, config, on_field),
+            self._estimate_request_tokens(contents), f"Analysis of case {case_info.case_number}", analysis_info,
+        )
+        self._record_usage(analysis_info, usage_metadata)
+        
+        result = self._parse_response(response_text, analysis_info, parser)
+        invalid_fields = self._invalid_fields(result)
+        if invalid_fields:
+            # Ask for just the missing fields rather than defaulting them or rerunning the case
+            repair_contents, repair_config = self._repair_request(case_info, response_text, invalid_fields)
+            try:
+                repair_text, usage_metadata, _ = self.scheduler.call(
+                    lambda: self._stream_response(plan.model_name, repair_contents, repair_config),
+                    self._estimate_request_tokens(repair_contents), f"Repair of case {case_info.case_number}",
+                    analysis_info,
+                )
+                self._record_usage(analysis_info, usage_metadata)
+            except Exception as e:
+                print(f"Error requesting missing fields for case {case_info.case_number}: {e}")
+                repair_text = None
+            response_text = self._apply_repair(result, repair_text, invalid_fields, analysis_info)
+            
+        report = self._report_from_result(result, case_info)
+        self._store_response(cache_key, plan.model_name, response_text)
+        return report
+
+    async def analyze_case_async(self, case_content: str, case_info: CaseInfo, use_cache: bool = True,
+                                 analysis_info: Optional[dict] = None,
+                                 on_field: Optional[Callable[[str, Any], None]] = None) -> AuditReport:
+        """Analyze the case with the async streaming API, without blocking the event loop."""
+        plan = self._plan_request(case_content, case_info, analysis_info)
+        if plan.chunks:
+            summaries = await self._summarize_chunks_async(plan, case_info, use_cache, analysis_info)
+            plan = self._plan_reduce(plan, summaries, case_info, analysis_info)
+        contents = self._build_contents(plan.case_content, case_info)
+        config = self._generation_config()
+        # The response cache reads and writes files; keep that off the event loop
+        cache_key, report = await asyncio.to_thread(self._lookup_cached_report, plan.model_name, contents, config,
+                                                    case_info, use_cache, analysis_info)
+        if report is not None:
+            self._emit_fields(report, on_field)
+            return report
+        
+        self._check_client()
+        
+        print("Processing AI response...")
+        response_text, usage_metadata, parser = await self.scheduler.call_async(
+            lambda: self._stream_response_async(plan.model_name, contents, config, on_field),
+            self._estimate_request_tokens(contents), f"Analysis of case {case_info.case_number}", analysis_info,
+        )
+        self._record_usage(analysis_info, usage_metadata)
+        
+        result = self._parse_response(response_text, analysis_info, parser)
+        invalid_fields = self._invalid_fields(result)
+        if invalid_fields:
+            repair_contents, repair_config = self._repair_request(case_info, response_text, invalid_fields)
+            try:
+                repair_text, usage_metadata, _ = await self.scheduler.call_async(
+                    lambda: self._stream_response_async(plan.model_name, repair_contents, repair_config),
+                    self._estimate_request_tokens(repair_contents), f"Repair of case {case_info.case_number}",
+                    analysis_info,
+                )
+                self._record_usage(analysis_info, usage_metadata)
+            except Exception as e:
+                print(f"Error requesting missing fields for case {case_info.case_number}: {e}")
+                repair_text = None
+            response_text = self._apply_repair(result, repair_text, invalid_fields, analysis_info)
             
-        # Parse the response
-        result = self._clean_json_response(response_text)
+        report = self._report_from_result(result, case_info)
+        await asyncio.to_thread(self._store_response, cache_key, plan.model_name, response_text)
+        return report
+
+    @staticmethod
+    def _invalid_fields(result: dict) -> List[str]:
+        """Return the assessment fields that are missing or invalid (ratings as "ratings.<name>").
+
+        Ratings given as numeric strings or whole floats are normalized to ints in place.
+        """
+        invalid = []
+        ratings = result.get("ratings")
+        if not isinstance(ratings, dict):
+            ratings = result["ratings"] = {}
+        for name in RATING_FIELDS:
+            value = ratings.get(name)
+            try:
+                rating = float(value) if not isinstance(value, bool) else None
+            except (TypeError, ValueError):
+                rating = None
+            if rating is None or not rating.is_integer() or not 1 <= rating <= 5:
+                invalid.append(f"ratings.{name}")
+            else:
+                ratings[name] = int(rating)
+        for name in TEXT_FIELDS:
+            value = result.get(name)
+            if isinstance(value, list):
+                value = " ".join(str(item) for item in value)
+            if not isinstance(value, str) or not value.strip():
+                invalid.append(name)
+        return invalid
+
+    def _repair_request(self, case_info: CaseInfo, response_text: str, invalid_fields: List[str]):
+        """Build a follow-up request for only the invalid fields, with the prior response as context."""
+        field_lines = []
+        for field in invalid_fields:
+            name = field.split(".", 1)[-1]
+            description = FIELD_DESCRIPTIONS.get(name) or \
+                f"brief feedback on the {name.replace('_feedback', '').replace('_', ' ')}"
+            field_lines.append(f"- {field}: {description}")
+        field_list = "\n        ".join(field_lines)
+        context = (f"You evaluated the quality of support for TIBCO support case {case_info.case_number} "
+                   f"({case_info.product_name} {case_info.product_version}, subject: {case_info.subject}).")
+        request = f"""
+        Your evaluation above is missing these fields, or gives them invalid values:
+        {field_list}
+
+        Based on your evaluation, reply with JSON containing only these fields. Put ratings
+        inside a "ratings" object, and make every rating a whole number from 1 to 5.
+        """
+        contents = [
+            types.Content(role="user", parts=[types.Part(text=context)]),
+            types.Content(role="model", parts=[types.Part(text=response_text)]),
+            types.Content(role="user", parts=[types.Part(text=request)]),
+        ]
+        
+        update = {"max_output_tokens": REPAIR_MAX_OUTPUT_TOKENS}
+        if self.structured_output:
+            update["response_schema"] = self._repair_schema(invalid_fields)
+        return contents, self._generation_config().model_copy(update=update)
+
+    @staticmethod
+    def _repair_schema(invalid_fields: List[str]):
+        """Response schema holding just the fields being repaired."""
+        rating_names = [field.split(".", 1)[1] for field in invalid_fields if field.startswith("ratings.")]
+        fields = {field: (str, ...) for field in invalid_fields if not field.startswith("ratings.")}
+        if rating_names:
+            ratings_model = create_model("AuditRatingsRepair", **{name: (int, ...) for name in rating_names})
+            fields["ratings"] = (ratings_model, ...)
+        return create_model("AuditAssessmentRepair", **fields)
+
+    def _apply_repair(self, result: dict, repair_text: Optional[str], invalid_fields: List[str],
+                      analysis_info: Optional[dict]) -> str:
+        """Merge the repaired fields into result; returns the merged response JSON for caching."""
+        if repair_text:
+            try:
+                repair = self._clean_json_response(repair_text)
+            except ValueError as e:
+                print(f"Could not parse the repaired fields: {e}")
+                repair = {}
+            repaired_ratings = repair.get("ratings") if isinstance(repair.get("ratings"), dict) else {}
+            for field in invalid_fields:
+                if field.startswith("ratings."):
+                    name = field.split(".", 1)[1]
+                    if name in repaired_ratings:
+                        result["ratings"][name] = repaired_ratings[name]
+                elif field in repair:
+                    result[field] = repair[field]
+        
+        still_invalid = self._invalid_fields(result)
+        print(f"Requested missing fields {invalid_fields}; still invalid: {still_invalid or 'none'}")
+        self._record(analysis_info, repaired_fields=[field for field in invalid_fields if field not in still_invalid])
+        return json.dumps(result)
+
+    def _parse_response(self, response_text: str, analysis_info: Optional[dict] = None,
+                        parser: Optional[IncrementalJSONParser] = None, record_stats: bool = True) -> dict:
+        """Parse the model response into the AuditReport fields it provides.
+
+        If the response can't be parsed as a whole (e.g. it was cut off at the output
+        limit), the fields the stream parser completed are kept so that only the
+        rest has to be requested again. record_stats=False leaves parse_stats alone
+        (for responses replayed from the cache, which were counted when they arrived).
+        """
+        def parsed(outcome):
+            if record_stats:
+                parse_stats.record(outcome)
+            self._record(analysis_info, response_parse=outcome)
+
+        if self.structured_output:
+            try:
+                result = AuditAssessment.model_validate_json(response_text).model_dump()
+                parsed("structured")
+                return result
+            except ValidationError as e:
+                print(f"Structured response failed schema validation, trying lenient parsing: {e}")
+        
+        try:
+            result = self._clean_json_response(response_text)
+        except ValueError:
+            if parser is not None and parser.fields:
+                print(f"AI response incomplete, keeping the {len(parser.fields)} fields completed while streaming")
+                parsed("partial")
+                return dict(parser.fields)
+            parsed("failed")
+            raise
+        parsed("lenient")
+        return result
+
+    @staticmethod
+    def _emit_fields(report: AuditReport, on_field: Optional[Callable[[str, Any], None]]):
+        """Pass a finished report's fields to on_field, as if they had just been streamed."""
+        if on_field is None:
+            return
+        for name, value in report.model_dump(mode="json", include=set(AuditAssessment.model_fields)).items():
+            try:
+                on_field(name, value)
+            except Exception as e:
+                print(f"Error in AI response field handler: {e}")
+
+    def _build_report(self, response_text: str, case_info: CaseInfo,
+                      analysis_info: Optional[dict] = None, record_stats: bool = True) -> AuditReport:
+        """Parse a complete model response (e.g. from the cache) into an AuditReport."""
+        result = self._parse_response(response_text, analysis_info, record_stats=record_stats)
+        return self._report_from_result(result, case_info)
+
+    def _report_from_result(self, result: dict, case_info: CaseInfo) -> AuditReport:
+        """Build the AuditReport from a parsed response; every rating must be valid by now."""
+        invalid_ratings = [field for field in self._invalid_fields(result) if field.startswith("ratings.")]
+        if invalid_ratings:
+            # A made-up default would skew the rating statistics, so fail the analysis instead
+            raise ValueError(f"AI response has no valid value for {', '.join(invalid_ratings)}")
         
         # Debug: Print the raw result to check for case_summary
         print("\nDEBUG - AI Response Keys:", result.keys())
@@ -167,7 +762,7 @@ class AIAnalyzer:
             # Convert list to string
             recommendations = ". ".join(recommendations)
         
-        # Generate a case summary if one wasn't provided by the AI
+        # Generate a case summary if the AI didn't provide one, even when asked again
         case_summary = result.get("case_summary", "")
         if not case_summary:
             # Create a basic summary from available information
@@ -194,14 +789,7 @@ class AIAnalyzer:
         # Debug: Print final report fields
         report = AuditReport(
             case_info=case_info,
-            ratings=AuditRatings(
-                initial_response=result.get("ratings", {}).get("initial_response", 3),
-                problem_diagnosis=result.get("ratings", {}).get("problem_diagnosis", 3),
-                technical_accuracy=result.get("ratings", {}).get("technical_accuracy", 3),
-                solution_quality=result.get("ratings", {}).get("solution_quality", 3),
-                communication=result.get("ratings", {}).get("communication", 3),
-                overall_experience=result.get("ratings", {}).get("overall_experience", 3)
-            ),
+            ratings=AuditRatings(**{name: result["ratings"][name] for name in RATING_FIELDS}),
             initial_response_feedback=result.get("initial_response_feedback", ""),
             problem_diagnosis_feedback=result.get("problem_diagnosis_feedback", ""),
             technical_accuracy_feedback=result.get("technical_accuracy_feedback", ""),
@@ -0,0 +1,63 @@
+import re
+from typing import List
+
+# Lines that start a new customer/engineer interaction in the exported case history:
+# mail headers, comment/activity headers, separator rules and timestamped entries
+INTERACTION_BOUNDARY = re.compile(
+    r"^[ \t]*(?:"
+    r"From:|Sent:|Subject:|"
+    r"(?:Case\s+)?(?:Comment|Email|Activity|Note|Update)s?\b|"
+    r"(?:Created|Posted|Added|Updated)\s+By\b|"
+    r"-{3,}|={3,}|_{3,}|"
+    r"\d{1,2}/\d{1,2}/\d{2,4}[ ,]+\d{1,2}:\d{2}|"
+    r"\d{4}-\d{2}-\d{2}[ T]\d{1,2}:\d{2}"
+    r")",
+    re.IGNORECASE | re.MULTILINE,
+)
+
+def split_interactions(text: str) -> List[str]:
+    """Split a case history into interactions at header lines (the first piece is the preamble)."""
+    starts = [match.start() for match in INTERACTION_BOUNDARY.finditer(text)]
+    if not starts or starts[0] != 0:
+        starts.insert(0, 0)
+    starts.append(len(text))
+    return [text[start:end] for start, end in zip(starts, starts[1:]) if text[start:end].strip()]
+
+def chunk_case_content(text: str, max_chars: int) -> List[str]:
+    """Pack consecutive interactions into chunks of at most max_chars each.
+
+    Interactions are never split unless a single one is larger than a chunk, in which
+    case it is cut at line breaks (or hard-cut if a single line is too long).
+    """
+    max_chars = max(max_chars, 1)
+    chunks = []
+    current = ""
+    for interaction in split_interactions(text):
+        for piece in _split_oversized(interaction, max_chars):
+            if current and len(current) + len(piece) > max_chars:
+                chunks.append(current)
+                current = ""
+            current += piece
+    if current:
+        chunks.append(current)
+    return chunks
+
+def _split_oversized(text: str, max_chars: int) -> List[str]:
+    if len(text) <= max_chars:
+        return [text]
+    pieces = []
+    current = ""
+    for line in text.splitlines(keepends=True):
+        while len(line) > max_chars:
+            if current:
+                pieces.append(current)
+                current = ""
+            pieces.append(line[:max_chars])
+            line = line[max_chars:]
+        if current and len(current) + len(line) > max_chars:
+            pieces.append(current)
+            current = ""
+        current += line
+    if current:
+        pieces.append(current)
+    return pieces
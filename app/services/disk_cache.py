@@ -0,0 +1,79 @@
+import json
+import os
+import tempfile
+from typing import Optional
+
+class JsonFileCache:
+    """Directory of JSON entries, one file per key, bounded by total size.
+
+    Reads refresh an entry's modification time via touch(), and the least recently
+    used entries are evicted once the directory grows past max_bytes. Writes go
+    through a temporary file, so concurrent readers (and other processes sharing
+    the directory) never see a partial entry.
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _entry_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def _read(self, key: str) -> Optional[dict]:
+        try:
+            with open(self._entry_path(key), 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write(self, key: str, entry: dict):
+        try:
+            fd, temp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+            with os.fdopen(fd, 'w') as f:
+                json.dump(entry, f)
+            os.replace(temp_path, self._entry_path(key))
+        except OSError as e:
+            print(f"Error writing cache entry {key} in {self.cache_dir}: {e}")
+            return
+        self._evict()
+
+    def touch(self, key: str):
+        """Mark an entry as recently used for LRU eviction."""
+        try:
+            os.utime(self._entry_path(key))
+        except OSError:
+            pass
+
+    def discard(self, key: str):
+        self._remove(self._entry_path(key))
+
+    def _evict(self):
+        """Remove the least recently used entries until the cache fits in max_bytes."""
+        entries = []
+        total_size = 0
+        for entry in os.scandir(self.cache_dir):
+            if not entry.name.endswith(".json"):
+                continue
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+            total_size += stat.st_size
+
+        if total_size <= self.max_bytes:
+            return
+
+        entries.sort()
+        for _, size, path in entries:
+            if total_size <= self.max_bytes:
+                break
+            self._remove(path)
+            total_size -= size
+
+    def _remove(self, path: str):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
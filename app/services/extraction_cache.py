@@ -0,0 +1,64 @@
+import hashlib
+import os
+from typing import Optional
+from ..models.audit import ParsedDocument
+from .disk_cache import JsonFileCache
+
+# Bump whenever PDFExtractor or the case field specs change what they produce,
+# so entries written by an older extractor are treated as misses
+EXTRACTION_VERSION = "1"
+
+def file_sha256(file_path: str, chunk_size: int = 1024 * 1024) -> str:
+    """Return the hex SHA-256 digest of a file's contents."""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as file:
+        for chunk in iter(lambda: file.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class ExtractionCache(JsonFileCache):
+    """On-disk cache of parsed PDFs keyed by the SHA-256 of the file contents.
+
+    Each entry is a JSON file holding the page texts and the serialized CaseInfo.
+    Hits refresh the entry's modification time, and the least recently used
+    entries are evicted once the cache grows past max_bytes.
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int = 512 * 1024 * 1024):
+        super().__init__(cache_dir, max_bytes)
+
+    def get(self, digest: str) -> Optional[ParsedDocument]:
+        """Return the cached document for a content digest, or None on a miss."""
+        entry = self._read(digest)
+        if entry is None:
+            return None
+
+        if entry.get("version") != EXTRACTION_VERSION:
+            # Written by an older extractor - drop it so it gets re-extracted
+            self.discard(digest)
+            return None
+
+        try:
+            document = ParsedDocument.model_validate(entry["document"])
+        except Exception as e:
+            print(f"Discarding unreadable extraction cache entry {digest}: {e}")
+            self.discard(digest)
+            return None
+
+        self.touch(digest)
+        return document
+
+    def put(self, digest: str, document: ParsedDocument):
+        """Store a parsed document under its content digest."""
+        self._write(digest, {
+            "version": EXTRACTION_VERSION,
+            "document": document.model_dump(mode="json"),
+        })
+
+def cache_from_env(root_dir: str) -> Optional[ExtractionCache]:
+    """Build the extraction cache configured by EXTRACTION_CACHE_DIR / EXTRACTION_CACHE_MAX_MB."""
+    cache_dir = os.getenv('EXTRACTION_CACHE_DIR') or os.path.join(root_dir, "extraction_cache")
+    max_mb = int(os.getenv('EXTRACTION_CACHE_MAX_MB') or '512')
+    if max_mb <= 0:
+        return None
+    return ExtractionCache(cache_dir, max_bytes=max_mb * 1024 * 1024)
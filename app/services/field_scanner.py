@@ -0,0 +1,129 @@
+import re
+from typing import Dict, Iterable, Optional
+
+class FieldSpec:
+    """Describes one field extracted by the FieldScanner.
+
+    Every field is located through a literal `anchor` keyword. A pattern field
+    (`pattern` given) is matched at each occurrence of its anchor and keeps the
+    first match, like re.search would. A line field (`pattern` is None) takes the
+    value after the colon on the first line containing its anchor, provided the
+    value is at least `min_length` characters long.
+    """
+
+    def __init__(self, name: str, anchor: str, pattern: Optional[str] = None, flags: int = 0,
+                 ignore_case: bool = False, min_length: int = 1, fallback_for: Optional[str] = None):
+        self.name = name
+        self.anchor = anchor
+        self.regex = re.compile(pattern, flags) if pattern else None
+        self.ignore_case = ignore_case
+        self.min_length = min_length
+        # A fallback field is no longer needed once the field it backs up is found
+        self.fallback_for = fallback_for
+
+    @property
+    def is_line_field(self) -> bool:
+        return self.regex is None
+
+def value_after_colon(line: str) -> str:
+    """Safely extract value after the colon, handling multiple colons."""
+    parts = line.split(':')
+    if len(parts) > 1:
+        return ':'.join(parts[1:]).strip()
+    return ""
+
+# ASCII-only lowercasing keeps every character position unchanged
+_ASCII_LOWER = str.maketrans("ABCDEFGHIJKLMNOPQRSTUVWXYZ", "abcdefghijklmnopqrstuvwxyz")
+
+class FieldScanner:
+    """Finds all configured fields in a single pass over the document text.
+
+    All anchors are compiled into one plain alternation of lowercase keywords and
+    run over a lowercased copy of the text, so the text is scanned once and each
+    field's full pattern only runs at the few positions where its anchor occurs.
+    Specs sharing a keyword are tried in the order they were given.
+    """
+
+    def __init__(self, specs: Iterable[FieldSpec]):
+        self.specs = list(specs)
+        self._line_specs = [spec for spec in self.specs if spec.is_line_field]
+
+        # Group specs by lowercase keyword; case-sensitive anchors are re-checked per hit
+        self._groups = {}
+        for spec in self.specs:
+            self._groups.setdefault(spec.anchor.translate(_ASCII_LOWER), []).append(spec)
+
+    def _anchor_regex(self, keywords) -> re.Pattern:
+        # Longest keywords first so the most specific anchor wins at a shared position.
+        # Named groups or inline flags would disable the regex engine's literal prefix
+        # scan, so hits are mapped back to their specs through the matched keyword.
+        ordered = sorted(keywords, key=len, reverse=True)
+        return re.compile("|".join(re.escape(keyword) for keyword in ordered))
+
+    def _active_keywords(self, pending: set) -> set:
+        return {keyword for keyword, group in self._groups.items()
+                if any(spec.name in pending for spec in group)}
+
+    def scan(self, text: str) -> Dict[str, object]:
+        """Scan the text once, returning the match (pattern fields) or value (line fields) per found field."""
+        results = {}
+        pending = {spec.name for spec in self.specs}
+        lowered = text.translate(_ASCII_LOWER)
+        last_line_start = -1
+
+        # Keywords whose fields are all resolved are dropped from the alternation,
+        # so the rest of the scan only stops where an unresolved field may start
+        keywords = self._active_keywords(pending)
+        anchor_regex = self._anchor_regex(keywords)
+        position = 0
+
+        while keywords:
+            hit = anchor_regex.search(lowered, position)
+            if not hit:
+                break
+            position = hit.end()
+            hit_start = hit.start()
+            group = self._groups[hit.group()]
+            pending_before = len(pending)
+
+            for spec in group:
+                if spec.is_line_field or spec.name not in pending:
+                    continue
+                if not spec.ignore_case and not text.startswith(spec.anchor, hit_start):
+                    continue
+                match = spec.regex.match(text, hit_start)
+                if match:
+                    self._resolve(spec.name, match, results, pending)
+
+            # Line fields are evaluated once per line, whichever anchor found the line
+            if any(spec.is_line_field and spec.name in pending for spec in group):
+                line_start = text.rfind('\n', 0, hit_start) + 1
+                if line_start != last_line_start:
+                    last_line_start = line_start
+                    line_end = text.find('\n', hit_start)
+                    if line_end == -1:
+                        line_end = len(text)
+                    self._scan_line(text[line_start:line_end].strip(), results, pending)
+
+            if len(pending) != pending_before:
+                keywords = self._active_keywords(pending)
+                anchor_regex = self._anchor_regex(keywords)
+
+        return results
+
+    def _scan_line(self, line: str, results: dict, pending: set):
+        # The first pending line field whose anchor is on the line claims it,
+        # even when its value turns out to be too short
+        for spec in self._line_specs:
+            if spec.anchor in line and spec.name in pending:
+                value = value_after_colon(line)
+                if len(value) >= spec.min_length:
+                    self._resolve(spec.name, value, results, pending)
+                break
+
+    def _resolve(self, name: str, value, results: dict, pending: set):
+        results[name] = value
+        pending.discard(name)
+        for spec in self.specs:
+            if spec.fallback_for == name:
+                pending.discard(spec.name)
@@ -0,0 +1,63 @@
+import threading
+from google import genai
+
+class GenAIClientRegistry:
+    """Process-wide registry of Vertex AI clients keyed by (project, location).
+
+    Creating a genai.Client repeats credential discovery and starts with a cold HTTP
+    connection pool, so clients are created once and shared by every analyzer.
+    Clients are safe to use from several threads at once.
+    """
+
+    def __init__(self):
+        self._clients = {}
+        self._lock = threading.Lock()
+        self.created = 0
+        self.reused = 0
+        self.failed = 0
+
+    def get_client(self, project_id: str, location: str) -> genai.Client:
+        """Return the shared client for a project and location, creating it on first use."""
+        key = (project_id, location)
+        with self._lock:
+            client = self._clients.get(key)
+            if client is not None:
+                self.reused += 1
+                return client
+
+            try:
+                # Uses application default credentials
+                client = genai.Client(
+                    vertexai=True,
+                    project=project_id,
+                    location=location,
+                )
+            except Exception:
+                # Not cached, so the next analyzer retries the setup
+                self.failed += 1
+                raise
+            self._clients[key] = client
+            self.created += 1
+            print(f"Google AI API initialized successfully for {project_id}/{location}")
+            return client
+
+    def warm_up(self, project_id: str, location: str) -> bool:
+        """Create the client ahead of the first case; returns False if setup failed."""
+        try:
+            self.get_client(project_id, location)
+            return True
+        except Exception as e:
+            print(f"Error warming up Google AI client: {e}")
+            return False
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "clients": [f"{project}/{location}" for project, location in self._clients],
+                "created": self.created,
+                "reused": self.reused,
+                "failed": self.failed,
+            }
+
+# Shared by every AIAnalyzer in the process
+client_registry = GenAIClientRegistry()
@@ -0,0 +1,143 @@
+import asyncio
+import bisect
+import inspect
+import json
+import threading
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Awaitable, Callable, Optional, Tuple, Union
+
+# Events that end a job's stream
+TERMINAL_EVENTS = ("done", "failed")
+
+class JobEventBroker:
+    """In-memory log of per-job progress events with async subscribers.
+
+    Pipeline threads publish events; subscribers (SSE responses on the API's event
+    loop) replay the events they missed, then wait for new ones. Event ids increase
+    per job, so a reconnecting client resumes after its Last-Event-ID. Events
+    relayed from elsewhere (e.g. a job store's event log) keep their own ids; an id
+    the broker already has is ignored, so overlapping relays are harmless. Only the
+    most recent max_jobs jobs are kept.
+    """
+
+    def __init__(self, max_jobs: int = 1000):
+        self.max_jobs = max_jobs
+        self._lock = threading.Lock()
+        self._events = OrderedDict()  # job_id -> [(event_id, event, data)]
+        self._waiters = {}  # job_id -> set of (loop, asyncio.Event)
+
+    def publish(self, job_id: str, event: str, data: Optional[dict] = None, event_id: Optional[int] = None):
+        """Record an event for a job and wake its subscribers (safe to call from any thread)."""
+        with self._lock:
+            events = self._events.get(job_id)
+            if events is None:
+                events = self._events[job_id] = []
+                while len(self._events) > self.max_jobs:
+                    self._events.popitem(last=False)
+            if event_id is None:
+                event_id = events[-1][0] + 1 if events else 1
+            index = bisect.bisect_left([entry[0] for entry in events], event_id)
+            if index < len(events) and events[index][0] == event_id:
+                return
+            events.insert(index, (event_id, event, data or {}))
+            waiters = list(self._waiters.get(job_id, ()))
+        for loop, wakeup in waiters:
+            loop.call_soon_threadsafe(wakeup.set)
+
+    def has_events(self, job_id: str) -> bool:
+        with self._lock:
+            return job_id in self._events
+
+    async def subscribe(self, job_id: str, last_event_id: int = 0,
+                        keepalive: float = 15.0) -> AsyncIterator[Optional[Tuple[int, str, Any]]]:
+        """Yield a job's events after last_event_id until a terminal event.
+
+        Yields None every `keepalive` seconds without events, so the caller can
+        keep the connection alive.
+        """
+        loop = asyncio.get_running_loop()
+        waiter = (loop, asyncio.Event())
+        with self._lock:
+            self._waiters.setdefault(job_id, set()).add(waiter)
+        try:
+            while True:
+                waiter[1].clear()
+                with self._lock:
+                    pending = [entry for entry in self._events.get(job_id, ()) if entry[0] > last_event_id]
+                for entry in pending:
+                    last_event_id = entry[0]
+                    yield entry
+                    if entry[1] in TERMINAL_EVENTS:
+                        return
+                if not pending:
+                    try:
+                        await asyncio.wait_for(waiter[1].wait(), timeout=keepalive)
+                    except asyncio.TimeoutError:
+                        yield None
+        finally:
+            with self._lock:
+                waiters = self._waiters.get(job_id)
+                if waiters is not None:
+                    waiters.discard(waiter)
+                    if not waiters:
+                        del self._waiters[job_id]
+
+class ChangeNotifier:
+    """Lets async callers wait for something keyed (e.g. a job record) to change.
+
+    Writers call notify(key) after changing the value, from any thread.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._waiters = {}  # key -> set of (loop, asyncio.Event)
+
+    def notify(self, key):
+        with self._lock:
+            waiters = list(self._waiters.get(key, ()))
+        for loop, wakeup in waiters:
+            loop.call_soon_threadsafe(wakeup.set)
+
+    async def wait_for(self, key, predicate: Callable[[], Union[bool, Awaitable[bool]]], timeout: float,
+                       poll_interval: Optional[float] = None) -> bool:
+        """Wait up to timeout seconds for predicate() to hold, re-checking it on every notify(key).
+
+        predicate may be a coroutine function, e.g. one that reads a store in a
+        thread so the event loop isn't blocked. With poll_interval, predicate()
+        is also re-checked that often, to notice changes made where notify()
+        isn't called (e.g. by another process).
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        waiter = (loop, asyncio.Event())
+        with self._lock:
+            self._waiters.setdefault(key, set()).add(waiter)
+        try:
+            while True:
+                # Clear before checking, so a change made after the check still wakes us
+                waiter[1].clear()
+                result = predicate()
+                if inspect.isawaitable(result):
+                    result = await result
+                if result:
+                    return True
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    return False
+                if poll_interval:
+                    remaining = min(remaining, poll_interval)
+                try:
+                    await asyncio.wait_for(waiter[1].wait(), timeout=remaining)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            with self._lock:
+                waiters = self._waiters.get(key)
+                if waiters is not None:
+                    waiters.discard(waiter)
+                    if not waiters:
+                        del self._waiters[key]
+
+def format_sse(event_id: int, event: str, data: Any) -> str:
+    """Encode one server-sent event."""
+    return f"id: {event_id}\nevent: {event}\ndata: {json.dumps(data)}\n\n"
@@ -0,0 +1,788 @@
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows: the JSON store is then only safe within one process
+    fcntl = None
+
+class JobStore(ABC):
+    """Persistent storage for job records (plain dicts keyed by job id).
+
+    Implementations must be safe to use from multiple threads and from multiple
+    processes sharing the same storage (e.g. uvicorn and job workers). Every save
+    or update bumps the record's "version". Records are stored as given; callers
+    handle any path conversion.
+
+    Pending jobs double as a durable work queue: workers claim them with a lease
+    (lease_owner/lease_expires fields) that they keep extending with heartbeats,
+    and jobs whose lease ran out are requeued. Progress events for each job are
+    kept alongside, numbered by a store-wide increasing event id.
+
+    Concurrent submissions of the same case are coalesced (single-flight): a job
+    whose case number or content hash matches an active job is attached to it
+    (attached_to field) instead of being processed, and receives its result.
+    """
+
+    @abstractmethod
+    def get(self, job_id: str) -> Optional[dict]:
+        """The job's record, or None if there is no such job."""
+
+    @abstractmethod
+    def save(self, job_id: str, job_info: dict) -> dict:
+        """Insert or replace a job; returns the stored record."""
+
+    @abstractmethod
+    def save_many(self, jobs: Dict[str, dict]):
+        """Insert or replace jobs as they are, keeping their versions (for bulk loads)."""
+
+    @abstractmethod
+    def update(self, job_id: str, fields: dict, expected: Optional[dict] = None) -> Optional[dict]:
+        """Atomically merge fields into a job; returns the updated record.
+
+        With expected, the update only happens if the job currently has those field
+        values (e.g. the lease_owner of the worker making the update). Returns None
+        if the job doesn't exist or didn't match.
+        """
+
+    @abstractmethod
+    def delete(self, job_ids: Iterable[str]) -> int:
+        """Delete jobs; returns how many existed."""
+
+    @abstractmethod
+    def clear(self) -> int:
+        """Delete every job; returns how many there were."""
+
+    @abstractmethod
+    def find(self, case_number: Optional[str] = None, status: Optional[str] = None,
+             content_hash: Optional[str] = None) -> Dict[str, dict]:
+        """Jobs matching all the given filters (all jobs if none are given), in the order they were created."""
+
+    def all(self) -> Dict[str, dict]:
+        return self.find()
+
+    @abstractmethod
+    def count(self) -> int:
+        """Number of jobs in the store."""
+
+    @abstractmethod
+    def claim_next(self, worker_id: str, lease_seconds: float) -> Optional[Tuple[str, dict]]:
+        """Lease the oldest pending job to worker_id (status -> processing); None if there is none."""
+
+    @abstractmethod
+    def heartbeat(self, job_ids: Iterable[str], worker_id: str, lease_seconds: float) -> List[str]:
+        """Extend worker_id's leases on job_ids; returns the ids it still holds."""
+
+    @abstractmethod
+    def requeue_expired(self, max_attempts: int) -> Tuple[List[str], List[str]]:
+        """Requeue processing jobs whose lease ran out (or that never had one).
+
+        Jobs that have already been claimed max_attempts times are failed instead.
+        Attached jobs whose leader is no longer active are requeued too. Returns the
+        ids of the requeued and of the failed jobs.
+        """
+
+    @abstractmethod
+    def create_unless_active(self, job_id: str, job_info: dict) -> Optional[str]:
+        """Save job_info as a new job, unless an active job has its case number or content hash.
+
+        Returns that job's id instead (nothing is saved), or None once the job is saved.
+        """
+
+    @abstractmethod
+    def update_or_attach(self, job_id: str, fields: dict, expected: Optional[dict] = None) -> Optional[dict]:
+        """Like update(), for fields (e.g. the case number found by parsing) that may reveal a duplicate.
+
+        If another active job already has the resulting case number or content hash,
+        job_id is also attached to it: its record gets attached_to, goes back to
+        pending and releases its lease, to be completed by finish_attached.
+        """
+
+    @abstractmethod
+    def finish_attached(self, leader_id: str, fields: dict) -> List[str]:
+        """Apply fields (the leader's outcome) to the jobs attached to leader_id; returns their ids."""
+
+    @abstractmethod
+    def queue_stats(self) -> dict:
+        """Job counts by status, plus the number of expired leases."""
+
+    @abstractmethod
+    def append_event(self, job_id: str, event: str, data: Any) -> int:
+        """Record a progress event for a job; returns its event id."""
+
+    @abstractmethod
+    def events_after(self, after_id: int, job_id: Optional[str] = None,
+                     limit: int = 1000) -> List[Tuple[int, str, str, Any]]:
+        """(event_id, job_id, event, data) for events after after_id, oldest first."""
+
+    @abstractmethod
+    def last_event_id(self) -> int:
+        """Id of the latest event recorded (also if it has since been removed), 0 if none."""
+
+    @abstractmethod
+    def prune_events(self, max_age_seconds: float) -> int:
+        """Delete events older than max_age_seconds; returns how many."""
+
+def _versioned(current: Optional[dict], job_info: dict) -> dict:
+    """job_info as the record replacing current, with the version bumped past both."""
+    record = dict(job_info)
+    record["version"] = max((current or {}).get("version", 0), job_info.get("version", 0)) + 1
+    return record
+
+def _merge(current: dict, fields: dict) -> dict:
+    """The record after applying fields to current, with its version bumped."""
+    return _versioned(current, {**current, **fields})
+
+def _matches(record: Optional[dict], expected: Optional[dict]) -> bool:
+    return record is not None and all(record.get(name) == value for name, value in (expected or {}).items())
+
+def _claimed(record: dict, worker_id: str, lease_seconds: float, now: float) -> dict:
+    return _merge(record, {"status": "processing", "lease_owner": worker_id,
+                           "lease_expires": now + lease_seconds, "attempts": record.get("attempts", 0) + 1})
+
+def _lease_expired(record: dict, now: float) -> bool:
+    return record.get("status") == "processing" and (record.get("lease_expires") or 0) < now
+
+# Jobs that are queued or being processed, i.e. that a new submission can attach to
+ACTIVE_STATUSES = ("pending", "processing")
+
+def _leader(candidates: Iterable[Tuple[str, dict]], job_id: str, record: dict) -> Optional[str]:
+    """First active, unattached job other than job_id with record's case number or content hash."""
+    for candidate_id, candidate in candidates:
+        if (candidate_id != job_id and candidate.get("status") in ACTIVE_STATUSES
+                and not candidate.get("attached_to")
+                and ((record.get("case_number") and candidate.get("case_number") == record.get("case_number"))
+                     or (record.get("content_hash") and candidate.get("content_hash") == record.get("content_hash")))):
+            return candidate_id
+    return None
+
+def _attached(record: dict, leader_id: str) -> dict:
+    # Not _merge: the record passed in already has its version bumped
+    return {**record, "status": "pending", "attached_to": leader_id, "lease_owner": None, "lease_expires": None}
+
+def _abandoned(record: dict, max_attempts: int) -> dict:
+    """The record of a job whose worker went away: back in the queue, or failed if it keeps dying."""
+    fields = {"lease_owner": None, "lease_expires": None}
+    if record.get("attempts", 0) >= max_attempts:
+        fields.update(status="failed", error=f"Abandoned after {record.get('attempts', 0)} attempts "
+                                             "(the worker processing it stopped responding)")
+    else:
+        fields["status"] = "pending"
+    return _merge(record, fields)
+
+class CaseNumberIndex:
+    """Secondary index from case number to the ids of that case's jobs, in insertion order.
+
+    Kept in step with an in-memory jobs dict by calling set() on every insert or
+    update and remove() on every delete. Not thread-safe by itself; guard it with
+    the lock that guards the jobs.
+    """
+
+    def __init__(self):
+        self._jobs_by_case: Dict[str, Dict[str, None]] = {}
+        self._case_by_job: Dict[str, str] = {}
+
+    def set(self, job_id: str, case_number: Optional[str]):
+        """Record a job's current case number (None if it doesn't have one yet)."""
+        if self._case_by_job.get(job_id) == case_number:
+            return
+        self.remove(job_id)
+        if case_number:
+            self._case_by_job[job_id] = case_number
+            self._jobs_by_case.setdefault(case_number, {})[job_id] = None
+
+    def remove(self, job_id: str):
+        case_number = self._case_by_job.pop(job_id, None)
+        if case_number is not None:
+            job_ids = self._jobs_by_case[case_number]
+            del job_ids[job_id]
+            if not job_ids:
+                del self._jobs_by_case[case_number]
+
+    def clear(self):
+        self._jobs_by_case.clear()
+        self._case_by_job.clear()
+
+    def job_ids(self, case_number: str) -> List[str]:
+        return list(self._jobs_by_case.get(case_number, ()))
+
+    def case_numbers(self) -> List[str]:
+        return list(self._jobs_by_case)
+
+    def __len__(self) -> int:
+        return len(self._jobs_by_case)
+
+class JsonFileJobStore(JobStore):
+    """All jobs in one JSON file, rewritten on every change (the original storage).
+
+    Every operation holds an exclusive lock on a companion .lock file and reloads
+    the file if another process changed it; writes replace the file atomically.
+    Events go to a companion .events.jsonl file, numbered by a counter kept in
+    an .events.seq file, so event ids keep increasing even after events are
+    deleted or pruned. Every save still costs O(total
+    jobs) of I/O, so this only suits small installations. On platforms without
+    fcntl it is only safe within one process.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._jobs: Dict[str, dict] = {}
+        self._index = CaseNumberIndex()
+        self._loaded_stamp = None
+        self.events_path = path + ".events.jsonl"
+        self.event_seq_path = path + ".events.seq"
+
+    def _stamp(self):
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    @contextmanager
+    def _locked(self):
+        with self._lock, open(self.path + ".lock", 'a') as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            stamp = self._stamp()
+            if stamp != self._loaded_stamp:
+                self._reload()
+                self._loaded_stamp = stamp
+            yield
+
+    def _reload(self):
+        self._jobs = {}
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, 'r') as f:
+                    self._jobs = json.load(f)
+            except Exception as e:
+                print(f"Error loading jobs: {e}")
+        self._index.clear()
+        for job_id, job_info in self._jobs.items():
+            self._index.set(job_id, job_info.get("case_number"))
+
+    def _set(self, job_id: str, job_info: dict):
+        self._jobs[job_id] = job_info
+        self._index.set(job_id, job_info.get("case_number"))
+
+    def _flush(self):
+        try:
+            fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(self.path) or ".", suffix=".tmp")
+            with os.fdopen(fd, 'w') as f:
+                json.dump(self._jobs, f, indent=2)
+            os.replace(temp_path, self.path)
+            self._loaded_stamp = self._stamp()
+        except Exception as e:
+            print(f"Error saving jobs: {e}")
+
+    def get(self, job_id):
+        with self._locked():
+            job_info = self._jobs.get(job_id)
+            return dict(job_info) if job_info is not None else None
+
+    def save(self, job_id, job_info):
+        with self._locked():
+            record = _versioned(self._jobs.get(job_id), job_info)
+            self._set(job_id, record)
+            self._flush()
+            return dict(record)
+
+    def save_many(self, jobs):
+        with self._locked():
+            for job_id, job_info in jobs.items():
+                self._set(job_id, dict(job_info))
+            self._flush()
+
+    def update(self, job_id, fields, expected=None):
+        with self._locked():
+            current = self._jobs.get(job_id)
+            if not _matches(current, expected):
+                return None
+            record = _merge(current, fields)
+            self._set(job_id, record)
+            self._flush()
+            return dict(record)
+
+    def delete(self, job_ids):
+        with self._locked():
+            deleted_ids = set()
+            for job_id in job_ids:
+                if self._jobs.pop(job_id, None) is not None:
+                    self._index.remove(job_id)
+                    deleted_ids.add(job_id)
+            if deleted_ids:
+                self._flush()
+                self._write_events([entry for entry in self._read_events() if entry[1] not in deleted_ids])
+            return len(deleted_ids)
+
+    def clear(self):
+        with self._locked():
+            count = len(self._jobs)
+            self._jobs = {}
+            self._index.clear()
+            self._flush()
+            self._write_events([])
+            return count
+
+    def find(self, case_number=None, status=None, content_hash=None):
+        with self._locked():
+            job_ids = self._index.job_ids(case_number) if case_number is not None else list(self._jobs)
+            return {
+                job_id: dict(self._jobs[job_id]) for job_id in job_ids
+                if (status is None or self._jobs[job_id].get("status") == status)
+                and (content_hash is None or self._jobs[job_id].get("content_hash") == content_hash)
+            }
+
+    def count(self):
+        with self._locked():
+            return len(self._jobs)
+
+    def claim_next(self, worker_id, lease_seconds):
+        with self._locked():
+            for job_id, job_info in self._jobs.items():
+                if job_info.get("status") == "pending" and not job_info.get("attached_to"):
+                    record = _claimed(job_info, worker_id, lease_seconds, time.time())
+                    self._set(job_id, record)
+                    self._flush()
+                    return job_id, dict(record)
+            return None
+
+    def heartbeat(self, job_ids, worker_id, lease_seconds):
+        with self._locked():
+            held = []
+            for job_id in job_ids:
+                job_info = self._jobs.get(job_id)
+                if _matches(job_info, {"status": "processing", "lease_owner": worker_id}):
+                    # Not a change clients care about, so the version stays
+                    job_info["lease_expires"] = time.time() + lease_seconds
+                    held.append(job_id)
+            if held:
+                self._flush()
+            return held
+
+    def requeue_expired(self, max_attempts):
+        with self._locked():
+            now = time.time()
+            requeued, failed = [], []
+            for job_id, job_info in list(self._jobs.items()):
+                if _lease_expired(job_info, now):
+                    record = _abandoned(job_info, max_attempts)
+                    self._set(job_id, record)
+                    (failed if record["status"] == "failed" else requeued).append(job_id)
+                elif job_info.get("attached_to") and job_info.get("status") == "pending":
+                    leader = self._jobs.get(job_info["attached_to"])
+                    if leader is None or leader.get("status") not in ACTIVE_STATUSES:
+                        self._set(job_id, _merge(job_info, {"attached_to": None}))
+                        requeued.append(job_id)
+            if requeued or failed:
+                self._flush()
+            return requeued, failed
+
+    def create_unless_active(self, job_id, job_info):
+        with self._locked():
+            leader_id = _leader(self._jobs.items(), job_id, job_info)
+            if leader_id is not None:
+                return leader_id
+            self._set(job_id, _versioned(self._jobs.get(job_id), job_info))
+            self._flush()
+            return None
+
+    def update_or_attach(self, job_id, fields, expected=None):
+        with self._locked():
+            current = self._jobs.get(job_id)
+            if not _matches(current, expected):
+                return None
+            record = _merge(current, fields)
+            leader_id = _leader(self._jobs.items(), job_id, record)
+            if leader_id is not None:
+                record = _attached(record, leader_id)
+            self._set(job_id, record)
+            self._flush()
+            return dict(record)
+
+    def finish_attached(self, leader_id, fields):
+        with self._locked():
+            attached = [job_id for job_id, job_info in self._jobs.items()
+                        if job_info.get("attached_to") == leader_id and job_info.get("status") == "pending"]
+            for job_id in attached:
+                self._set(job_id, _merge(self._jobs[job_id], {**fields, "attached_to": None}))
+            if attached:
+                self._flush()
+            return attached
+
+    def queue_stats(self):
+        with self._locked():
+            now = time.time()
+            stats = {}
+            for job_info in self._jobs.values():
+                status = job_info.get("status") or "unknown"
+                stats[status] = stats.get(status, 0) + 1
+            stats["expired_leases"] = sum(_lease_expired(job_info, now) for job_info in self._jobs.values())
+            return stats
+
+    def _read_events(self) -> List[list]:
+        if not os.path.exists(self.events_path):
+            return []
+        with open(self.events_path, 'r') as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+    def _write_events(self, events: List[list]):
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(self.events_path) or ".", suffix=".tmp")
+        with os.fdopen(fd, 'w') as f:
+            for entry in events:
+                f.write(json.dumps(entry) + "\n")
+        os.replace(temp_path, self.events_path)
+
+    def _last_event_id(self) -> int:
+        try:
+            with open(self.event_seq_path, 'r') as f:
+                return int(f.read())
+        except (OSError, ValueError):
+            # No counter yet (events file from before it was kept): continue from the last event
+            events = self._read_events()
+            return events[-1][0] if events else 0
+
+    def append_event(self, job_id, event, data):
+        with self._locked():
+            event_id = self._last_event_id() + 1
+            fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(self.event_seq_path) or ".", suffix=".tmp")
+            with os.fdopen(fd, 'w') as f:
+                f.write(str(event_id))
+            os.replace(temp_path, self.event_seq_path)
+            with open(self.events_path, 'a') as f:
+                f.write(json.dumps([event_id, job_id, event, data, time.time()]) + "\n")
+            return event_id
+
+    def events_after(self, after_id, job_id=None, limit=1000):
+        with self._locked():
+            events = [(entry[0], entry[1], entry[2], entry[3]) for entry in self._read_events()
+                      if entry[0] > after_id and (job_id is None or entry[1] == job_id)]
+            return events[:limit]
+
+    def last_event_id(self):
+        with self._locked():
+            return self._last_event_id()
+
+    def prune_events(self, max_age_seconds):
+        with self._locked():
+            events = self._read_events()
+            cutoff = time.time() - max_age_seconds
+            kept = [entry for entry in events if entry[4] >= cutoff]
+            if len(kept) < len(events):
+                self._write_events(kept)
+            return len(events) - len(kept)
+
+class SQLiteJobStore(JobStore):
+    """Jobs in an embedded SQLite database, one row per job.
+
+    The database runs in WAL mode, so saving a job writes only that row and
+    readers (including other processes) aren't blocked by writers. Each thread
+    uses its own connection, and writes run in IMMEDIATE transactions so
+    read-modify-write updates are atomic across processes. Rows are indexed on
+    case number, content hash, status, lease expiry, attached-to job and last
+    update time; the full record is kept as JSON alongside.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        conn = self._connection()
+        conn.execute("PRAGMA journal_mode=WAL")
+        with self._transaction() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "job_id TEXT PRIMARY KEY, case_number TEXT, status TEXT, "
+                "updated_at REAL NOT NULL, data TEXT NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_case_number ON jobs (case_number)")
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status)")
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_updated_at ON jobs (updated_at)")
+            # Added with the job queue; databases created before it gain the column here
+            columns = [row[1] for row in conn.execute("PRAGMA table_info(jobs)")]
+            if "lease_expires" not in columns:
+                conn.execute("ALTER TABLE jobs ADD COLUMN lease_expires REAL")
+            # Added with single-flight coalescing of submissions
+            if "content_hash" not in columns:
+                conn.execute("ALTER TABLE jobs ADD COLUMN content_hash TEXT")
+            if "attached_to" not in columns:
+                conn.execute("ALTER TABLE jobs ADD COLUMN attached_to TEXT")
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_status_lease ON jobs (status, lease_expires)")
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_content_hash ON jobs (content_hash)")
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_attached_to ON jobs (attached_to)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS job_events ("
+                "event_id INTEGER PRIMARY KEY AUTOINCREMENT, job_id TEXT NOT NULL, event TEXT NOT NULL, "
+                "data TEXT NOT NULL, created_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS job_events_job_id ON job_events (job_id, event_id)")
+            conn.execute("CREATE INDEX IF NOT EXISTS job_events_created_at ON job_events (created_at)")
+            conn.execute("CREATE TABLE IF NOT EXISTS store_meta (key TEXT PRIMARY KEY, value TEXT)")
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        # A connection must not be used across fork(), so a forked child opens its own
+        if conn is None or self._local.pid != os.getpid():
+            # Autocommit mode; _transaction() issues BEGIN/COMMIT itself
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            # With WAL, NORMAL only risks the last transactions on power loss, never corruption
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    @contextmanager
+    def _transaction(self):
+        """A write transaction holding the database write lock from the start."""
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    @staticmethod
+    def _get(conn: sqlite3.Connection, job_id: str) -> Optional[dict]:
+        row = conn.execute("SELECT data FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    @staticmethod
+    def _put(conn: sqlite3.Connection, jobs: Dict[str, dict]):
+        now = time.time()
+        # An upsert rather than REPLACE keeps each job's rowid, i.e. its creation order
+        conn.executemany(
+            "INSERT INTO jobs (job_id, case_number, content_hash, status, lease_expires, attached_to, "
+            "updated_at, data) VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (job_id) DO UPDATE SET case_number = excluded.case_number, "
+            "content_hash = excluded.content_hash, status = excluded.status, "
+            "lease_expires = excluded.lease_expires, attached_to = excluded.attached_to, "
+            "updated_at = excluded.updated_at, data = excluded.data",
+            [(job_id, job_info.get("case_number"), job_info.get("content_hash"), job_info.get("status"),
+              job_info.get("lease_expires"), job_info.get("attached_to"), now, json.dumps(job_info))
+             for job_id, job_info in jobs.items()]
+        )
+
+    @staticmethod
+    def _find_leader(conn: sqlite3.Connection, job_id: str, record: dict) -> Optional[str]:
+        rows = conn.execute(
+            "SELECT job_id, data FROM jobs WHERE status IN ('pending', 'processing') "
+            "AND (case_number = ? OR content_hash = ?) ORDER BY rowid",
+            (record.get("case_number"), record.get("content_hash"))
+        ).fetchall()
+        return _leader(((row_id, json.loads(data)) for row_id, data in rows), job_id, record)
+
+    def get(self, job_id):
+        return self._get(self._connection(), job_id)
+
+    def save(self, job_id, job_info):
+        with self._transaction() as conn:
+            current = self._get(conn, job_id)
+            record = _versioned(current, job_info)
+            self._put(conn, {job_id: record})
+        return record
+
+    def save_many(self, jobs):
+        with self._transaction() as conn:
+            self._put(conn, jobs)
+
+    def update(self, job_id, fields, expected=None):
+        with self._transaction() as conn:
+            current = self._get(conn, job_id)
+            if not _matches(current, expected):
+                return None
+            record = _merge(current, fields)
+            self._put(conn, {job_id: record})
+        return record
+
+    def delete(self, job_ids):
+        job_ids = [(job_id,) for job_id in job_ids]
+        with self._transaction() as conn:
+            conn.executemany("DELETE FROM job_events WHERE job_id = ?", job_ids)
+            return conn.executemany("DELETE FROM jobs WHERE job_id = ?", job_ids).rowcount
+
+    def clear(self):
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM job_events")
+            return conn.execute("DELETE FROM jobs").rowcount
+
+    def find(self, case_number=None, status=None, content_hash=None):
+        conditions, params = [], []
+        if case_number is not None:
+            conditions.append("case_number = ?")
+            params.append(case_number)
+        if status is not None:
+            conditions.append("status = ?")
+            params.append(status)
+        if content_hash is not None:
+            conditions.append("content_hash = ?")
+            params.append(content_hash)
+        query = "SELECT job_id, data FROM jobs"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        rows = self._connection().execute(query + " ORDER BY rowid", params).fetchall()
+        return {job_id: json.loads(data) for job_id, data in rows}
+
+    def count(self):
+        return self._connection().execute("SELECT COUNT(*) FROM jobs").fetchone()[0]
+
+    def claim_next(self, worker_id, lease_seconds):
+        with self._transaction() as conn:
+            row = conn.execute(
+                "SELECT job_id, data FROM jobs WHERE status = 'pending' AND attached_to IS NULL "
+                "ORDER BY rowid LIMIT 1"
+            ).fetchone()
+            if row is None:
+                return None
+            record = _claimed(json.loads(row[1]), worker_id, lease_seconds, time.time())
+            self._put(conn, {row[0]: record})
+        return row[0], record
+
+    def heartbeat(self, job_ids, worker_id, lease_seconds):
+        held = []
+        with self._transaction() as conn:
+            for job_id in job_ids:
+                record = self._get(conn, job_id)
+                if _matches(record, {"status": "processing", "lease_owner": worker_id}):
+                    # Not a change clients care about, so the version stays
+                    record["lease_expires"] = time.time() + lease_seconds
+                    self._put(conn, {job_id: record})
+                    held.append(job_id)
+        return held
+
+    def requeue_expired(self, max_attempts):
+        requeued, failed = [], []
+        with self._transaction() as conn:
+            rows = conn.execute(
+                "SELECT job_id, data FROM jobs WHERE status = 'processing' "
+                "AND (lease_expires IS NULL OR lease_expires < ?)", (time.time(),)
+            ).fetchall()
+            for job_id, data in rows:
+                record = _abandoned(json.loads(data), max_attempts)
+                self._put(conn, {job_id: record})
+                (failed if record["status"] == "failed" else requeued).append(job_id)
+            orphans = conn.execute(
+                "SELECT job_id, data FROM jobs WHERE status = 'pending' AND attached_to IS NOT NULL "
+                "AND attached_to NOT IN (SELECT job_id FROM jobs WHERE status IN ('pending', 'processing'))"
+            ).fetchall()
+            for job_id, data in orphans:
+                self._put(conn, {job_id: _merge(json.loads(data), {"attached_to": None})})
+                requeued.append(job_id)
+        return requeued, failed
+
+    def create_unless_active(self, job_id, job_info):
+        with self._transaction() as conn:
+            leader_id = self._find_leader(conn, job_id, job_info)
+            if leader_id is not None:
+                return leader_id
+            self._put(conn, {job_id: _versioned(self._get(conn, job_id), job_info)})
+        return None
+
+    def update_or_attach(self, job_id, fields, expected=None):
+        with self._transaction() as conn:
+            current = self._get(conn, job_id)
+            if not _matches(current, expected):
+                return None
+            record = _merge(current, fields)
+            leader_id = self._find_leader(conn, job_id, record)
+            if leader_id is not None:
+                record = _attached(record, leader_id)
+            self._put(conn, {job_id: record})
+        return record
+
+    def finish_attached(self, leader_id, fields):
+        with self._transaction() as conn:
+            rows = conn.execute(
+                "SELECT job_id, data FROM jobs WHERE attached_to = ? AND status = 'pending'", (leader_id,)
+            ).fetchall()
+            for job_id, data in rows:
+                self._put(conn, {job_id: _merge(json.loads(data), {**fields, "attached_to": None})})
+        return [job_id for job_id, _ in rows]
+
+    def queue_stats(self):
+        conn = self._connection()
+        now = time.time()
+        stats = {status or "unknown": count for status, count in
+                 conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status")}
+        stats["expired_leases"] = conn.execute(
+            "SELECT COUNT(*) FROM jobs WHERE status = 'processing' "
+            "AND (lease_expires IS NULL OR lease_expires < ?)", (now,)
+        ).fetchone()[0]
+        oldest = conn.execute("SELECT MIN(updated_at) FROM jobs WHERE status = 'pending'").fetchone()[0]
+        stats["oldest_pending_seconds"] = round(now - oldest, 1) if oldest else 0.0
+        return stats
+
+    def append_event(self, job_id, event, data):
+        with self._transaction() as conn:
+            return conn.execute(
+                "INSERT INTO job_events (job_id, event, data, created_at) VALUES (?, ?, ?, ?)",
+                (job_id, event, json.dumps(data), time.time())
+            ).lastrowid
+
+    def events_after(self, after_id, job_id=None, limit=1000):
+        query = "SELECT event_id, job_id, event, data FROM job_events WHERE event_id > ?"
+        params = [after_id]
+        if job_id is not None:
+            query += " AND job_id = ?"
+            params.append(job_id)
+        rows = self._connection().execute(query + " ORDER BY event_id LIMIT ?", params + [limit]).fetchall()
+        return [(event_id, event_job_id, event, json.loads(data)) for event_id, event_job_id, event, data in rows]
+
+    def last_event_id(self):
+        # AUTOINCREMENT's counter, which (unlike MAX(event_id)) doesn't go back when events are deleted
+        row = self._connection().execute("SELECT seq FROM sqlite_sequence WHERE name = 'job_events'").fetchone()
+        return row[0] if row else 0
+
+    def prune_events(self, max_age_seconds):
+        with self._transaction() as conn:
+            return conn.execute("DELETE FROM job_events WHERE created_at < ?",
+                                (time.time() - max_age_seconds,)).rowcount
+
+    def import_once(self, marker: str, jobs: Dict[str, dict]) -> bool:
+        """Insert jobs unless an import with this marker already happened; returns whether it did.
+
+        Checking and recording the marker in the same transaction as the insert
+        means concurrently starting processes import only once.
+        """
+        with self._transaction() as conn:
+            if conn.execute("SELECT 1 FROM store_meta WHERE key = ?", (marker,)).fetchone():
+                return False
+            self._put(conn, jobs)
+            conn.execute("INSERT INTO store_meta VALUES (?, ?)", (marker, str(time.time())))
+        return True
+
+def import_json_jobs(store: SQLiteJobStore, json_path: str) -> int:
+    """Copy the jobs from an all_jobs.json file into store, once.
+
+    The import is recorded in the store, so jobs deleted later aren't brought
+    back by importing the same file again. Returns the number of jobs imported.
+    """
+    if not os.path.exists(json_path):
+        return 0
+    with open(json_path, 'r') as f:
+        jobs = json.load(f)
+    if not store.import_once("json_import", jobs):
+        return 0
+    print(f"Imported {len(jobs)} jobs from {json_path}")
+    return len(jobs)
+
+def job_store_from_env(jobs_dir: str) -> JobStore:
+    """Build the job store configured by JOB_STORE ("sqlite" or "json") and JOB_STORE_PATH.
+
+    A new SQLite store imports the jobs of an existing all_jobs.json in jobs_dir.
+    """
+    json_path = os.path.join(jobs_dir, "all_jobs.json")
+    if (os.getenv('JOB_STORE') or 'sqlite') == 'json':
+        return JsonFileJobStore(os.getenv('JOB_STORE_PATH') or json_path)
+    store = SQLiteJobStore(os.getenv('JOB_STORE_PATH') or os.path.join(jobs_dir, "jobs.db"))
+    import_json_jobs(store, json_path)
+    return store
@@ -0,0 +1,270 @@
+import asyncio
+import os
+import random
+import threading
+import time
+from typing import Any, Awaitable, Callable, Optional
+import httpx
+from google.genai import errors as genai_errors
+
+# Quota exhaustion, timeouts and server-side failures are worth retrying; other
+# client errors (bad request, permission denied, ...) fail the same way every time
+RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
+# How often callers parked behind a half-open circuit check whether the probe finished
+PROBE_POLL_SECONDS = 1.0
+
+def is_retryable(error: Exception) -> bool:
+    """Whether a failed Gemini call may succeed if repeated later."""
+    if isinstance(error, genai_errors.APIError):
+        return error.code in RETRYABLE_STATUS_CODES
+    return isinstance(error, (ConnectionError, TimeoutError, httpx.TransportError))
+
+class TokenBucket:
+    """Refills at rate_per_minute up to one minute's worth; callers reserve and then wait.
+
+    Reservations may drive the balance negative, so concurrent callers queue up
+    behind each other in order instead of all retrying when capacity returns.
+    """
+
+    def __init__(self, rate_per_minute: float):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = rate_per_minute
+        self._available = rate_per_minute
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount: float) -> float:
+        """Take amount from the bucket and return how long to wait before using it."""
+        with self._lock:
+            now = time.monotonic()
+            self._available = min(self.capacity, self._available + (now - self._updated) * self.rate)
+            self._updated = now
+            # A single request larger than the bucket only has to wait for a full bucket
+            amount = min(amount, self.capacity)
+            self._available -= amount
+            return -self._available / self.rate if self._available < 0 else 0.0
+
+class CircuitBreaker:
+    """Stops calls to an endpoint after failure_threshold consecutive retryable failures.
+
+    While open, callers are told to wait; after reset_timeout one probe call is let
+    through (half-open) and its outcome either closes the circuit or re-opens it.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.times_opened = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def wait_time(self) -> float:
+        """Return 0 if a call may start now, otherwise how long to wait before asking again."""
+        with self._lock:
+            if self.state == "closed":
+                return 0.0
+            if self.state == "open":
+                remaining = self._opened_at + self.reset_timeout - time.monotonic()
+                if remaining > 0:
+                    return remaining
+                self.state = "half_open"
+                self._probe_in_flight = False
+            if not self._probe_in_flight:
+                self._probe_in_flight = True
+                return 0.0
+            return PROBE_POLL_SECONDS
+
+    def record_success(self):
+        with self._lock:
+            if self.state != "closed":
+                print("LLM endpoint recovered, closing the circuit")
+            self.state = "closed"
+            self.consecutive_failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.consecutive_failures += 1
+            self._probe_in_flight = False
+            if self.state == "half_open" or (self.state == "closed"
+                                             and self.consecutive_failures >= self.failure_threshold):
+                self.state = "open"
+                self._opened_at = time.monotonic()
+                self.times_opened += 1
+                print(f"LLM endpoint unhealthy after {self.consecutive_failures} consecutive failures, "
+                      f"pausing calls for {self.reset_timeout:.0f}s")
+
+    def release(self):
+        """End a call that says nothing about the endpoint's health (e.g. a bad request)."""
+        with self._lock:
+            self._probe_in_flight = False
+
+class LLMScheduler:
+    """Central gate for Gemini calls: rate limits, retries and a circuit breaker.
+
+    Every call first waits for the circuit to be closed (or to be the half-open probe),
+    then reserves one request and its estimated prompt tokens from the per-minute
+    buckets. Retryable failures (429s, 5xx, timeouts) are retried with full-jitter
+    exponential backoff up to max_attempts, and feed the circuit breaker; while the
+    circuit is open, calls are parked rather than failed, for up to max_park_seconds.
+    """
+
+    def __init__(self, requests_per_minute: float = 120, tokens_per_minute: float = 1_000_000,
+                 max_attempts: int = 6, base_delay: float = 1.0, max_delay: float = 60.0,
+                 failure_threshold: int = 5, reset_timeout: float = 30.0, max_park_seconds: float = 1800.0):
+        self.request_bucket = TokenBucket(requests_per_minute) if requests_per_minute > 0 else None
+        self.token_bucket = TokenBucket(tokens_per_minute) if tokens_per_minute > 0 else None
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_park_seconds = max_park_seconds
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.retries = 0
+        self.failures = 0
+        self.throttled_seconds = 0.0
+        self.parked_seconds = 0.0
+
+    def call(self, func: Callable[[], Any], estimated_tokens: int = 0, description: str = "LLM call",
+             analysis_info: Optional[dict] = None) -> Any:
+        """Run func (a blocking Gemini call) under the rate limits, retrying transient failures."""
+        attempt = 1
+        while True:
+            parked_since = time.monotonic()
+            while True:
+                delay = self._circuit_wait(parked_since)
+                if not delay:
+                    break
+                time.sleep(delay)
+            time.sleep(self._reserve(estimated_tokens))
+            try:
+                result = func()
+            except Exception as e:
+                delay = self._failed(e, attempt, description, analysis_info)
+                time.sleep(delay)
+                attempt += 1
+                continue
+            self.breaker.record_success()
+            return result
+
+    async def call_async(self, func: Callable[[], Awaitable[Any]], estimated_tokens: int = 0,
+                         description: str = "LLM call", analysis_info: Optional[dict] = None) -> Any:
+        """Async version of call(): func returns a new awaitable for every attempt."""
+        attempt = 1
+        while True:
+            parked_since = time.monotonic()
+            while True:
+                delay = self._circuit_wait(parked_since)
+                if not delay:
+                    break
+                await asyncio.sleep(delay)
+            await asyncio.sleep(self._reserve(estimated_tokens))
+            try:
+                result = await func()
+            except asyncio.CancelledError:
+                # Don't leave the circuit waiting on a probe that will never finish
+                self.breaker.release()
+                raise
+            except Exception as e:
+                delay = self._failed(e, attempt, description, analysis_info)
+                await asyncio.sleep(delay)
+                attempt += 1
+                continue
+            self.breaker.record_success()
+            return result
+
+    def _circuit_wait(self, parked_since: float) -> float:
+        """Return how long to wait before asking the circuit breaker again (0 to go ahead)."""
+        wait = self.breaker.wait_time()
+        if wait > 0:
+            parked = time.monotonic() - parked_since
+            if parked >= self.max_park_seconds:
+                raise RuntimeError(f"LLM endpoint still unavailable after waiting {parked:.0f}s")
+            with self._lock:
+                self.parked_seconds += wait
+        return wait
+
+    def _reserve(self, estimated_tokens: int) -> float:
+        """Reserve the call's share of the per-minute quota; returns how long to wait for it."""
+        wait = 0.0
+        if self.request_bucket is not None:
+            wait = max(wait, self.request_bucket.reserve(1))
+        if self.token_bucket is not None and estimated_tokens:
+            wait = max(wait, self.token_bucket.reserve(estimated_tokens))
+        with self._lock:
+            self.calls += 1
+            self.throttled_seconds += wait
+        return wait
+
+    def _failed(self, error: Exception, attempt: int, description: str, analysis_info: Optional[dict]) -> float:
+        """Account for a failed attempt; re-raises the error unless the call should be retried."""
+        if not is_retryable(error):
+            self.breaker.release()
+            with self._lock:
+                self.failures += 1
+            raise error
+
+        self.breaker.record_failure()
+        if attempt >= self.max_attempts:
+            with self._lock:
+                self.failures += 1
+            print(f"{description} failed after {attempt} attempts: {error}")
+            raise error
+
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        with self._lock:
+            self.retries += 1
+        if analysis_info is not None:
+            analysis_info["llm_retries"] = analysis_info.get("llm_retries", 0) + 1
+        print(f"{description} attempt {attempt} failed ({error}), retrying in {delay:.1f}s")
+        return delay
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "circuit": self.breaker.state,
+                "circuit_opened": self.breaker.times_opened,
+                "consecutive_failures": self.breaker.consecutive_failures,
+                "calls": self.calls,
+                "retries": self.retries,
+                "failures": self.failures,
+                "throttled_seconds": round(self.throttled_seconds, 3),
+                "parked_seconds": round(self.parked_seconds, 3),
+            }
+
+def scheduler_from_env(processes: int = 1) -> LLMScheduler:
+    """Build the scheduler configured by the LLM_* quota and retry settings.
+
+    The quotas are per project, so when several processes make Gemini calls
+    (e.g. the backend's job worker processes) each gets an equal share.
+    """
+    processes = max(processes, 1)
+    return LLMScheduler(
+        requests_per_minute=float(os.getenv('LLM_REQUESTS_PER_MINUTE') or '120') / processes,
+        tokens_per_minute=float(os.getenv('LLM_TOKENS_PER_MINUTE') or '1000000') / processes,
+        max_attempts=int(os.getenv('LLM_MAX_ATTEMPTS') or '6'),
+        failure_threshold=int(os.getenv('LLM_CIRCUIT_FAILURE_THRESHOLD') or '5'),
+        reset_timeout=float(os.getenv('LLM_CIRCUIT_RESET_SECONDS') or '30'),
+        max_park_seconds=float(os.getenv('LLM_MAX_PARK_SECONDS') or '1800'),
+    )
+
+_shared_scheduler = None
+_shared_scheduler_lock = threading.Lock()
+
+def shared_scheduler(processes: int = 1) -> LLMScheduler:
+    """The process-wide scheduler, created from the environment on first use.
+
+    Every analyzer in a process shares it, since the quota is per project.
+    processes (the number of processes sharing the quota) only matters on the
+    first call.
+    """
+    global _shared_scheduler
+    with _shared_scheduler_lock:
+        if _shared_scheduler is None:
+            _shared_scheduler = scheduler_from_env(processes)
+        return _shared_scheduler
@@ -1,30 +1,111 @@
 import PyPDF2
 from datetime import datetime
 import re
-from ..models.audit import CaseInfo
+from typing import Iterator, List, Optional
+from ..models.audit import CaseInfo, ParsedDocument
+from .extraction_cache import ExtractionCache, file_sha256
+from .field_scanner import FieldScanner, FieldSpec
+
+# Field table for the case header. Pattern fields keep their first match in the text;
+# line fields take the value after the colon on the first line containing their keyword.
+# Specs that share a keyword are tried in order, and a fallback spec is dropped from
+# the scan once the field it backs up has been found.
+CASE_FIELD_SPECS = [
+    FieldSpec('case_number', 'Case Number', r'Case Number:?\s*(\d+)', re.IGNORECASE, ignore_case=True),
+    FieldSpec('date_created', 'Date/Time Created',
+              r'Date/Time Created\s+(\d{1,2}-\d{1,2}-\d{4}\s+\d{1,2}:\d{1,2}:\d{1,2})', re.IGNORECASE, ignore_case=True),
+    FieldSpec('date_closed', 'Date/Time Closed',
+              r'Date/Time Closed\s+(\d{1,2}-\d{1,2}-\d{4}\s+\d{1,2}:\d{1,2}:\d{1,2})', re.IGNORECASE, ignore_case=True),
+    FieldSpec('product_name', 'Product', r'Product Name\s+([^\n]+)', ignore_case=True),
+    FieldSpec('product', 'Product', r'Product:?\s*([^:]+)', re.IGNORECASE, ignore_case=True,
+              fallback_for='product_name'),
+    FieldSpec('version', 'Version', r'Version\s+([0-9.]+)'),
+    FieldSpec('subject_application', 'Subject', r'Subject\s+(Application[^\n]+)', ignore_case=True),
+    FieldSpec('subject', 'Subject', r'Subject:?\s*(.+?)(?=(?:\n\w+:|$))', re.IGNORECASE | re.DOTALL,
+              ignore_case=True, fallback_for='subject_application'),
+    FieldSpec('customer_name', 'Customer', min_length=2),
+    FieldSpec('severity', 'Severity'),
+    FieldSpec('status', 'Status'),
+    FieldSpec('case_owner', 'Case Owner', min_length=2),
+]
+CASE_FIELD_SCANNER = FieldScanner(CASE_FIELD_SPECS)
+
+# Pages scanned by the header-only extraction before giving up on missing fields.
+# The case number and dates always appear on the first page.
+HEADER_PAGE_LIMIT = 2
 
 class PDFExtractor:
-    def __init__(self, pdf_path: str):
+    def __init__(self, pdf_path: str, cache: Optional[ExtractionCache] = None,
+                 content_hash: Optional[str] = None):
+        """content_hash is the file's SHA-256 when the caller already has it (e.g. hashed
+        while uploading), so the cache lookup doesn't read the whole file again."""
         self.pdf_path = pdf_path
+        self.cache = cache
+        # Page texts are cached so the PDF is only parsed once per extractor,
+        # even when a header-only read is later followed by a full read
+        self._page_texts = []
+        self._all_pages_read = False
+        self._content_hash = content_hash
+        self._cache_checked = False
+        self._cached_document = None
+
+    def _load_from_cache(self):
+        """Look the file up in the extraction cache once, before touching PyPDF2."""
+        if self.cache is None or self._cache_checked:
+            return
+        self._cache_checked = True
+        if self._content_hash is None:
+            try:
+                self._content_hash = file_sha256(self.pdf_path)
+            except OSError as e:
+                raise Exception(f"Error extracting text from PDF: {e}")
+        document = self.cache.get(self._content_hash)
+        if document is not None:
+            self._cached_document = document
+            self._page_texts = list(document.page_texts)
+            self._all_pages_read = True
+
+    def iter_pages(self) -> Iterator[str]:
+        """Yield the text of each page, extracting pages lazily as they are consumed."""
+        self._load_from_cache()
+        yield from list(self._page_texts)
+        if self._all_pages_read:
+            return
 
-    def extract_text(self) -> str:
-        """Extract all text from the PDF file."""
         try:
             with open(self.pdf_path, 'rb') as file:
                 pdf_reader = PyPDF2.PdfReader(file)
-                text = ""
-                for page in pdf_reader.pages:
-                    text += page.extract_text() + "\n"
-                return text
+                for page_index in range(len(self._page_texts), len(pdf_reader.pages)):
+                    page_text = pdf_reader.pages[page_index].extract_text()
+                    self._page_texts.append(page_text)
+                    yield page_text
+                self._all_pages_read = True
         except Exception as e:
             raise Exception(f"Error extracting text from PDF: {e}")
 
-    def _safe_extract_value(self, line: str) -> str:
-        """Safely extract value after the colon, handling multiple colons."""
-        parts = line.split(':')
-        if len(parts) > 1:
-            return ':'.join(parts[1:]).strip()
-        return ""
+    def extract_pages(self) -> List[str]:
+        """Extract the text of every page in the PDF file."""
+        if not self._all_pages_read:
+            for _ in self.iter_pages():
+                pass
+        return self._page_texts
+
+    def extract_text(self) -> str:
+        """Extract all text from the PDF file."""
+        return "".join(page + "\n" for page in self.extract_pages())
+
+    def parse(self) -> ParsedDocument:
+        """Parse the PDF once into its page texts and the derived case information."""
+        self._load_from_cache()
+        if self._cached_document is not None:
+            return self._cached_document
+
+        page_texts = self.extract_pages()
+        document = ParsedDocument(page_texts=page_texts, case_info=self.extract_case_info())
+        if self.cache is not None:
+            self.cache.put(self._content_hash, document)
+        self._cached_document = document
+        return document
 
     def _parse_date(self, date_str: str) -> datetime:
         """Parse date from various formats found in PDF."""
@@ -78,11 +159,43 @@ class PDFExtractor:
         print(f"Warning: Could not parse date '{date_str}', using current time")
         return datetime.now()
 
-    def extract_case_info(self) -> CaseInfo:
-        """Extract and structure case information from the PDF."""
-        text = self.extract_text()
+    def extract_case_info(self, header_only: bool = False) -> CaseInfo:
+        """Extract and structure case information from the PDF.
+
+        With header_only, pages are read one at a time and reading stops as soon as
+        every field has been found (or after HEADER_PAGE_LIMIT pages), so large PDFs
+        are not fully parsed just to look up the case number.
+        """
+        self._load_from_cache()
+        if self._cached_document is not None:
+            return self._cached_document.case_info
+        if not header_only:
+            return self._parse_case_info(self.extract_text())
+
+        header_parts = []
+        fields = {}
+        for page_text in self.iter_pages():
+            header_parts.append(page_text + "\n")
+            fields = self._extract_fields("".join(header_parts))
+            if all(fields.values()) or len(header_parts) >= HEADER_PAGE_LIMIT:
+                break
+        return self._build_case_info(fields or self._extract_fields(""))
+
+    def _parse_case_info(self, text: str) -> CaseInfo:
+        """Extract and structure case information from the document text."""
+        return self._build_case_info(self._extract_fields(text))
+
+    def _build_case_info(self, fields: dict) -> CaseInfo:
+        """Build a CaseInfo from extracted fields, defaulting missing dates to now."""
+        case_info = dict(fields)
+        for date_field in ('date_created', 'date_closed'):
+            if case_info[date_field] is None:
+                case_info[date_field] = datetime.now()
+        return CaseInfo(**case_info)
+
+    def _extract_fields(self, text: str) -> dict:
+        """Extract the raw case fields from the document text (dates are None when missing)."""
         try:
-            lines = text.split('\n')
             case_info = {
                 'case_number': '',
                 'product_version': '',
@@ -92,43 +205,38 @@ class PDFExtractor:
                 'status': '',
                 'subject': '',
                 'case_owner': '',
-                'date_created': datetime.now(),
-                'date_closed': datetime.now()
+                'date_created': None,
+                'date_closed': None
             }
             
-            # Extract case number from the text first (often appears in multiple places)
-            case_number_match = re.search(r'Case Number:?\s*(\d+)', text, re.IGNORECASE)
-            if case_number_match:
-                case_info['case_number'] = case_number_match.group(1).strip()
+            # Find every field in a single pass over the text
+            found = CASE_FIELD_SCANNER.scan(text)
             
-            # Extract creation date from the text
-            date_created_match = re.search(r'Date/Time Created\s+(\d{1,2}-\d{1,2}-\d{4}\s+\d{1,2}:\d{1,2}:\d{1,2})', text, re.IGNORECASE)
-            if date_created_match:
-                case_info['date_created'] = self._parse_date(date_created_match.group(1))
+            # Case number (often appears in multiple places, the first one wins)
+            if 'case_number' in found:
+                case_info['case_number'] = found['case_number'].group(1).strip()
             
-            # Extract closed date from the text
-            date_closed_match = re.search(r'Date/Time Closed\s+(\d{1,2}-\d{1,2}-\d{4}\s+\d{1,2}:\d{1,2}:\d{1,2})', text, re.IGNORECASE)
-            if date_closed_match:
-                case_info['date_closed'] = self._parse_date(date_closed_match.group(1))
+            # Creation and closed dates
+            if 'date_created' in found:
+                case_info['date_created'] = self._parse_date(found['date_created'].group(1))
+            if 'date_closed' in found:
+                case_info['date_closed'] = self._parse_date(found['date_closed'].group(1))
             
             # Improved product name extraction
-            # Look for specific fields that are more likely to contain just the product info
-            product_name_match = re.search(r'Product Name\s+([^\n]+)', text)
-            if product_name_match:
-                case_info['product_name'] = product_name_match.group(1).strip()
-            else:
+            # Prefer the specific field that is more likely to contain just the product info
+            if 'product_name' in found:
+                case_info['product_name'] = found['product_name'].group(1).strip()
+            elif 'product' in found:
                 # Fallback extraction
-                product_match = re.search(r'Product:?\s*([^:]+)', text, re.IGNORECASE)
-                if product_match:
-                    full_product = product_match.group(1).strip()
-                    # Try to get just the first part before any email or other fields
-                    product_parts = re.split(r'\s+(?=Contact|Email|Customer)', full_product)
-                    if product_parts:
-                        case_info['product_name'] = product_parts[0].strip()
-                        # Check if the first part contains a version
-                        version_match = re.search(r'Version\s+([0-9.]+)', product_parts[0])
-                        if version_match:
-                            case_info['product_version'] = version_match.group(1).strip()
+                full_product = found['product'].group(1).strip()
+                # Try to get just the first part before any email or other fields
+                product_parts = re.split(r'\s+(?=Contact|Email|Customer)', full_product)
+                if product_parts:
+                    case_info['product_name'] = product_parts[0].strip()
+                    # Check if the first part contains a version
+                    version_match = re.search(r'Version\s+([0-9.]+)', product_parts[0])
+                    if version_match:
+                        case_info['product_version'] = version_match.group(1).strip()
                 
             # If product name is still too long or seems to contain other fields, truncate it
             if len(case_info['product_name']) > 50:
@@ -141,60 +249,33 @@ class PDFExtractor:
                     case_info['product_name'] = "TIBCO BusinessWorks"
                 
             # Version extraction if still missing
-            if not case_info['product_version']:
-                version_match = re.search(r'Version\s+([0-9.]+)', text)
-                if version_match:
-                    case_info['product_version'] = version_match.group(1).strip()
+            if not case_info['product_version'] and 'version' in found:
+                case_info['product_version'] = found['version'].group(1).strip()
             
             # Improved subject extraction
-            # Try to find subject text more specifically
-            subject_match = re.search(r'Subject\s+(Application[^\n]+)', text)
-            if subject_match:
-                case_info['subject'] = subject_match.group(1).strip()
-            else:
-                # Broader pattern
-                subject_match = re.search(r'Subject:?\s*(.+?)(?=(?:\n\w+:|$))', text, re.IGNORECASE | re.DOTALL)
-                if subject_match:
-                    subject = subject_match.group(1).strip()
-                    # Clean up multi-line subjects and limit length
-                    subject = re.sub(r'\s+', ' ', subject)
-                    
-                    # If subject is too long, extract just the first sentence or clause
-                    if len(subject) > 100:
-                        first_part = re.split(r'(?<=[.!?])\s+', subject)[0]
-                        if first_part and len(first_part) > 20:  # Ensure we have something meaningful
-                            subject = first_part
-                        else:
-                            subject = subject[:100] + "..."
-                    
-                    case_info['subject'] = subject
-            
-            # Process each line for additional information
-            for line in lines:
-                line = line.strip()
-                if not line:
-                    continue
-                
-                if 'Customer' in line and not case_info['customer_name']:
-                    customer_value = self._safe_extract_value(line)
-                    if customer_value and len(customer_value) > 1:
-                        case_info['customer_name'] = customer_value
+            # Prefer the specific subject text, then the broader pattern
+            if 'subject_application' in found:
+                case_info['subject'] = found['subject_application'].group(1).strip()
+            elif 'subject' in found:
+                subject = found['subject'].group(1).strip()
+                # Clean up multi-line subjects and limit length
+                subject = re.sub(r'\s+', ' ', subject)
                 
-                elif 'Severity' in line and not case_info['severity']:
-                    severity_value = self._safe_extract_value(line)
-                    if severity_value and len(severity_value) > 0:
-                        case_info['severity'] = severity_value
+                # If subject is too long, extract just the first sentence or clause
+                if len(subject) > 100:
+                    first_part = re.split(r'(?<=[.!?])\s+', subject)[0]
+                    if first_part and len(first_part) > 20:  # Ensure we have something meaningful
+                        subject = first_part
+                    else:
+                        subject = subject[:100] + "..."
                 
-                elif 'Status' in line and not case_info['status']:
-                    status_value = self._safe_extract_value(line)
-                    if status_value and len(status_value) > 0:
-                        case_info['status'] = status_value
-                
-                elif 'Case Owner' in line and not case_info['case_owner']:
-                    owner_value = self._safe_extract_value(line)
-                    if owner_value and len(owner_value) > 1:
-                        case_info['case_owner'] = owner_value
+                case_info['subject'] = subject
+            
+            # Line-based fields found by the same scan
+            for field in ('customer_name', 'severity', 'status', 'case_owner'):
+                if field in found:
+                    case_info[field] = found[field]
 
-            return CaseInfo(**case_info)
+            return case_info
         except Exception as e:
-            raise Exception(f"Error parsing case information: {e}") 
\ No newline at end of file
+            raise Exception(f"Error parsing case information: {e}") 
@@ -0,0 +1,265 @@
+import asyncio
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, List, Optional
+
+# Marks the end of the input for a stage worker
+_STOP = object()
+
+class Stage:
+    """One step of a Pipeline.
+
+    `func` takes the output of the previous stage (or the submitted item) and returns
+    the input for the next stage; returning None ends that item's run early. Stages
+    run `workers` threads, or with use_processes a pool of `workers` processes (func
+    must then be a picklable module-level function). A coroutine function runs on the
+    stage's own event loop with up to `workers` items in flight at once, which suits
+    I/O-bound calls that would otherwise need one thread each.
+    """
+
+    def __init__(self, name: str, func: Callable[[Any], Any], workers: int = 1,
+                 queue_size: int = 16, use_processes: bool = False):
+        self.name = name
+        self.func = func
+        self.workers = workers
+        self.queue_size = queue_size
+        self.use_processes = use_processes
+        self.is_async = asyncio.iscoroutinefunction(func)
+
+class _StageState:
+    def __init__(self, stage: Stage):
+        self.stage = stage
+        # Bounded so a fast stage blocks instead of running arbitrarily far ahead
+        self.queue = queue.Queue(maxsize=stage.queue_size)
+        self.executor = ProcessPoolExecutor(max_workers=stage.workers) if stage.use_processes else None
+        self.threads = []
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.completed = 0
+        self.failed = 0
+        self.busy_seconds = 0.0
+        self.workers_running = 0
+
+    @property
+    def consumers(self) -> int:
+        # An async stage reads its queue from a single loop thread
+        return 1 if self.stage.is_async else self.stage.workers
+
+class Pipeline:
+    """Runs items through a sequence of stages connected by bounded queues.
+
+    Every stage has its own worker pool, so stages overlap: extraction can run ahead
+    of analysis while rendering drains behind it, and a full queue blocks the stage
+    feeding it (backpressure). Each item carries a tag (e.g. the file name or job id)
+    that is passed to the result and error callbacks. on_done is called with the tag
+    once the item has left the pipeline for any reason (result, early end or error).
+    """
+
+    def __init__(self, stages: List[Stage],
+                 on_result: Optional[Callable[[Any, Any], None]] = None,
+                 on_error: Optional[Callable[[Any, str, Exception], None]] = None,
+                 on_done: Optional[Callable[[Any], None]] = None):
+        if not stages:
+            raise ValueError("A pipeline needs at least one stage")
+        self.on_result = on_result
+        self.on_error = on_error
+        self.on_done = on_done
+        self._states = [_StageState(stage) for stage in stages]
+        self._started_at = None
+        self._closed = False
+
+    def start(self):
+        """Start the worker threads of every stage."""
+        self._started_at = time.monotonic()
+        for index, state in enumerate(self._states):
+            state.workers_running = state.consumers
+            target = self._run_async_stage if state.stage.is_async else self._run_worker
+            for worker_number in range(state.consumers):
+                thread = threading.Thread(
+                    target=target, args=(index,),
+                    name=f"pipeline-{state.stage.name}-{worker_number}", daemon=True
+                )
+                state.threads.append(thread)
+                thread.start()
+        return self
+
+    def submit(self, item: Any, tag: Any = None, block: bool = True, timeout: Optional[float] = None):
+        """Queue an item for the first stage; blocks while the first queue is full."""
+        if self._closed:
+            raise RuntimeError("Pipeline is closed")
+        self._states[0].queue.put((tag, item), block=block, timeout=timeout)
+
+    def close(self):
+        """Stop accepting items; workers exit once everything queued has drained."""
+        if self._closed:
+            return
+        self._closed = True
+        first = self._states[0]
+        for _ in range(first.consumers):
+            first.queue.put(_STOP)
+
+    def join(self):
+        """Wait until every submitted item has left the pipeline (call close() first)."""
+        for state in self._states:
+            for thread in state.threads:
+                thread.join()
+            if state.executor is not None:
+                state.executor.shutdown()
+
+    def run(self, items, tag_for: Callable[[Any], Any] = lambda item: item):
+        """Convenience helper: start, feed every item, and wait for the pipeline to drain."""
+        self.start()
+        for item in items:
+            self.submit(item, tag=tag_for(item))
+        self.close()
+        self.join()
+
+    def stats(self) -> dict:
+        """Per-stage queue depth, in-flight count and throughput counters."""
+        elapsed = time.monotonic() - self._started_at if self._started_at else 0.0
+        stats = {}
+        for state in self._states:
+            with state.lock:
+                stats[state.stage.name] = {
+                    "workers": state.stage.workers,
+                    "queue_depth": state.queue.qsize(),
+                    "queue_size": state.stage.queue_size,
+                    "in_flight": state.in_flight,
+                    "completed": state.completed,
+                    "failed": state.failed,
+                    "items_per_second": round(state.completed / elapsed, 3) if elapsed else 0.0,
+                    "busy_seconds": round(state.busy_seconds, 3),
+                }
+        return stats
+
+    def _run_worker(self, index: int):
+        state = self._states[index]
+
+        while True:
+            entry = state.queue.get()
+            if entry is _STOP:
+                break
+            tag, item = entry
+
+            self._begin(state)
+            started = time.monotonic()
+            try:
+                if state.executor is not None:
+                    result = state.executor.submit(state.stage.func, item).result()
+                else:
+                    result = state.stage.func(item)
+            except Exception as e:
+                self._finish(state, started, failed=True)
+                self._report_error(tag, state.stage.name, e)
+                self._item_done(tag)
+                continue
+            self._finish(state, started, failed=False)
+            self._forward(index, tag, result)
+
+        self._worker_exited(index)
+
+    def _run_async_stage(self, index: int):
+        # Reader thread of an async stage: feeds the stage's event loop, keeping at most
+        # `workers` items between being taken off the queue and being forwarded
+        state = self._states[index]
+        loop = asyncio.new_event_loop()
+        slots = threading.Semaphore(state.stage.workers)
+        forward_queue = queue.Queue()
+        threading.Thread(target=loop.run_forever, name=f"pipeline-{state.stage.name}-loop",
+                         daemon=True).start()
+        threading.Thread(target=self._run_forwarder, args=(index, forward_queue, slots),
+                         name=f"pipeline-{state.stage.name}-forward", daemon=True).start()
+
+        while True:
+            slots.acquire()
+            entry = state.queue.get()
+            if entry is _STOP:
+                break
+            asyncio.run_coroutine_threadsafe(self._process_async(index, entry, forward_queue), loop)
+
+        # Wait until every in-flight item has been processed and forwarded
+        for _ in range(state.stage.workers - 1):
+            slots.acquire()
+        loop.call_soon_threadsafe(loop.stop)
+        self._worker_exited(index)
+
+    async def _process_async(self, index: int, entry, forward_queue: queue.Queue):
+        state = self._states[index]
+        tag, item = entry
+        self._begin(state)
+        started = time.monotonic()
+        try:
+            result = await state.stage.func(item)
+        except Exception as e:
+            self._finish(state, started, failed=True)
+            # on_error may block (e.g. on a job store write), which would stall every item on the loop
+            await asyncio.to_thread(self._report_error, tag, state.stage.name, e)
+            result = None  # Forwarding None ends the item's run
+        else:
+            self._finish(state, started, failed=False)
+        # Forwarding may block on a full downstream queue, so it happens off the loop
+        forward_queue.put((tag, result))
+
+    def _run_forwarder(self, index: int, forward_queue: queue.Queue, slots: threading.Semaphore):
+        while True:
+            tag, result = forward_queue.get()
+            self._forward(index, tag, result)
+            slots.release()
+
+    def _begin(self, state: _StageState):
+        with state.lock:
+            state.in_flight += 1
+
+    def _finish(self, state: _StageState, started: float, failed: bool):
+        with state.lock:
+            state.in_flight -= 1
+            if failed:
+                state.failed += 1
+            else:
+                state.completed += 1
+            state.busy_seconds += time.monotonic() - started
+
+    def _forward(self, index: int, tag: Any, result: Any):
+        if result is None:
+            self._item_done(tag)
+            return
+        if index + 1 < len(self._states):
+            # Blocks while the next stage is saturated (backpressure)
+            self._states[index + 1].queue.put((tag, result))
+            return
+        if self.on_result is not None:
+            try:
+                self.on_result(tag, result)
+            except Exception as e:
+                print(f"Error in pipeline result handler: {e}")
+        self._item_done(tag)
+
+    def _item_done(self, tag: Any):
+        if self.on_done is None:
+            return
+        try:
+            self.on_done(tag)
+        except Exception as e:
+            print(f"Error in pipeline done handler: {e}")
+
+    def _worker_exited(self, index: int):
+        # The last worker of a stage to exit stops the workers of the next stage
+        state = self._states[index]
+        with state.lock:
+            state.workers_running -= 1
+            last_worker = state.workers_running == 0
+        if last_worker and index + 1 < len(self._states):
+            next_state = self._states[index + 1]
+            for _ in range(next_state.consumers):
+                next_state.queue.put(_STOP)
+
+    def _report_error(self, tag: Any, stage_name: str, error: Exception):
+        if self.on_error is None:
+            print(f"Error in pipeline stage '{stage_name}' for {tag}: {error}")
+            return
+        try:
+            self.on_error(tag, stage_name, error)
+        except Exception as e:
+            print(f"Error in pipeline error handler: {e}")
@@ -0,0 +1,127 @@
+import math
+import os
+from typing import List, Optional
+from .case_chunker import chunk_case_content
+
+# Rough local estimate for English text with some log output and JSON; Gemini
+# averages about 4 characters per token, so this errs on the high side
+CHARS_PER_TOKEN = 3.5
+
+# Input context windows of the models we route to (tokens)
+CONTEXT_WINDOWS = {
+    "gemini-2.0-flash-001": 1_048_576,
+    "gemini-2.0-flash-lite-001": 1_048_576,
+    "gemini-2.5-flash": 1_048_576,
+    "gemini-2.5-pro": 1_048_576,
+    "gemini-1.5-pro-002": 2_097_152,
+}
+# Assumed for models missing from the table
+DEFAULT_CONTEXT_WINDOW = 128_000
+
+TRUNCATION_MARKER = "\n[... {omitted} characters of the case history omitted to fit the token budget ...]\n"
+
+def estimate_tokens(text: str) -> int:
+    """Estimate the number of tokens Gemini will count for text, without an API call."""
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+class PromptPlan:
+    """How a case is sent to the model: which model, and the (possibly truncated) case content."""
+
+    def __init__(self, model_name: str, case_content: str, strategy: str,
+                 estimated_input_tokens: int, omitted_chars: int = 0, chunks: Optional[List[str]] = None):
+        self.model_name = model_name
+        self.case_content = case_content
+        self.strategy = strategy  # "full", "map_reduce", "long_context" or "truncated"
+        self.estimated_input_tokens = estimated_input_tokens
+        self.omitted_chars = omitted_chars
+        # For map_reduce: the pieces of the case history to summarize before rating
+        self.chunks = chunks
+
+class PromptBudget:
+    """Chooses a model and truncation strategy for a case from its estimated prompt size.
+
+    Cases whose prompt fits input_token_budget go to the default model as they are.
+    With map_reduce_threshold set, cases above it are split into chunks of about
+    map_reduce_chunk_tokens that are summarized separately before rating. Otherwise
+    larger cases are routed to long_context_model when one is configured and the
+    prompt fits its budget, or the middle of the case history is dropped so the
+    prompt fits, keeping the opening (the reported problem) and the end (the
+    resolution). Budgets are capped so the prompt plus max_output_tokens always fits
+    in the model's context window.
+    """
+
+    def __init__(self, model_name: str, input_token_budget: int, max_output_tokens: int = 2048,
+                 long_context_model: Optional[str] = None, long_context_budget: Optional[int] = None,
+                 map_reduce_threshold: int = 0, map_reduce_chunk_tokens: int = 20000):
+        self.model_name = model_name
+        self.max_output_tokens = max_output_tokens
+        self.map_reduce_threshold = map_reduce_threshold
+        self.map_reduce_chunk_tokens = min(map_reduce_chunk_tokens, input_token_budget)
+        self.input_token_budget = self._cap(model_name, input_token_budget)
+        self.long_context_model = long_context_model or None
+        self.long_context_budget = None
+        if self.long_context_model:
+            self.long_context_budget = self._cap(
+                self.long_context_model, long_context_budget or context_window(self.long_context_model)
+            )
+
+    def _cap(self, model_name: str, budget: int) -> int:
+        return min(budget, context_window(model_name) - self.max_output_tokens)
+
+    def plan(self, case_content: str, overhead_tokens: int, allow_map_reduce: bool = True) -> PromptPlan:
+        """Plan a request whose prompt is the case content plus overhead_tokens of instructions."""
+        estimated = overhead_tokens + estimate_tokens(case_content)
+        if allow_map_reduce and self.map_reduce_threshold and estimated > self.map_reduce_threshold:
+            chunks = chunk_case_content(case_content, int(self.map_reduce_chunk_tokens * CHARS_PER_TOKEN))
+            if len(chunks) > 1:
+                print(f"Prompt of ~{estimated} tokens exceeds the {self.map_reduce_threshold} token "
+                      f"map-reduce threshold, summarizing {len(chunks)} chunks first")
+                return PromptPlan(self.model_name, case_content, "map_reduce", estimated, chunks=chunks)
+
+        if estimated <= self.input_token_budget:
+            return PromptPlan(self.model_name, case_content, "full", estimated)
+
+        if self.long_context_model and estimated <= self.long_context_budget:
+            print(f"Prompt of ~{estimated} tokens exceeds the {self.input_token_budget} token budget, "
+                  f"routing to {self.long_context_model}")
+            return PromptPlan(self.long_context_model, case_content, "long_context", estimated)
+
+        if self.long_context_model:
+            model_name, budget = self.long_context_model, self.long_context_budget
+        else:
+            model_name, budget = self.model_name, self.input_token_budget
+        truncated, omitted_chars = truncate_middle(case_content, max(budget - overhead_tokens, 0))
+        print(f"Prompt of ~{estimated} tokens exceeds the {budget} token budget, "
+              f"omitting {omitted_chars} characters of the case history")
+        return PromptPlan(model_name, truncated, "truncated",
+                          overhead_tokens + estimate_tokens(truncated), omitted_chars)
+
+def truncate_middle(text: str, max_tokens: int):
+    """Drop the middle of text so it fits in about max_tokens, keeping its head and tail.
+
+    Returns the shortened text and the number of characters omitted.
+    """
+    max_chars = int(max_tokens * CHARS_PER_TOKEN)
+    if len(text) <= max_chars:
+        return text, 0
+    # Reserve room for the marker itself
+    keep = max(max_chars - len(TRUNCATION_MARKER) - 12, 0)
+    head = text[:keep // 2]
+    tail = text[len(text) - (keep - len(head)):] if keep > len(head) else ""
+    omitted = len(text) - len(head) - len(tail)
+    return head + TRUNCATION_MARKER.format(omitted=omitted) + tail, omitted
+
+def context_window(model_name: str) -> int:
+    return CONTEXT_WINDOWS.get(model_name, DEFAULT_CONTEXT_WINDOW)
+
+def budget_from_env(default_model: str) -> PromptBudget:
+    """Build the prompt budget configured by GEMINI_MODEL, PROMPT_INPUT_TOKEN_BUDGET and friends."""
+    return PromptBudget(
+        model_name=os.getenv('GEMINI_MODEL') or default_model,
+        input_token_budget=int(os.getenv('PROMPT_INPUT_TOKEN_BUDGET') or '120000'),
+        max_output_tokens=int(os.getenv('GEMINI_MAX_OUTPUT_TOKENS') or '2048'),
+        long_context_model=os.getenv('GEMINI_LONG_CONTEXT_MODEL') or None,
+        long_context_budget=int(os.getenv('LONG_CONTEXT_INPUT_TOKEN_BUDGET') or '0') or None,
+        map_reduce_threshold=int(os.getenv('MAP_REDUCE_THRESHOLD_TOKENS') or '60000'),
+        map_reduce_chunk_tokens=int(os.getenv('MAP_REDUCE_CHUNK_TOKENS') or '20000'),
+    )
@@ -0,0 +1,68 @@
+import hashlib
+import json
+import os
+import time
+from typing import Optional
+from .disk_cache import JsonFileCache
+
+class ResponseCache(JsonFileCache):
+    """On-disk cache of Gemini responses.
+
+    Entries are keyed by the model name, a hash of the prompt text and the
+    GenerateContentConfig, so re-auditing an unchanged case returns the stored
+    response instead of paying for another LLM call. Entries expire after
+    ttl_seconds and the least recently used ones are evicted past max_bytes.
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int = 256 * 1024 * 1024,
+                 ttl_seconds: float = 7 * 24 * 3600):
+        super().__init__(cache_dir, max_bytes)
+        self.ttl_seconds = ttl_seconds
+
+    @staticmethod
+    def make_key(model_name: str, prompt: str, config) -> str:
+        """Derive the cache key for a request from its model, prompt and generation config."""
+        digest = hashlib.sha256()
+        digest.update(model_name.encode("utf-8"))
+        digest.update(b"\0")
+        digest.update(hashlib.sha256(prompt.encode("utf-8")).digest())
+        digest.update(b"\0")
+        digest.update(config.model_dump_json(exclude_none=True, exclude={"response_schema"}).encode("utf-8"))
+        if config.response_schema is not None:
+            # A pydantic model class isn't serializable as part of the config; hash its JSON schema
+            schema = config.response_schema
+            if hasattr(schema, "model_json_schema"):
+                schema = schema.model_json_schema()
+            elif hasattr(schema, "model_dump"):
+                schema = schema.model_dump(mode="json", exclude_none=True)
+            digest.update(b"\0")
+            digest.update(json.dumps(schema, sort_keys=True).encode("utf-8"))
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached response text, or None on a miss or an expired entry."""
+        entry = self._read(key)
+        if entry is None:
+            return None
+        if time.time() - entry.get("created_at", 0) > self.ttl_seconds:
+            self.discard(key)
+            return None
+        self.touch(key)
+        return entry.get("response_text")
+
+    def put(self, key: str, model_name: str, response_text: str):
+        """Store a response that parsed into a valid report."""
+        self._write(key, {
+            "created_at": time.time(),
+            "model": model_name,
+            "response_text": response_text,
+        })
+
+def response_cache_from_env(root_dir: str) -> Optional[ResponseCache]:
+    """Build the response cache configured by RESPONSE_CACHE_DIR / _MAX_MB / _TTL_HOURS."""
+    cache_dir = os.getenv('RESPONSE_CACHE_DIR') or os.path.join(root_dir, "response_cache")
+    max_mb = int(os.getenv('RESPONSE_CACHE_MAX_MB') or '256')
+    ttl_hours = float(os.getenv('RESPONSE_CACHE_TTL_HOURS') or '168')
+    if max_mb <= 0 or ttl_hours <= 0:
+        return None
+    return ResponseCache(cache_dir, max_bytes=max_mb * 1024 * 1024, ttl_seconds=ttl_hours * 3600)
@@ -0,0 +1,94 @@
+import json
+from typing import Any, Dict, List, Tuple
+
+# Text allowed before the opening brace (markdown fences, a short preamble)
+MAX_PREFIX_CHARS = 1000
+
+class MalformedStreamError(ValueError):
+    """The streamed response can't be (or become) the JSON object we asked for."""
+
+class IncrementalJSONParser:
+    """Parses a JSON object from a response stream as the chunks arrive.
+
+    Each top-level member is decoded as soon as the text after it shows it is
+    complete, so callers can act on fields (e.g. the ratings) before the rest
+    of the response has been generated. `complete` turns True once the
+    top-level object is closed; anything after that is ignored. With strict
+    set, a member that isn't valid JSON aborts the parse; otherwise the
+    response is left to the lenient repair parsing after the stream ends.
+    """
+
+    def __init__(self, strict: bool = False):
+        self.strict = strict
+        self.fields: Dict[str, Any] = {}
+        self.complete = False
+        self._started = False
+        self._prefix_chars = 0
+        self._chars: List[str] = []
+        self._stack: List[str] = []
+        self._in_string = False
+        self._escaped = False
+        self._member_start = 0
+
+    @property
+    def document(self) -> str:
+        """The object's text from the opening brace up to what has been received."""
+        return "".join(self._chars)
+
+    def feed(self, text: str) -> List[Tuple[str, Any]]:
+        """Consume a chunk of the response; returns the top-level fields it completed."""
+        completed = []
+        for char in text:
+            if self.complete:
+                break
+            if not self._started:
+                if char == "{":
+                    self._started = True
+                    self._chars.append(char)
+                    self._stack.append(char)
+                    self._member_start = 1
+                    continue
+                self._prefix_chars += 1
+                if self._prefix_chars > MAX_PREFIX_CHARS:
+                    raise MalformedStreamError(f"No JSON object in the first {MAX_PREFIX_CHARS} characters")
+                continue
+
+            self._chars.append(char)
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char in "{[":
+                self._stack.append(char)
+            elif char in "}]":
+                opener = "{" if char == "}" else "["
+                if self._stack[-1] != opener:
+                    raise MalformedStreamError(f"Unexpected {char!r} at offset {len(self._chars) - 1}")
+                self._stack.pop()
+                if not self._stack:
+                    self._complete_member(completed)
+                    self.complete = True
+            elif char == "," and len(self._stack) == 1:
+                self._complete_member(completed)
+                self._member_start = len(self._chars)
+        return completed
+
+    def _complete_member(self, completed: list):
+        # The member runs from after the previous separator up to the separator just read
+        member = "".join(self._chars[self._member_start:-1]).strip()
+        if not member:
+            return
+        try:
+            value = json.loads("{" + member + "}")
+        except ValueError:
+            if self.strict:
+                raise MalformedStreamError(f"Invalid JSON member: {member[:80]}")
+            return
+        for name, field_value in value.items():
+            self.fields[name] = field_value
+            completed.append((name, field_value))
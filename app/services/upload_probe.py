@@ -0,0 +1,80 @@
+import hashlib
+import re
+from typing import Optional
+
+# Page objects ("/Type /Page", not "/Type /Pages") in uncompressed PDF object data
+PAGE_MARKER = re.compile(rb"/Type\s{0,8}/Page(?![A-Za-z])")
+
+# Bytes kept from the end of the previous chunk, so a marker split across chunks is still found
+MARKER_OVERLAP = 32
+
+# How far into the file PDF readers look for the "%PDF-" header
+HEADER_SEARCH_BYTES = 1024
+
+class UploadRejected(ValueError):
+    """The upload can't be accepted; status_code is the HTTP status to answer with."""
+
+    def __init__(self, message: str, status_code: int = 400):
+        super().__init__(message)
+        self.status_code = status_code
+
+class UploadProbe:
+    """Checks, hashes and counts the pages of an uploaded PDF as its chunks arrive.
+
+    feed() rejects the upload as soon as it exceeds max_bytes or doesn't start
+    like a PDF, so nothing more of it needs to be read. The page count comes
+    from the page objects seen in the raw bytes; PDFs that keep their page
+    objects in compressed object streams report None.
+    """
+
+    def __init__(self, max_bytes: Optional[int] = None):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._digest = hashlib.sha256()
+        self._pages = 0
+        self._tail = b""
+        # The first bytes, kept until the PDF header shows up in them
+        self._head = b""
+        self._header_seen = False
+
+    def feed(self, chunk: bytes):
+        if not self._header_seen:
+            self._check_header(chunk)
+        self.size += len(chunk)
+        if self.max_bytes is not None and self.size > self.max_bytes:
+            raise UploadRejected(f"The upload exceeds the {self.max_bytes / (1024 * 1024):g} MB limit",
+                                 status_code=413)
+        self._digest.update(chunk)
+        buffer = self._tail + chunk
+        # A marker counts once its next byte is known (to tell /Page from /Pages); markers
+        # ending inside the tail were counted with the previous chunk
+        self._pages += sum(1 for match in PAGE_MARKER.finditer(buffer)
+                           if len(self._tail) <= match.end() < len(buffer))
+        self._tail = buffer[-MARKER_OVERLAP:]
+
+    def _check_header(self, chunk: bytes):
+        # PDF readers accept the header anywhere in the first 1024 bytes, which may
+        # arrive over several small chunks
+        self._head += chunk[:HEADER_SEARCH_BYTES - len(self._head)]
+        if b"%PDF-" in self._head:
+            self._header_seen = True
+            self._head = b""
+        elif len(self._head) >= HEADER_SEARCH_BYTES:
+            raise UploadRejected("The uploaded file is not a PDF")
+
+    def finish(self):
+        """Account for the end of the upload (a marker right at the end of the file)."""
+        if self.size == 0:
+            raise UploadRejected("The uploaded file is empty")
+        if not self._header_seen:
+            raise UploadRejected("The uploaded file is not a PDF")
+        self._pages += sum(1 for match in PAGE_MARKER.finditer(self._tail) if match.end() == len(self._tail))
+        self._tail = b""
+
+    @property
+    def content_hash(self) -> str:
+        return self._digest.hexdigest()
+
+    @property
+    def page_count(self) -> Optional[int]:
+        return self._pages or None
@@ -0,0 +1,291 @@
+"""
+Job records and the processing stages shared by the API (main.py) and the job
+workers (worker.py).
+
+The API only records uploads as pending jobs; worker processes claim them from
+the job store with a lease and run them through extract -> analyze -> render.
+Progress events are recorded in the job store, from where the API relays them
+to event stream subscribers.
+"""
+
+import asyncio
+import os
+import sys
+import datetime
+
+# Add the parent directory to the Python path to allow importing from the app module
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from app.services.pdf_extractor import PDFExtractor
+from app.services.extraction_cache import cache_from_env
+from app.services.response_cache import response_cache_from_env
+from app.services.ai_analyzer import AIAnalyzer
+from app.services.report_generator import ReportGenerator
+from app.services.job_store import job_store_from_env
+from dotenv import load_dotenv
+
+# Load environment variables for Google AI
+load_dotenv()
+
+# Get project root directory
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Storage paths - using only the main project directories
+UPLOAD_DIR = os.path.join(ROOT_DIR, "pdf_uploads")
+REPORT_DIR = os.path.join(ROOT_DIR, "audit_reports")
+JOBS_DIR = os.path.join(ROOT_DIR, "application_server", "backend", "jobs")
+
+# Create directories if they don't exist
+os.makedirs(UPLOAD_DIR, exist_ok=True)
+os.makedirs(REPORT_DIR, exist_ok=True)
+os.makedirs(JOBS_DIR, exist_ok=True)
+
+# Persistent job records (SQLite by default; imports an existing all_jobs.json on first start).
+# Pending jobs in it are the work queue, so jobs survive restarts of the API and the workers.
+JOB_STORE = job_store_from_env(JOBS_DIR)
+
+# Get Google API configuration from environment variables
+PROJECT_ID = os.getenv('PROJECT_ID', 'webfocus-devops')
+LOCATION = os.getenv('LOCATION', 'global')
+
+# Content-addressed cache of extracted PDFs, shared with the CLI
+EXTRACTION_CACHE = cache_from_env(ROOT_DIR)
+
+# Cache of Gemini responses, so re-auditing an unchanged case skips the LLM call
+RESPONSE_CACHE = response_cache_from_env(ROOT_DIR)
+
+# Fields that release a worker's lease on a job
+LEASE_RELEASED = {"lease_owner": None, "lease_expires": None}
+
+class LeaseLost(Exception):
+    """The worker no longer holds the job (its lease expired and the job was requeued)."""
+
+# Function to get a formatted timestamp for a file
+def get_file_timestamp(file_path):
+    if not os.path.exists(file_path):
+        return None
+
+    # Get the modification time of the file
+    mod_time = os.path.getmtime(file_path)
+    dt = datetime.datetime.fromtimestamp(mod_time)
+
+    # Format the date (e.g., "May 10, 2025 11:30 PM")
+    return dt.strftime("%b %d, %Y %I:%M %p")
+
+# Helper function to convert path to relative path for storage
+def get_relative_path(full_path):
+    if os.path.isabs(full_path):
+        try:
+            rel_path = os.path.relpath(full_path, ROOT_DIR)
+            return rel_path
+        except ValueError:
+            # If paths are on different drives (Windows), just return the basename
+            return os.path.basename(full_path)
+    return full_path  # Already relative
+
+# Helper function to get absolute path from a possibly relative path
+def get_absolute_path(path):
+    if os.path.isabs(path):
+        return path
+    return os.path.join(ROOT_DIR, path)
+
+# Copy of a job record with relative paths, as it is stored
+def job_for_storage(job_info):
+    job_copy = dict(job_info)
+    if "report_url" in job_copy and job_copy["report_url"]:
+        job_copy["report_url"] = get_relative_path(job_copy["report_url"])
+    if "file_path" in job_copy and job_copy["file_path"]:
+        job_copy["file_path"] = get_relative_path(job_copy["file_path"])
+    return job_copy
+
+# Copy of a stored job record with absolute paths for use in the application
+def job_from_storage(job_info):
+    job_copy = dict(job_info)
+    if "report_url" in job_copy and job_copy["report_url"]:
+        job_copy["report_url"] = get_absolute_path(job_copy["report_url"])
+    if "file_path" in job_copy and job_copy["file_path"]:
+        job_copy["file_path"] = get_absolute_path(job_copy["file_path"])
+    return job_copy
+
+# Get a job from the store (with absolute paths), or None if there is no such job
+def get_job(job_id):
+    job_info = JOB_STORE.get(job_id)
+    return job_from_storage(job_info) if job_info is not None else None
+
+def job_version(job_id):
+    job_info = JOB_STORE.get(job_id)
+    return job_info.get("version", 0) if job_info is not None else 0
+
+# Save a single job (writes only that job to the store, which bumps its version)
+def save_job(job_id, job_info):
+    job_info_copy = dict(job_info)  # Create a copy to avoid modifying the original
+    job_info_copy["job_id"] = job_id  # Ensure job_id is included
+    JOB_STORE.save(job_id, job_for_storage(job_info_copy))
+
+# Save a new job unless an active job has the same case number or content hash (single-flight);
+# returns that job's id instead, or None if the job was saved
+def create_job_unless_active(job_id, job_info):
+    job_info_copy = dict(job_info)
+    job_info_copy["job_id"] = job_id
+    return JOB_STORE.create_unless_active(job_id, job_for_storage(job_info_copy))
+
+# First job recorded for a case, optionally ignoring one job
+def find_job_for_case(case_number, exclude_job_id=None):
+    for job_id in JOB_STORE.find(case_number=case_number):
+        if job_id != exclude_job_id:
+            return job_id
+    return None
+
+# Job that already has (or is producing) the result for a file with this content hash:
+# an active job, or a completed one whose report is still there
+def find_job_for_content(content_hash):
+    for job_id, job_info in JOB_STORE.find(content_hash=content_hash).items():
+        if job_info.get("status") in ("pending", "processing"):
+            return job_id
+        if job_info.get("status") == "completed" and os.path.exists(get_absolute_path(job_info.get("report_url") or "")):
+            return job_id
+    return None
+
+# Progress events for GET /jobs/{job_id}/events, recorded in the job store:
+# uploaded -> extracted -> analyzing (-> field, per AI response field) -> rendering -> done | failed
+# A job that turns out to duplicate one in progress gets attached, then that job's done | failed
+
+def publish_job_event(job_id, event, data=None):
+    JOB_STORE.append_event(job_id, event, data or {})
+
+def publish_job_state(job_id, event):
+    """Publish an event carrying the job's current record"""
+    publish_job_event(job_id, event, get_job(job_id) or {})
+
+# Processing stages, run by the job workers' pipelines. Each work item is a dict
+# carrying the job id, the worker's lease and the results of earlier stages.
+
+def update_job(work, **fields):
+    """Apply field updates to a job the worker holds (atomically, and only while it holds the lease)"""
+    updated = JOB_STORE.update(work["job_id"], job_for_storage(fields),
+                               expected={"lease_owner": work["lease_owner"]})
+    if updated is None:
+        raise LeaseLost(f"Job {work['job_id']} is no longer leased to {work['lease_owner']}")
+
+def finish_job(work, event, **fields):
+    """Give a job its final status and pass the outcome on to the jobs attached to it"""
+    job_id = work["job_id"]
+    update_job(work, **fields, **LEASE_RELEASED)
+    publish_job_state(job_id, event)
+    for attached_id in JOB_STORE.finish_attached(job_id, job_for_storage(fields)):
+        publish_job_state(attached_id, event)
+
+def extract_job(work):
+    """Pipeline stage: extract the case from the uploaded PDF"""
+    job_id = work["job_id"]
+
+    # Extract PDF content (the extraction cache makes this cheap for a retried job)
+    pdf_extractor = PDFExtractor(work["file_path"], cache=EXTRACTION_CACHE, content_hash=work.get("content_hash"))
+    parsed_document = pdf_extractor.parse()
+
+    # Check if we've already processed this case number (this should rarely happen due to upload checks)
+    case_number = parsed_document.case_info.case_number
+    existing_report_path = os.path.join(REPORT_DIR, f"case_{case_number}_audit.md")
+
+    # Look for a different job with the same case number
+    other_job_id = find_job_for_case(case_number, exclude_job_id=job_id)
+
+    # If another job already processed this case and the report exists, use it
+    if other_job_id and os.path.exists(existing_report_path):
+        # Update our job to point to the existing report
+        finish_job(
+            work, "done",
+            status="completed",
+            case_number=case_number,
+            report_url=get_relative_path(existing_report_path),
+            timestamp=get_file_timestamp(existing_report_path)
+        )
+        return None
+
+    # If another job is processing this case right now (uploaded concurrently, or with a
+    # different file), wait for its result instead of analyzing the case a second time
+    record = JOB_STORE.update_or_attach(job_id, {"case_number": case_number},
+                                        expected={"lease_owner": work["lease_owner"]})
+    if record is None:
+        raise LeaseLost(f"Job {job_id} is no longer leased to {work['lease_owner']}")
+    if record.get("attached_to"):
+        print(f"Case {case_number} is already being processed by job {record['attached_to']}, "
+              f"job {job_id} will receive its result")
+        publish_job_event(job_id, "attached", {"attached_to": record["attached_to"]})
+        return None
+
+    publish_job_event(job_id, "extracted", {"case_info": parsed_document.case_info.model_dump(mode="json")})
+    work["parsed_document"] = parsed_document
+    return work
+
+async def analyze_job(work):
+    """Pipeline stage: analyze the extracted case with AI (async, many cases in flight per thread)"""
+    parsed_document = work["parsed_document"]
+    analyzer = AIAnalyzer(project_id=PROJECT_ID, location=LOCATION, response_cache=RESPONSE_CACHE)
+    analysis_info = {}
+    # Store writes can wait on a lock; run them in threads so the other cases on this loop keep streaming
+    await asyncio.to_thread(publish_job_event, work["job_id"], "analyzing")
+    field_writes = []
+
+    def write_field(name, value):
+        # Fields reach event subscribers (and ratings reach status polls) while the response streams
+        try:
+            publish_job_event(work["job_id"], "field", {"name": name, "value": value})
+            if name == "ratings":
+                update_job(work, partial_ratings=value)
+        except Exception as e:
+            print(f"Error recording AI response field {name}: {e}")
+
+    async def write_field_after(previous, name, value):
+        if previous is not None:
+            await previous
+        await asyncio.to_thread(write_field, name, value)
+
+    def on_field(name, value):
+        # Called on the event loop: chain the writes so field events keep their order
+        previous = field_writes[-1] if field_writes else None
+        field_writes.append(asyncio.ensure_future(write_field_after(previous, name, value)))
+
+    try:
+        work["audit_report"] = await analyzer.analyze_case_async(
+            parsed_document.text, parsed_document.case_info,
+            use_cache=not work.get("bypass_cache"), analysis_info=analysis_info, on_field=on_field
+        )
+    finally:
+        # Field events land before the job's next state
+        if field_writes:
+            await field_writes[-1]
+    await asyncio.to_thread(update_job, work, **analysis_info)
+    return work
+
+def render_job(work):
+    """Pipeline stage: generate the Markdown report and complete the job"""
+    job_id = work["job_id"]
+    case_number = work["parsed_document"].case_info.case_number
+    publish_job_event(job_id, "rendering")
+
+    # Generate report
+    report_path = os.path.join(REPORT_DIR, f"case_{case_number}_audit.md")
+    report_generator = ReportGenerator(report_path)
+    report_generator.generate_report(work["audit_report"])
+
+    # Update job status
+    finish_job(
+        work, "done",
+        status="completed",
+        case_number=case_number,
+        report_url=get_relative_path(report_path),  # Store relative path
+        timestamp=get_file_timestamp(report_path)
+    )
+    return job_id
+
+def fail_job(job_id, lease_owner, stage_name, error):
+    """Mark a job the worker holds as failed"""
+    if isinstance(error, LeaseLost):
+        print(f"Dropping job {job_id} during {stage_name}: {error}")
+        return
+    print(f"Job {job_id} failed during {stage_name}: {error}")
+    try:
+        finish_job({"job_id": job_id, "lease_owner": lease_owner}, "failed", status="failed", error=str(error))
+    except LeaseLost:
+        pass
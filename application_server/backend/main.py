@@ -1,30 +1,39 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException, BackgroundTasks
-from fastapi.responses import FileResponse
+from fastapi import FastAPI, UploadFile, File, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-import shutil
+from starlette.requests import ClientDisconnect
 import os
 import uuid
-from typing import List, Optional
+from typing import Dict, List, Optional
 import uvicorn
 from pydantic import BaseModel
 import tempfile
-import sys
 import glob
 import re
 import datetime
 import json
-
-# Add the parent directory to the Python path to allow importing from the app module
-sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+import time
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+# Job records, storage paths and configuration shared with the job workers (worker.py);
+# it also puts the project root on the Python path for the app module
+from job_processing import (
+    ROOT_DIR, UPLOAD_DIR, REPORT_DIR, JOBS_DIR, JOB_STORE, EXTRACTION_CACHE,
+    get_file_timestamp, get_relative_path, job_from_storage,
+    get_job, job_version, save_job, create_job_unless_active, find_job_for_case, find_job_for_content,
+    publish_job_event
+)
 
 # Import our existing services
 from app.services.pdf_extractor import PDFExtractor
-from app.services.ai_analyzer import AIAnalyzer
-from app.services.report_generator import ReportGenerator
-from dotenv import load_dotenv
-
-# Load environment variables for Google AI
-load_dotenv()
+from app.services.upload_probe import UploadProbe, UploadRejected
+from app.services.job_events import ChangeNotifier, JobEventBroker, format_sse
 
 app = FastAPI(title="TIBCO Case Audit API", 
               description="API for analyzing TIBCO support case quality")
@@ -38,29 +47,59 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Get project root directory
-ROOT_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Size of the pieces an upload is written (and hashed) in
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+# Largest accepted upload; larger ones are rejected (413) before or while they are received
+MAX_UPLOAD_BYTES = int(float(os.getenv('MAX_UPLOAD_MB', '512')) * 1024 * 1024)
+
+# Resumable uploads in progress (partial files and their metadata), and how long an upload
+# may go without new data before it is deleted
+PARTIAL_UPLOAD_DIR = os.path.join(UPLOAD_DIR, "partial")
+os.makedirs(PARTIAL_UPLOAD_DIR, exist_ok=True)
+UPLOAD_SESSION_HOURS = float(os.getenv('UPLOAD_SESSION_HOURS', '24'))
 
-# Storage paths - using only the main project directories
-UPLOAD_DIR = os.path.join(ROOT_DIR, "pdf_uploads")
-REPORT_DIR = os.path.join(ROOT_DIR, "audit_reports")
-JOBS_DIR = os.path.join(ROOT_DIR, "application_server", "backend", "jobs")
-JOBS_FILE = os.path.join(JOBS_DIR, "all_jobs.json")
+# Longest a long-polling /status request is held open (the wait parameter is capped to this)
+MAX_STATUS_WAIT_SECONDS = float(os.getenv('MAX_STATUS_WAIT_SECONDS', '60'))
 
-# Create directories if they don't exist
-os.makedirs(UPLOAD_DIR, exist_ok=True)
-os.makedirs(REPORT_DIR, exist_ok=True)
-os.makedirs(JOBS_DIR, exist_ok=True)
+# How often job progress recorded by the workers is picked up from the store
+JOB_POLL_SECONDS = float(os.getenv('JOB_POLL_SECONDS', '0.5'))
 
-# Get Google API configuration from environment variables
-PROJECT_ID = os.getenv('PROJECT_ID', 'webfocus-devops')
-LOCATION = os.getenv('LOCATION', 'global')
+# Stats snapshots written by the job workers; ones older than this are from workers that are gone
+WORKER_STATS_DIR = os.path.join(JOBS_DIR, "workers")
+WORKER_STATS_MAX_AGE_SECONDS = float(os.getenv('JOB_LEASE_SECONDS', '60'))
+
+@app.middleware("http")
+async def reject_oversized_uploads(request: Request, call_next):
+    """Refuse uploads that declare a body over MAX_UPLOAD_BYTES before any of it is read"""
+    if request.method == "POST" and request.url.path.startswith("/upload"):
+        try:
+            declared_size = int(request.headers.get("content-length") or 0)
+        except ValueError:
+            declared_size = 0
+        if declared_size > MAX_UPLOAD_BYTES:
+            return JSONResponse(status_code=413, content={
+                "detail": f"The upload exceeds the {MAX_UPLOAD_BYTES / (1024 * 1024):g} MB limit"
+            })
+    return await call_next(request)
 
 # Response models
 class ProcessResponse(BaseModel):
     job_id: str
     message: str
 
+class UploadSessionRequest(BaseModel):
+    filename: str
+    size: int  # total size of the PDF in bytes
+    bypass_cache: bool = False
+
+class UploadSession(BaseModel):
+    upload_id: str
+    filename: str
+    size: int
+    offset: int  # bytes received so far; the next chunk starts here
+    bypass_cache: bool = False
+
 class JobStatus(BaseModel):
     job_id: str
     status: str  # "pending", "processing", "completed", "failed"
@@ -68,142 +107,83 @@ class JobStatus(BaseModel):
     report_url: Optional[str] = None
     error: Optional[str] = None
     timestamp: Optional[str] = None
+    response_cache: Optional[str] = None  # "hit", "miss", "bypass" or "disabled"
+    llm_model: Optional[str] = None
+    prompt_strategy: Optional[str] = None  # "full", "map_reduce", "long_context" or "truncated"
+    token_usage: Optional[Dict[str, int]] = None  # estimated and actual token counts
+    map_reduce: Optional[Dict[str, int]] = None  # chunk counts for cases summarized in parts
+    llm_retries: Optional[int] = None  # transient Gemini failures retried by the scheduler
+    response_parse: Optional[str] = None  # "structured", "lenient" or "failed"
+    repaired_fields: Optional[List[str]] = None  # fields filled in by a follow-up request
+    partial_ratings: Optional[dict] = None  # ratings parsed while the AI response is still streaming
+    page_count: Optional[int] = None  # pages counted while the PDF was uploaded (None if not countable)
+    attempts: Optional[int] = None  # times a worker has claimed the job (more than 1 after a worker crash)
+    attached_to: Optional[str] = None  # job processing the same case, whose result this job will receive
+    version: int = 0  # increases on every change to the job record
 
 class DeleteResponse(BaseModel):
     case_number: str
     message: str
     success: bool
 
-# In-memory job tracking (would use a database in production)
-jobs = {}
+# Job records live only in JOB_STORE, which the API processes and the job workers share, so
+# the backend can run with uvicorn --workers N. Nothing about jobs is kept in module globals.
+# Uploads are only queued here; the workers (worker.py) process them.
 
-# Keep track of case numbers we've seen to avoid duplicates
-processed_case_numbers = set()
+# Progress events for GET /jobs/{job_id}/events. Workers record them in the job store and
+# relay_job_events() copies them into this broker, which streams them to subscribers.
+job_events = JobEventBroker()
 
-# Function to get a formatted timestamp for a file
-def get_file_timestamp(file_path):
-    if not os.path.exists(file_path):
-        return None
-    
-    # Get the modification time of the file
-    mod_time = os.path.getmtime(file_path)
-    dt = datetime.datetime.fromtimestamp(mod_time)
-    
-    # Format the date (e.g., "May 10, 2025 11:30 PM")
-    return dt.strftime("%b %d, %Y %I:%M %p")
+# Wakes long-polling /status requests in this process when a job record changes; the relay
+# notifies it for every job event, and waiters also re-read the store every JOB_POLL_SECONDS
+job_changes = ChangeNotifier()
 
-# Helper function to convert path to relative path for storage
-def get_relative_path(full_path):
-    if os.path.isabs(full_path):
+def relay_job_events():
+    """Background thread: pass job events recorded by the workers on to this process's subscribers"""
+    last_event_id = JOB_STORE.last_event_id()
+    while True:
         try:
-            rel_path = os.path.relpath(full_path, ROOT_DIR)
-            return rel_path
-        except ValueError:
-            # If paths are on different drives (Windows), just return the basename
-            return os.path.basename(full_path)
-    return full_path  # Already relative
-
-# Helper function to get absolute path from a possibly relative path
-def get_absolute_path(path):
-    if os.path.isabs(path):
-        return path
-    return os.path.join(ROOT_DIR, path)
-
-# Save all jobs to a single JSON file
-def save_all_jobs():
-    try:
-        # Make a deep copy of jobs with relative paths for storage
-        jobs_for_storage = {}
-        for job_id, job_info in jobs.items():
-            job_copy = dict(job_info)
-            # Convert absolute paths to relative for storage
-            if "report_url" in job_copy and job_copy["report_url"]:
-                job_copy["report_url"] = get_relative_path(job_copy["report_url"])
-            if "file_path" in job_copy and job_copy["file_path"]:
-                job_copy["file_path"] = get_relative_path(job_copy["file_path"])
-            jobs_for_storage[job_id] = job_copy
-            
-        with open(JOBS_FILE, 'w') as f:
-            json.dump(jobs_for_storage, f, indent=2)
-    except Exception as e:
-        print(f"Error saving jobs: {e}")
-
-# Save a single job (updates the full jobs file)
-def save_job(job_id, job_info):
-    job_info_copy = dict(job_info)  # Create a copy to avoid modifying the original
-    job_info_copy["job_id"] = job_id  # Ensure job_id is included
-    
-    # Update the job in memory
-    jobs[job_id] = job_info_copy
-    
-    # Save all jobs to file
-    save_all_jobs()
-
-# Load all jobs from the single file
-def load_all_jobs():
-    if not os.path.exists(JOBS_FILE):
-        return {}
-    
-    try:
-        with open(JOBS_FILE, 'r') as f:
-            loaded_jobs = json.load(f)
-            
-            # Convert any relative paths to absolute paths for use in the application
-            for job_id, job_info in loaded_jobs.items():
-                if "report_url" in job_info and job_info["report_url"]:
-                    job_info["report_url"] = get_absolute_path(job_info["report_url"])
-                if "file_path" in job_info and job_info["file_path"]:
-                    job_info["file_path"] = get_absolute_path(job_info["file_path"])
-                
-                # Extract case numbers from all jobs to populate processed_case_numbers
-                if "case_number" in job_info:
-                    processed_case_numbers.add(job_info["case_number"])
-                    
-            return loaded_jobs
-    except Exception as e:
-        print(f"Error loading jobs: {e}")
-        return {}
-
-# Clean up the all_jobs.json file by removing duplicate entries for the same case
+            events = JOB_STORE.events_after(last_event_id)
+        except Exception as e:
+            print(f"Error reading job events: {e}")
+            events = []
+        for event_id, job_id, event, data in events:
+            job_events.publish(job_id, event, data, event_id=event_id)
+            job_changes.notify(job_id)
+            last_event_id = event_id
+        if not events:
+            time.sleep(JOB_POLL_SECONDS)
+
+threading.Thread(target=relay_job_events, name="job-event-relay", daemon=True).start()
+
+# Clean up the job store by removing duplicate entries for the same case
 def clean_jobs_file():
-    global jobs
-    case_to_job_map = {}
+    first_job_for_case = {}
     jobs_to_remove = []
     
-    # First pass: find duplicate entries for each case number
-    for job_id, job_info in jobs.items():
-        if "case_number" in job_info:
-            case_number = job_info["case_number"]
-            
-            # Keep the first entry we find for each case number
-            if case_number not in case_to_job_map:
-                case_to_job_map[case_number] = job_id
-            else:
-                # This is a duplicate entry for this case
-                jobs_to_remove.append(job_id)
-    
-    # Second pass: remove duplicates
-    for job_id in jobs_to_remove:
-        if job_id in jobs:
+    # Keep the first entry for each case number; the rest are duplicates
+    for job_id, job_info in JOB_STORE.all().items():
+        case_number = job_info.get("case_number")
+        # Queued and running jobs aren't duplicates yet; they finish with their own result
+        if not case_number or job_info.get("status") in ("pending", "processing"):
+            continue
+        if case_number not in first_job_for_case:
+            first_job_for_case[case_number] = job_id
+        else:
             print(f"Removing duplicate entry: {job_id}")
-            del jobs[job_id]
+            jobs_to_remove.append(job_id)
     
-    # Save the cleaned jobs file
     if jobs_to_remove:
         print(f"Removed {len(jobs_to_remove)} duplicate entries")
-        save_all_jobs()
+        JOB_STORE.delete(jobs_to_remove)
         return len(jobs_to_remove)
     return 0
 
 # Load existing reports at startup
 def load_existing_reports():
-    # Load all saved jobs first
-    global jobs
-    jobs = load_all_jobs()
-    
     # Find all Markdown files in the main audit_reports directory
     report_files = glob.glob(os.path.join(REPORT_DIR, "*.md"))
-    jobs_updated = False
+    new_jobs = {}
     
     for report_file in report_files:
         filename = os.path.basename(report_file)
@@ -212,15 +192,8 @@ def load_existing_reports():
         if match:
             case_number = match.group(1)
             
-            # Add to our tracked case numbers
-            processed_case_numbers.add(case_number)
-            
             # Check if we already have a job for this case number
-            existing_job = None
-            for job_id, job in jobs.items():
-                if job.get("case_number") == case_number:
-                    existing_job = job_id
-                    break
+            existing_job = find_job_for_case(case_number)
             
             # Create a virtual job for this report if it doesn't exist
             if not existing_job:
@@ -242,154 +215,417 @@ def load_existing_reports():
                     "timestamp": timestamp
                 }
                 
-                # Save to memory - will be converted to absolute when needed
-                jobs[job_id] = job_info
-                jobs_updated = True
+                new_jobs[job_id] = job_info
     
     # Clean up duplicate reused entries
     clean_jobs_file()
     
-    # Save all jobs if we added any new ones
-    if jobs_updated:
-        save_all_jobs()
+    # Save the jobs we added in one batch
+    if new_jobs:
+        JOB_STORE.save_many(new_jobs)
 
-# Load existing reports on startup
+# Load existing reports on startup (every worker process does this; it is idempotent)
 load_existing_reports()
 
-@app.post("/upload/", response_model=ProcessResponse)
-async def upload_pdf(background_tasks: BackgroundTasks, file: UploadFile = File(...)):
-    """Upload a TIBCO case PDF for processing"""
+async def queue_upload(job_id, file_path, filename, probe, bypass_cache=False):
+    """Queue a received and probed PDF for the job workers, unless the same file or case is
+    already processed or being processed; returns the ProcessResponse for the upload"""
+    content_hash = probe.content_hash
+    
+    # A byte-identical file that is already processed or being processed gets that job back
+    # without being parsed at all
+    existing_job_id = await run_in_threadpool(find_job_for_content, content_hash)
+    if existing_job_id:
+        print(f"{filename} is identical to the file of job {existing_job_id}")
+        try:
+            os.remove(file_path)
+        except Exception as e:
+            print(f"Error removing file: {e}")
+        return {"job_id": existing_job_id, "message": "Identical file already uploaded, using that job"}
+    
+    # Concurrent uploads of the same file or case are coalesced by content hash and case number
+    case_number = None
+    
+    # Check if this PDF might be a duplicate by extracting case number first.
+    # Only the header pages are read here; the full parse happens in a job worker.
+    # The probe already hashed the upload, so the extraction cache lookup doesn't reread it
+    pdf_extractor = PDFExtractor(file_path, cache=EXTRACTION_CACHE, content_hash=content_hash)
     try:
-        # Generate a unique job ID
-        job_id = str(uuid.uuid4())
+        print(f"Checking file: {filename}")
+        case_info = await run_in_threadpool(pdf_extractor.extract_case_info, header_only=True)
+        case_number = case_info.case_number
         
-        # Save uploaded file temporarily
-        file_path = os.path.join(UPLOAD_DIR, f"{job_id}_{file.filename}")
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+        print(f"Extracted case number: {case_number}")
         
-        # Check if this PDF might be a duplicate by extracting case number first
-        try:
-            print(f"Checking file: {file.filename}")
-            pdf_extractor = PDFExtractor(file_path)
-            case_info = pdf_extractor.extract_case_info()
-            case_number = case_info.case_number
+        # Check if we've seen this case number before and if a report exists
+        existing_report_path = os.path.join(REPORT_DIR, f"case_{case_number}_audit.md")
+        
+        # Look for existing job entry for this case number
+        existing_job_id = await run_in_threadpool(find_job_for_case, case_number)
+        
+        if existing_job_id and os.path.exists(existing_report_path):
+            print(f"Case {case_number} already processed with job ID {existing_job_id}")
             
-            print(f"Extracted case number: {case_number}")
-            print(f"Current processed case numbers: {processed_case_numbers}")
+            # Use the existing job ID - no need to create a new entry
+            # Clean up the temporary uploaded file since we don't need it
+            try:
+                os.remove(file_path)
+                print(f"Removed temporary file: {file_path}")
+            except Exception as e:
+                print(f"Error removing file: {e}")
             
-            # Check if we've seen this case number before and if a report exists
-            existing_report_path = os.path.join(REPORT_DIR, f"case_{case_number}_audit.md")
+            return {"job_id": existing_job_id, "message": f"Using existing report for case {case_number}"}
+        
+        # If the report exists but no job entry (perhaps from a manual reset), create a single entry
+        if os.path.exists(existing_report_path) and not existing_job_id:
+            print(f"Found existing report for case {case_number} but no job entry")
             
-            # Look for existing job entry for this case number
-            existing_job_id = None
-            for existing_id, existing_info in jobs.items():
-                if existing_info.get("case_number") == case_number:
-                    existing_job_id = existing_id
-                    break
+            # Create a simple job entry with the original UUID
+            timestamp = get_file_timestamp(existing_report_path)
             
-            if existing_job_id and os.path.exists(existing_report_path):
-                print(f"Case {case_number} already processed with job ID {existing_job_id}")
-                
-                # Use the existing job ID - no need to create a new entry
-                # Clean up the temporary uploaded file since we don't need it
-                try:
-                    os.remove(file_path)
-                    print(f"Removed temporary file: {file_path}")
-                except Exception as e:
-                    print(f"Error removing file: {e}")
-                
-                # Add to processed case numbers if not already there
-                processed_case_numbers.add(case_number)
-                
-                return {"job_id": existing_job_id, "message": f"Using existing report for case {case_number}"}
+            # Get relative path for storage consistency
+            rel_path = get_relative_path(existing_report_path)
             
-            # If the report exists but no job entry (perhaps from a manual reset), create a single entry
-            if os.path.exists(existing_report_path) and not existing_job_id:
-                print(f"Found existing report for case {case_number} but no job entry")
-                
-                # Add to processed_case_numbers
-                processed_case_numbers.add(case_number)
-                
-                # Create a simple job entry with the original UUID
-                timestamp = get_file_timestamp(existing_report_path)
-                
-                # Get relative path for storage consistency
-                rel_path = get_relative_path(existing_report_path)
-                
-                job_info = {
-                    "job_id": job_id,
-                    "status": "completed",
-                    "case_number": case_number,
-                    "report_url": rel_path,
-                    "timestamp": timestamp
-                }
-                
-                # Save to memory and disk
-                save_job(job_id, job_info)
-                
-                # Clean up the temporary uploaded file since we don't need it
-                try:
-                    os.remove(file_path)
-                except Exception as e:
-                    print(f"Error removing file: {e}")
-                    
-                return {"job_id": job_id, "message": f"Found existing report for case {case_number}"}
+            job_info = {
+                "job_id": job_id,
+                "status": "completed",
+                "case_number": case_number,
+                "content_hash": content_hash,
+                "report_url": rel_path,
+                "timestamp": timestamp
+            }
+            
+            # Save to memory and disk
+            await run_in_threadpool(save_job, job_id, job_info)
+            
+            # Clean up the temporary uploaded file since we don't need it
+            try:
+                os.remove(file_path)
+            except Exception as e:
+                print(f"Error removing file: {e}")
                 
-        except Exception as e:
-            print(f"Error checking for duplicate: {e}")
-            # Continue with normal processing if we can't check for duplicates
+            return {"job_id": job_id, "message": f"Found existing report for case {case_number}"}
             
-        # Get relative file path for storage
-        rel_file_path = get_relative_path(file_path)
+    except Exception as e:
+        print(f"Error checking for duplicate: {e}")
+        # Continue with normal processing if we can't check for duplicates
         
-        # Start background processing for new file
-        job_info = {
-            "job_id": job_id, 
-            "status": "pending", 
-            "file_path": rel_file_path,
-            "timestamp": datetime.datetime.now().strftime("%b %d, %Y %I:%M %p")
-        }
+    # Get relative file path for storage
+    rel_file_path = get_relative_path(file_path)
+    
+    # Queue the new file for the job workers: a pending job in the store is the queue entry
+    job_info = {
+        "job_id": job_id, 
+        "status": "pending", 
+        "case_number": case_number,
+        "content_hash": content_hash,
+        "page_count": probe.page_count,
+        "file_path": rel_file_path,
+        "bypass_cache": bypass_cache,
+        "timestamp": datetime.datetime.now().strftime("%b %d, %Y %I:%M %p")
+    }
+    
+    # Save to the job store, unless the same case is already queued or being processed
+    # (by any API or worker process): then the upload follows that job instead
+    active_job_id = await run_in_threadpool(create_job_unless_active, job_id, job_info)
+    if active_job_id:
+        print(f"Case {case_number or filename} is already being processed by job {active_job_id}")
+        try:
+            os.remove(file_path)
+        except Exception as e:
+            print(f"Error removing file: {e}")
+        return {"job_id": active_job_id, "message": "This case is already being processed, following that job"}
+    await run_in_threadpool(publish_job_event, job_id, "uploaded", job_info)
+    
+    return {"job_id": job_id, "message": "PDF uploaded and queued for processing"}
+
+@app.post("/upload/", response_model=ProcessResponse)
+async def upload_pdf(file: UploadFile = File(...), bypass_cache: bool = False):
+    """Upload a TIBCO case PDF for processing (bypass_cache=true forces a fresh AI analysis)"""
+    try:
+        # Generate a unique job ID
+        job_id = str(uuid.uuid4())
         
-        # Save to memory and disk
-        save_job(job_id, job_info)
+        # Save uploaded file temporarily, chunk by chunk: reads, hashing and writes run off the
+        # event loop, so a large upload doesn't hold up other requests
+        file_path = os.path.join(UPLOAD_DIR, f"{job_id}_{file.filename}")
+        probe = UploadProbe(max_bytes=MAX_UPLOAD_BYTES)
         
-        # Start processing
-        background_tasks.add_task(process_pdf, job_id, file_path)
+        def write_chunk(buffer, chunk):
+            probe.feed(chunk)
+            buffer.write(chunk)
         
-        return {"job_id": job_id, "message": "PDF uploaded and processing started"}
-    
+        buffer = await run_in_threadpool(open, file_path, "wb")
+        try:
+            while True:
+                chunk = await file.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                await run_in_threadpool(write_chunk, buffer, chunk)
+            await run_in_threadpool(buffer.close)
+            probe.finish()
+        except BaseException as e:
+            # The upload isn't queued: don't leave the partial file behind, whether the file was
+            # rejected, the disk failed or the client went away (which cancels the request)
+            buffer.close()
+            try:
+                os.remove(file_path)
+            except OSError as remove_error:
+                print(f"Error removing file: {remove_error}")
+            if isinstance(e, UploadRejected):
+                raise HTTPException(status_code=e.status_code, detail=str(e))
+            raise
+        return await queue_upload(job_id, file_path, file.filename, probe, bypass_cache)
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error uploading file: {str(e)}")
+
+# Resumable uploads, for large PDFs over unreliable connections: the client creates an
+# upload, appends chunks at the offset the server reports, asks for the offset again
+# after a dropped connection, and finalizes the upload once all bytes are there.
+# The partial file on disk is the upload's state (its size is the offset), so every
+# byte that reached the server before a drop is kept, and any API process can continue it.
+
+def upload_session_paths(upload_id):
+    """Metadata and partial file paths of a resumable upload (404 for an unknown id)"""
+    try:
+        upload_id = str(uuid.UUID(upload_id))
+    except ValueError:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    return (os.path.join(PARTIAL_UPLOAD_DIR, f"{upload_id}.json"),
+            os.path.join(PARTIAL_UPLOAD_DIR, f"{upload_id}.part"))
+
+def load_upload_session(upload_id):
+    meta_path, part_path = upload_session_paths(upload_id)
+    try:
+        with open(meta_path, 'r') as f:
+            session = json.load(f)
+        session["offset"] = os.path.getsize(part_path)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    return session
+
+def remove_expired_upload_sessions():
+    """Delete resumable uploads that were never finalized"""
+    cutoff = time.time() - UPLOAD_SESSION_HOURS * 3600
+    for meta_path in glob.glob(os.path.join(PARTIAL_UPLOAD_DIR, "*.json")):
+        try:
+            if os.path.getmtime(meta_path) >= cutoff:
+                continue
+            part_path = meta_path[:-len(".json")] + ".part"
+            if os.path.exists(part_path) and os.path.getmtime(part_path) >= cutoff:
+                continue
+            print(f"Removing expired upload {os.path.basename(meta_path)[:-len('.json')]}")
+            os.remove(meta_path)
+            if os.path.exists(part_path):
+                os.remove(part_path)
+        except OSError as e:
+            print(f"Error removing expired upload: {e}")
+
+@app.post("/uploads/", response_model=UploadSession)
+async def create_upload(request: UploadSessionRequest):
+    """Start a resumable upload of a PDF of the given size"""
+    if request.size <= 0:
+        raise HTTPException(status_code=400, detail="The upload size must be positive")
+    if request.size > MAX_UPLOAD_BYTES:
+        raise HTTPException(status_code=413,
+                            detail=f"The upload exceeds the {MAX_UPLOAD_BYTES / (1024 * 1024):g} MB limit")
+    await run_in_threadpool(remove_expired_upload_sessions)
+
+    upload_id = str(uuid.uuid4())
+    session = {
+        "upload_id": upload_id,
+        "filename": os.path.basename(request.filename) or "upload.pdf",
+        "size": request.size,
+        "bypass_cache": request.bypass_cache,
+    }
+    meta_path, part_path = upload_session_paths(upload_id)
+    open(part_path, 'wb').close()
+    with open(meta_path, 'w') as f:
+        json.dump(session, f)
+    print(f"Started upload {upload_id} of {session['filename']} ({request.size} bytes)")
+    return {**session, "offset": 0}
+
+@app.get("/uploads/{upload_id}", response_model=UploadSession)
+async def get_upload(upload_id: str):
+    """Offset to continue a resumable upload from (the number of bytes received so far)"""
+    return load_upload_session(upload_id)
+
+@app.put("/uploads/{upload_id}", response_model=UploadSession)
+async def append_upload_chunk(upload_id: str, offset: int, request: Request):
+    """Append the request body to a resumable upload; offset must be the upload's current offset"""
+    session = load_upload_session(upload_id)
+    _, part_path = upload_session_paths(upload_id)
+
+    with open(part_path, 'ab') as part:
+        # One append at a time per upload, also across API processes
+        if fcntl is not None:
+            try:
+                fcntl.flock(part, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                raise HTTPException(status_code=409, detail="Another chunk is being appended to this upload")
+        received = os.path.getsize(part_path)
+        if offset != received:
+            raise HTTPException(status_code=409, detail=f"The upload is at offset {received}, not {offset}")
+
+        def write_buffer(data):
+            part.write(data)
+            part.flush()
+
+        # The body is written as it arrives; if the connection drops, what was received is kept
+        buffer = bytearray()
+        try:
+            async for data in request.stream():
+                if received + len(buffer) + len(data) > session["size"]:
+                    raise HTTPException(status_code=413,
+                                        detail=f"The chunk goes past the upload size of {session['size']} bytes")
+                buffer += data
+                if len(buffer) >= UPLOAD_CHUNK_SIZE:
+                    await run_in_threadpool(write_buffer, bytes(buffer))
+                    received += len(buffer)
+                    buffer.clear()
+        except ClientDisconnect:
+            print(f"Connection dropped during upload {upload_id}, keeping {received + len(buffer)} bytes")
+        finally:
+            if buffer:
+                await run_in_threadpool(write_buffer, bytes(buffer))
+                received += len(buffer)
+
+    return {**session, "offset": received}
+
+@app.post("/uploads/{upload_id}/finalize", response_model=ProcessResponse)
+async def finalize_upload(upload_id: str):
+    """Complete a resumable upload and queue the PDF for processing like POST /upload/"""
+    session = load_upload_session(upload_id)
+    meta_path, part_path = upload_session_paths(upload_id)
+    if session["offset"] != session["size"]:
+        raise HTTPException(status_code=409,
+                            detail=f"The upload is incomplete: {session['offset']} of {session['size']} bytes received")
+
+    # Moving the file finalizes the upload, so a repeated or concurrent finalize gets a 404
+    job_id = session["upload_id"]
+    file_path = os.path.join(UPLOAD_DIR, f"{job_id}_{session['filename']}")
+    try:
+        os.replace(part_path, file_path)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    os.remove(meta_path)
+
+    try:
+        # Check, hash and count the pages of the assembled file (as POST /upload/ does while receiving)
+        probe = UploadProbe(max_bytes=MAX_UPLOAD_BYTES)
+
+        def probe_file():
+            with open(file_path, 'rb') as f:
+                while True:
+                    chunk = f.read(UPLOAD_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    probe.feed(chunk)
+            probe.finish()
+
+        try:
+            await run_in_threadpool(probe_file)
+        except UploadRejected as e:
+            os.remove(file_path)
+            raise HTTPException(status_code=e.status_code, detail=str(e))
+
+        return await queue_upload(job_id, file_path, session["filename"], probe, session["bypass_cache"])
+
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error uploading file: {str(e)}")
 
 @app.get("/status/{job_id}", response_model=JobStatus)
-async def get_job_status(job_id: str):
-    """Check the status of a processing job"""
-    # Try to reload all jobs if this job isn't found
-    global jobs
-    if job_id not in jobs:
-        jobs = load_all_jobs()
-    
-    if job_id not in jobs:
+async def get_job_status(job_id: str, wait: float = 0, since_version: Optional[int] = None):
+    """Check the status of a processing job.
+
+    With wait > 0 this long-polls: the response is held for up to wait seconds (capped at
+    MAX_STATUS_WAIT_SECONDS) until the job's version exceeds since_version. Without
+    since_version it waits for the next change, unless the job has already finished.
+    """
+    # Store reads run in the threadpool: with the JSON store they take a file lock and may reparse the file
+    job_data = await run_in_threadpool(get_job, job_id)
+    if job_data is None:
         raise HTTPException(status_code=404, detail="Job not found")
     
+    if wait > 0:
+        if since_version is not None or job_data.get("status") not in ("completed", "failed"):
+            if since_version is None:
+                since_version = job_data.get("version", 0)
+            async def changed():
+                return await run_in_threadpool(job_version, job_id) > since_version
+            
+            # Waits on the event loop, so held requests don't tie up threads between checks
+            await job_changes.wait_for(job_id, changed, min(wait, MAX_STATUS_WAIT_SECONDS),
+                                       poll_interval=JOB_POLL_SECONDS)
+            job_data = await run_in_threadpool(get_job, job_id)
+            if job_data is None:
+                raise HTTPException(status_code=404, detail="Job not found")
+    
     # Make sure job_id is included in the data
-    job_data = dict(jobs[job_id])
     if "job_id" not in job_data:
         job_data["job_id"] = job_id
     
     return JobStatus(**job_data)
 
+@app.get("/jobs/{job_id}/events")
+async def job_event_stream(job_id: str, request: Request):
+    """Stream a job's progress as server-sent events until it is done or failed"""
+    try:
+        last_event_id = int(request.headers.get("last-event-id") or 0)
+    except ValueError:
+        last_event_id = 0
+
+    # Fill in the events recorded before the relay started (or evicted from the broker since);
+    # events the relay delivers meanwhile are merged by id
+    history = await run_in_threadpool(JOB_STORE.events_after, last_event_id, job_id)
+    for event_id, _, event, data in history:
+        job_events.publish(job_id, event, data, event_id=event_id)
+
+    if not job_events.has_events(job_id) and await run_in_threadpool(get_job, job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    async def event_stream():
+        if not job_events.has_events(job_id):
+            # No event log for this job (it reused an existing report, or its events
+            # have been pruned): follow its record instead
+            version = None
+            
+            async def changed():
+                return await run_in_threadpool(job_version, job_id) != version
+            
+            while True:
+                job_info = await run_in_threadpool(get_job, job_id)
+                if job_info is None:
+                    return
+                event = {"completed": "done", "failed": "failed"}.get(job_info.get("status"), "status")
+                if job_info.get("version", 0) != version:
+                    version = job_info.get("version", 0)
+                    yield format_sse(version, event, job_info)
+                if event != "status":
+                    return
+                if not await job_changes.wait_for(job_id, changed, 15.0, poll_interval=JOB_POLL_SECONDS):
+                    yield ": keepalive\n\n"
+        async for entry in job_events.subscribe(job_id, last_event_id):
+            if entry is None:
+                yield ": keepalive\n\n"
+                continue
+            yield format_sse(*entry)
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
 @app.get("/report/{job_id}")
 async def get_report(job_id: str):
     """Get the generated audit report for a completed job"""
-    # Try to reload all jobs if this job isn't found
-    global jobs
-    if job_id not in jobs:
-        jobs = load_all_jobs()
-        
+    job = await run_in_threadpool(get_job, job_id)
+    if job is None:
         # Special handling for reused_/existing_ jobs
-        if job_id not in jobs and (job_id.startswith("reused_") or job_id.startswith("existing_")):
+        if (job_id.startswith("reused_") or job_id.startswith("existing_")):
             parts = job_id.split("_")
             if len(parts) > 1:
                 case_number = parts[1]
@@ -408,12 +644,12 @@ async def get_report(job_id: str):
                         "timestamp": timestamp,
                         "note": f"Recreated job for case {case_number}"
                     }
-                    save_job(job_id, job_info)
+                    await run_in_threadpool(save_job, job_id, job_info)
+                    job = await run_in_threadpool(get_job, job_id)
     
-    if job_id not in jobs:
+    if job is None:
         raise HTTPException(status_code=404, detail="Job not found")
     
-    job = jobs[job_id]
     if job["status"] != "completed":
         raise HTTPException(status_code=400, detail="Report not yet available")
     
@@ -430,25 +666,13 @@ async def get_report(job_id: str):
 @app.get("/reports/")
 async def list_reports():
     """List all completed reports"""
-    # Refresh jobs from disk to ensure we have the latest
-    global jobs
-    jobs = load_all_jobs()
-    
-    # Get completed jobs
-    completed_jobs = {
-        job_id: job for job_id, job in jobs.items() 
-        if job["status"] == "completed"
-    }
-    
-    return completed_jobs
+    # Query the store so reports completed by other processes are included
+    completed_jobs = await run_in_threadpool(JOB_STORE.find, status="completed")
+    return {job_id: job_from_storage(job) for job_id, job in completed_jobs.items()}
 
 @app.delete("/report/{case_number}", response_model=DeleteResponse)
 async def delete_report(case_number: str):
     """Delete an audit report and its job entries"""
-    global jobs
-    # Make sure we have the latest job data
-    jobs = load_all_jobs()
-    
     # Find the report file
     report_path = os.path.join(REPORT_DIR, f"case_{case_number}_audit.md")
     if not os.path.exists(report_path):
@@ -459,10 +683,7 @@ async def delete_report(case_number: str):
         )
     
     # Find all job entries related to this case number
-    jobs_to_delete = []
-    for job_id, job in jobs.items():
-        if job.get("case_number") == case_number:
-            jobs_to_delete.append(job_id)
+    jobs_to_delete = list(await run_in_threadpool(JOB_STORE.find, case_number=case_number))
     
     if not jobs_to_delete:
         return DeleteResponse(
@@ -482,14 +703,7 @@ async def delete_report(case_number: str):
         )
     
     # Remove job entries
-    for job_id in jobs_to_delete:
-        jobs.pop(job_id, None)
-    
-    # Remove from processed case numbers
-    processed_case_numbers.discard(case_number)
-    
-    # Save updated jobs data
-    save_all_jobs()
+    await run_in_threadpool(JOB_STORE.delete, jobs_to_delete)
     
     return DeleteResponse(
         case_number=case_number,
@@ -497,91 +711,55 @@ async def delete_report(case_number: str):
         success=True
     )
 
-async def process_pdf(job_id: str, file_path: str):
-    """Background task to process a PDF"""
-    try:
-        # Update job status to processing
-        jobs[job_id]["status"] = "processing"
-        save_job(job_id, jobs[job_id])
-        
-        # Use our existing processing code
-        # Extract PDF content
-        pdf_extractor = PDFExtractor(file_path)
-        case_info = pdf_extractor.extract_case_info()
-        case_content = pdf_extractor.extract_text()
-        
-        # Check if we've already processed this case number (this should rarely happen due to upload checks)
-        case_number = case_info.case_number
-        existing_report_path = os.path.join(REPORT_DIR, f"case_{case_number}_audit.md")
-        
-        # Look for a different job with the same case number
-        other_job_id = None
-        for existing_id, existing_info in jobs.items():
-            if existing_id != job_id and existing_info.get("case_number") == case_number:
-                other_job_id = existing_id
-                break
-        
-        # If another job already processed this case and the report exists, use it
-        if other_job_id and os.path.exists(existing_report_path):
-            timestamp = get_file_timestamp(existing_report_path)
-            
-            # Get relative path for storage consistency
-            rel_path = get_relative_path(existing_report_path)
-            
-            # Update our job to point to the existing report
-            jobs[job_id].update({
-                "status": "completed",
-                "case_number": case_number,
-                "report_url": rel_path,
-                "timestamp": timestamp
-            })
-            save_job(job_id, jobs[job_id])
-            return
-        
-        # Add to our processed case numbers
-        processed_case_numbers.add(case_number)
-        
-        # Analyze with AI
-        analyzer = AIAnalyzer(project_id=PROJECT_ID, location=LOCATION)
-        audit_report = analyzer.analyze_case(case_content, case_info)
-        
-        # Generate report
-        report_path = os.path.join(REPORT_DIR, f"case_{case_number}_audit.md")
-        report_generator = ReportGenerator(report_path)
-        report_generator.generate_report(audit_report)
-        
-        # Get the timestamp of the newly created report
-        timestamp = get_file_timestamp(report_path)
-        
-        # Get relative path for storage consistency
-        rel_path = get_relative_path(report_path)
-        
-        # Update job status
-        jobs[job_id].update({
-            "job_id": job_id,
-            "status": "completed",
-            "case_number": case_number,
-            "report_url": rel_path,  # Store relative path
-            "timestamp": timestamp
-        })
-        save_job(job_id, jobs[job_id])
-        
-    except Exception as e:
-        # Update job status to failed
-        jobs[job_id].update({
-            "job_id": job_id,
-            "status": "failed",
-            "error": str(e)
-        })
-        save_job(job_id, jobs[job_id])
+def worker_stats():
+    """Latest stats snapshot of every running job worker, by worker id"""
+    snapshots = {}
+    for path in glob.glob(os.path.join(WORKER_STATS_DIR, "*.json")):
+        try:
+            with open(path, 'r') as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError):
+            continue
+        if time.time() - snapshot.get("updated_at", 0) <= WORKER_STATS_MAX_AGE_SECONDS:
+            snapshots[snapshot["worker_id"]] = snapshot
+    return snapshots
+
+@app.get("/admin/job-queue")
+async def job_queue_stats():
+    """Admin endpoint reporting queued/processing job counts and the running job workers"""
+    stats = await run_in_threadpool(JOB_STORE.queue_stats)
+    workers = worker_stats()
+    stats["workers"] = {worker_id: {"pid": snapshot["pid"], "claimed": snapshot["claimed"], "jobs": snapshot["jobs"]}
+                        for worker_id, snapshot in workers.items()}
+    return stats
+
+@app.get("/admin/pipeline")
+async def pipeline_stats():
+    """Admin endpoint reporting per-stage queue depth and throughput of each job worker's pipeline"""
+    return {worker_id: snapshot["pipeline"] for worker_id, snapshot in worker_stats().items()}
+
+@app.get("/admin/genai-clients")
+async def genai_client_stats():
+    """Admin endpoint reporting each job worker's shared Gemini client creation and reuse counters"""
+    return {worker_id: snapshot["genai_clients"] for worker_id, snapshot in worker_stats().items()}
+
+@app.get("/admin/llm-scheduler")
+async def llm_scheduler_stats():
+    """Admin endpoint reporting each job worker's Gemini rate limiting, retries and circuit breaker state"""
+    return {worker_id: snapshot["llm_scheduler"] for worker_id, snapshot in worker_stats().items()}
+
+@app.get("/admin/response-parsing")
+async def response_parsing_stats():
+    """Admin endpoint counting each job worker's AI responses parsed via the schema, via repair, or not at all"""
+    return {worker_id: snapshot["response_parsing"] for worker_id, snapshot in worker_stats().items()}
 
 @app.post("/admin/clean-jobs-file")
 async def clean_jobs_file_endpoint():
-    """Admin endpoint to manually clean up duplicate reused entries in the all_jobs.json file"""
+    """Admin endpoint to manually clean up duplicate reused entries in the job store"""
     try:
-        before_count = len(jobs)
-        clean_jobs_file()
-        after_count = len(jobs)
+        before_count = await run_in_threadpool(JOB_STORE.count)
+        await run_in_threadpool(clean_jobs_file)
+        after_count = await run_in_threadpool(JOB_STORE.count)
         removed = before_count - after_count
         
         return {
@@ -596,18 +774,13 @@ async def clean_jobs_file_endpoint():
 @app.post("/admin/reset", response_model=dict)
 async def reset_app(clear_jobs: bool = False):
     """Admin API to reset the application state"""
-    global processed_case_numbers, jobs
-    
-    # Clear the set of processed case numbers
-    count = len(processed_case_numbers)
-    processed_case_numbers.clear()
-    
-    # Optionally clear all jobs
+    # Case numbers are tracked through their jobs, so they are cleared along with them
+    count = 0
     jobs_count = 0
     if clear_jobs:
-        jobs_count = len(jobs)
-        jobs.clear()
-        save_all_jobs()
+        all_jobs = await run_in_threadpool(JOB_STORE.all)
+        count = len({job.get("case_number") for job in all_jobs.values() if job.get("case_number")})
+        jobs_count = await run_in_threadpool(JOB_STORE.clear)
     
     return {
         "message": f"Reset complete. Cleared {count} case numbers and {jobs_count} jobs.",
@@ -10,8 +10,14 @@ duplicate entry issues.
 import os
 import sys
 import json
+import sqlite3
+from contextlib import closing
 import requests
 
+# Add the project root to the Python path to allow importing from the app module
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from app.services.job_store import SQLiteJobStore
+
 def reset_app_via_api():
     """Reset the app by calling the admin API endpoint"""
     try:
@@ -34,13 +40,35 @@ def reset_app_via_api():
         print("Is the backend server running?")
         return 1
 
+def reset_job_database(db_file):
+    """Reset the app by clearing the SQLite job store"""
+    try:
+        # Make a backup first (the backup API copies a consistent snapshot, even while the server writes)
+        backup_file = db_file + ".bak"
+        with closing(sqlite3.connect(db_file)) as src, closing(sqlite3.connect(backup_file)) as dst:
+            src.backup(dst)
+        print(f"Created backup at: {backup_file}")
+        
+        count = SQLiteJobStore(db_file).clear()
+        print(f"Successfully reset the application state ({count} jobs removed)")
+        print("Note: You'll need to restart the backend server for changes to take effect")
+        return 0
+    except Exception as e:
+        print(f"Error resetting application: {e}")
+        return 1
+
 def reset_app_manually():
-    """Reset the app by directly modifying the jobs file"""
+    """Reset the app by directly modifying the job store"""
     # Determine the jobs file path
     script_dir = os.path.dirname(os.path.abspath(__file__))
     jobs_dir = os.path.join(script_dir, "jobs")
     jobs_file = os.path.join(jobs_dir, "all_jobs.json")
     
+    # The backend keeps jobs in SQLite unless JOB_STORE=json
+    db_file = os.getenv('JOB_STORE_PATH') or os.path.join(jobs_dir, "jobs.db")
+    if (os.getenv('JOB_STORE') or 'sqlite') != 'json' and os.path.exists(db_file):
+        return reset_job_database(db_file)
+    
     if not os.path.exists(jobs_file):
         print(f"Error: Jobs file not found at {jobs_file}")
         return 1
@@ -76,7 +104,7 @@ def main():
     print()
     print("Choose reset method:")
     print("1. Reset via API (backend server must be running)")
-    print("2. Reset manually (will create empty jobs file)")
+    print("2. Reset manually (will empty the job store)")
     print("3. Cancel")
     
     try:
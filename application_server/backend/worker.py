@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+"""
+Job worker pool: processes the jobs the API queues in the job store.
+
+Starts JOB_WORKER_PROCESSES worker processes and restarts any that die. Each
+worker claims pending jobs with a lease, keeps its leases alive with heartbeats
+while it processes them, and releases them when the job completes or fails.
+Jobs whose lease runs out (their worker crashed or hung) are requeued, or
+failed after JOB_MAX_ATTEMPTS claims.
+
+Run it next to the API, from this directory:
+
+    python worker.py
+"""
+
+import os
+import sys
+import json
+import time
+import signal
+import socket
+import tempfile
+import threading
+import multiprocessing
+
+from job_processing import (
+    JOB_STORE, JOBS_DIR, PROJECT_ID, LOCATION, LEASE_RELEASED,
+    extract_job, analyze_job, render_job, fail_job, publish_job_state, get_absolute_path
+)
+from app.services.pipeline import Pipeline, Stage
+from app.services.genai_clients import client_registry
+from app.services.llm_scheduler import shared_scheduler
+from app.services.ai_analyzer import parse_stats
+
+# Number of worker processes (the Gemini quota is split between them)
+JOB_WORKER_PROCESSES = int(os.getenv('JOB_WORKER_PROCESSES', '2'))
+
+# How long a claimed job stays leased without a heartbeat; heartbeats are sent every third of it
+JOB_LEASE_SECONDS = float(os.getenv('JOB_LEASE_SECONDS', '60'))
+
+# Claims after which a job whose worker keeps disappearing is failed instead of requeued
+JOB_MAX_ATTEMPTS = int(os.getenv('JOB_MAX_ATTEMPTS', '3'))
+
+# How often an idle worker looks for new jobs
+JOB_POLL_SECONDS = float(os.getenv('JOB_POLL_SECONDS', '0.5'))
+
+# How long job progress events are kept for event stream clients
+JOB_EVENT_RETENTION_HOURS = float(os.getenv('JOB_EVENT_RETENTION_HOURS', '24'))
+
+# Capacity of each queue between processing stages
+PIPELINE_QUEUE_SIZE = int(os.getenv('PIPELINE_QUEUE_SIZE', '32'))
+PIPELINE_EXTRACT_WORKERS = int(os.getenv('PIPELINE_EXTRACT_WORKERS', '2'))
+PIPELINE_ANALYZE_WORKERS = int(os.getenv('PIPELINE_ANALYZE_WORKERS', '32'))
+PIPELINE_RENDER_WORKERS = int(os.getenv('PIPELINE_RENDER_WORKERS', '1'))
+
+# Each worker writes a stats snapshot here on every heartbeat, for the API's admin endpoints
+WORKER_STATS_DIR = os.path.join(JOBS_DIR, "workers")
+
+def requeue_expired_jobs():
+    """Requeue jobs whose worker stopped renewing its lease; fail those out of attempts"""
+    requeued, failed = JOB_STORE.requeue_expired(JOB_MAX_ATTEMPTS)
+    for job_id in requeued:
+        print(f"Requeued job {job_id} (its worker's lease expired)")
+    for job_id in failed:
+        print(f"Job {job_id} failed: abandoned after {JOB_MAX_ATTEMPTS} attempts")
+        publish_job_state(job_id, "failed")
+    return requeued, failed
+
+class JobWorker:
+    """One worker process: claims queued jobs and runs them through its own pipeline"""
+
+    def __init__(self, worker_id):
+        self.worker_id = worker_id
+        self.max_in_flight = PIPELINE_EXTRACT_WORKERS + PIPELINE_ANALYZE_WORKERS
+        # Set by the signal handler; a plain flag because taking locks in a handler can deadlock
+        self.stop_requested = False
+        self.stopping = threading.Event()
+        self._lock = threading.Lock()
+        self._slots = threading.Semaphore(self.max_in_flight)
+        self._in_flight = {}  # job_id -> attempts when claimed
+        self._lost = set()
+        self.claimed = 0
+        self.pipeline = Pipeline(
+            [
+                Stage("extract", extract_job, workers=PIPELINE_EXTRACT_WORKERS, queue_size=PIPELINE_QUEUE_SIZE),
+                Stage("analyze", analyze_job, workers=PIPELINE_ANALYZE_WORKERS, queue_size=PIPELINE_QUEUE_SIZE),
+                Stage("render", render_job, workers=PIPELINE_RENDER_WORKERS, queue_size=PIPELINE_QUEUE_SIZE),
+            ],
+            on_error=lambda job_id, stage_name, error: fail_job(job_id, self.worker_id, stage_name, error),
+            on_done=self._job_done,
+        )
+
+    def run(self):
+        self.pipeline.start()
+        threading.Thread(target=self._heartbeat_loop, name="job-heartbeat", daemon=True).start()
+        print(f"Worker {self.worker_id} started (up to {self.max_in_flight} jobs in flight)")
+
+        while not self.stop_requested:
+            if not self._slots.acquire(timeout=JOB_POLL_SECONDS):
+                continue
+            try:
+                claimed = JOB_STORE.claim_next(self.worker_id, JOB_LEASE_SECONDS)
+            except Exception as e:
+                print(f"Error claiming a job: {e}")
+                claimed = None
+            if claimed is None:
+                self._slots.release()
+                time.sleep(JOB_POLL_SECONDS)
+                continue
+
+            job_id, job_info = claimed
+            with self._lock:
+                self._in_flight[job_id] = job_info.get("attempts", 1)
+                self.claimed += 1
+            print(f"Worker {self.worker_id} claimed job {job_id} (attempt {job_info.get('attempts', 1)})")
+            work = {
+                "job_id": job_id,
+                "file_path": get_absolute_path(job_info["file_path"]),
+                "content_hash": job_info.get("content_hash"),
+                "bypass_cache": job_info.get("bypass_cache", False),
+                "lease_owner": self.worker_id,
+            }
+            self.pipeline.submit(work, job_id)
+
+        self.stopping.set()
+        self._release_all()
+
+    def stop(self, *args):
+        self.stop_requested = True
+
+    def _job_done(self, job_id):
+        with self._lock:
+            self._in_flight.pop(job_id, None)
+            self._lost.discard(job_id)
+        self._slots.release()
+
+    def _heartbeat_loop(self):
+        last_maintenance = 0.0
+        while not self.stopping.wait(JOB_LEASE_SECONDS / 3):
+            try:
+                with self._lock:
+                    job_ids = [job_id for job_id in self._in_flight if job_id not in self._lost]
+                held = set(JOB_STORE.heartbeat(job_ids, self.worker_id, JOB_LEASE_SECONDS)) if job_ids else set()
+                for job_id in job_ids:
+                    if job_id not in held:
+                        # Finished meanwhile, or taken over; in the latter case our updates are refused
+                        with self._lock:
+                            if job_id in self._in_flight:
+                                self._lost.add(job_id)
+                self._write_stats()
+
+                # Every worker also recovers jobs abandoned by others, so no single process is needed for it
+                if time.monotonic() - last_maintenance >= JOB_LEASE_SECONDS:
+                    last_maintenance = time.monotonic()
+                    requeue_expired_jobs()
+                    JOB_STORE.prune_events(JOB_EVENT_RETENTION_HOURS * 3600)
+            except Exception as e:
+                print(f"Error in worker heartbeat: {e}")
+
+    def _release_all(self):
+        """Put the jobs still in flight back in the queue, so other workers pick them up at once"""
+        with self._lock:
+            in_flight = dict(self._in_flight)
+        for job_id, attempts in in_flight.items():
+            # A job interrupted by a shutdown doesn't count as an attempt
+            released = JOB_STORE.update(job_id, {"status": "pending", "attempts": attempts - 1, **LEASE_RELEASED},
+                                        expected={"lease_owner": self.worker_id})
+            if released is not None:
+                print(f"Released job {job_id} back to the queue")
+        try:
+            os.remove(os.path.join(WORKER_STATS_DIR, f"{self.worker_id}.json"))
+        except OSError:
+            pass
+
+    def _write_stats(self):
+        with self._lock:
+            jobs = sorted(self._in_flight)
+        stats = {
+            "worker_id": self.worker_id,
+            "pid": os.getpid(),
+            "updated_at": time.time(),
+            "claimed": self.claimed,
+            "jobs": jobs,
+            "pipeline": self.pipeline.stats(),
+            "llm_scheduler": shared_scheduler().stats(),
+            "genai_clients": client_registry.stats(),
+            "response_parsing": parse_stats.stats(),
+        }
+        os.makedirs(WORKER_STATS_DIR, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=WORKER_STATS_DIR, suffix=".tmp")
+        with os.fdopen(fd, 'w') as f:
+            json.dump(stats, f)
+        os.replace(temp_path, os.path.join(WORKER_STATS_DIR, f"{self.worker_id}.json"))
+
+def run_worker():
+    """Entry point of a worker process"""
+    # The Gemini quota is per project, so each worker process gets an equal share of it
+    shared_scheduler(processes=JOB_WORKER_PROCESSES)
+    # Create the shared Gemini client up front so the first case doesn't pay for the setup
+    client_registry.warm_up(PROJECT_ID, LOCATION)
+
+    worker = JobWorker(f"{socket.gethostname()}-{os.getpid()}")
+    signal.signal(signal.SIGTERM, worker.stop)
+    signal.signal(signal.SIGINT, worker.stop)
+    worker.run()
+
+def main():
+    """Start the worker processes and restart any that exit unexpectedly"""
+    # Jobs left processing by workers that are gone (e.g. before a crash) go back in the queue
+    requeued, failed = requeue_expired_jobs()
+    print(f"Recovered {len(requeued)} abandoned jobs, failed {len(failed)}")
+
+    stop_requested = []
+    signal.signal(signal.SIGTERM, lambda *args: stop_requested.append(True))
+    signal.signal(signal.SIGINT, lambda *args: stop_requested.append(True))
+
+    processes = []
+    for _ in range(JOB_WORKER_PROCESSES):
+        process = multiprocessing.Process(target=run_worker)
+        process.start()
+        processes.append(process)
+    print(f"Started {JOB_WORKER_PROCESSES} job worker processes")
+
+    while True:
+        time.sleep(1.0)
+        if stop_requested:
+            break
+        for index, process in enumerate(processes):
+            if not process.is_alive():
+                print(f"Worker process {process.pid} exited with code {process.exitcode}, restarting it")
+                # Its jobs are requeued once their leases expire
+                processes[index] = multiprocessing.Process(target=run_worker)
+                processes[index].start()
+
+    print("Stopping job workers...")
+    for process in processes:
+        process.terminate()
+    for process in processes:
+        process.join()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -11,13 +11,59 @@ from urllib.parse import urljoin
 # API endpoint
 API_URL = "http://localhost:8000"
 
+# PDFs larger than this are sent in chunks through the resumable upload API, so a dropped
+# connection only costs the rest of the chunk in flight instead of the whole file
+RESUMABLE_UPLOAD_THRESHOLD = 16 * 1024 * 1024
+UPLOAD_CHUNK_BYTES = 8 * 1024 * 1024
+UPLOAD_CHUNK_RETRIES = 5
+
+def upload_resumable(pdf_file):
+    """Send a PDF through the resumable upload API; returns the finalize response, or the error response"""
+    size = pdf_file.size
+    response = requests.post(urljoin(API_URL, "uploads/"), json={"filename": pdf_file.name, "size": size},
+                             timeout=(5, 30))
+    if response.status_code != 200:
+        return response
+    upload_url = urljoin(API_URL, f"uploads/{response.json()['upload_id']}")
+    
+    offset, failures = 0, 0
+    while offset < size:
+        pdf_file.seek(offset)
+        try:
+            response = requests.put(upload_url, params={"offset": offset},
+                                    data=pdf_file.read(UPLOAD_CHUNK_BYTES), timeout=(5, 120))
+            if response.status_code == 409:
+                # The server is at another offset (e.g. part of a chunk whose response was lost arrived)
+                response = requests.get(upload_url, timeout=(5, 30))
+        except requests.RequestException:
+            # Dropped connection: retry from the offset the server reports
+            response = None
+        if response is not None and response.status_code != 200:
+            # e.g. 404 (the upload expired) or 413: retrying won't help, show the server's error
+            return response
+        received = response.json()["offset"] if response is not None else offset
+        if received > offset:
+            failures = 0
+        else:
+            failures += 1
+            if failures > UPLOAD_CHUNK_RETRIES:
+                raise ConnectionError(f"Upload stalled at {offset} of {size} bytes")
+            time.sleep(failures)
+        offset = received
+    
+    # Finalizing hashes and checks the whole file on the server, so allow it longer than a chunk
+    return requests.post(f"{upload_url}/finalize", timeout=(5, 300))
+
 def upload_pdf(pdf_file):
     if pdf_file is None:
         return None
     
     try:
-        files = {"file": (pdf_file.name, pdf_file, "application/pdf")}
-        response = requests.post(urljoin(API_URL, "upload/"), files=files)
+        if pdf_file.size > RESUMABLE_UPLOAD_THRESHOLD:
+            response = upload_resumable(pdf_file)
+        else:
+            files = {"file": (pdf_file.name, pdf_file, "application/pdf")}
+            response = requests.post(urljoin(API_URL, "upload/"), files=files)
         
         if response.status_code == 200:
             result = response.json()
@@ -51,6 +97,58 @@ def check_job_status(job_id):
         st.error(f"Error connecting to server: {str(e)}")
         return None
 
+# Progress messages for the stages streamed by the backend
+STAGE_MESSAGES = {
+    "uploaded": "Job is queued for processing...",
+    "extracted": "Extracted case {case_number}, waiting for analysis...",
+    "analyzing": "Analyzing the case history...",
+    "rendering": "Writing the audit report...",
+    "attached": "This case is already being processed, waiting for that result...",
+}
+
+def stream_job_events(job_id):
+    """Yield (event, data) pairs from the job's server-sent event stream"""
+    # The server sends a keepalive every 15 seconds, so a 60 second read timeout means it's gone
+    with requests.get(urljoin(API_URL, f"jobs/{job_id}/events"), stream=True, timeout=(5, 60)) as response:
+        response.raise_for_status()
+        event, data = None, []
+        for line in response.iter_lines(decode_unicode=True):
+            if line:
+                if line.startswith("event:"):
+                    event = line[len("event:"):].strip()
+                elif line.startswith("data:"):
+                    data.append(line[len("data:"):].strip())
+                continue
+            # A blank line ends the event
+            if event and data:
+                yield event, json.loads("\n".join(data))
+            event, data = None, []
+
+def follow_job(job_id, status_container):
+    """Show a job's progress live until it finishes; returns its final status info"""
+    with status_container:
+        stage_placeholder = st.empty()
+        ratings_placeholder = st.empty()
+    try:
+        for event, data in stream_job_events(job_id):
+            if event in ("done", "failed"):
+                return data
+            if event == "field":
+                # Ratings arrive before the rest of the analysis has been written
+                if data["name"] == "ratings":
+                    ratings = pd.DataFrame(list(data["value"].items()), columns=["Category", "Rating"])
+                    ratings_placeholder.table(ratings)
+            elif event == "extracted":
+                stage_placeholder.info(STAGE_MESSAGES[event].format(**data["case_info"]))
+            elif event == "status":
+                stage_placeholder.info(STAGE_MESSAGES["uploaded"] if data.get("status") == "pending"
+                                       else "Processing your PDF...")
+            elif event in STAGE_MESSAGES:
+                stage_placeholder.info(STAGE_MESSAGES[event])
+    except Exception as e:
+        st.warning(f"Lost the live progress stream ({str(e)}), checking status instead")
+    return check_job_status(job_id)
+
 def get_report(job_id):
     try:
         response = requests.get(urljoin(API_URL, f"report/{job_id}"))
@@ -115,16 +213,6 @@ def main():
                         # Automatically show the report for existing/reused reports
                         st.session_state.showing_report = True 
                         st.session_state.status_visible = False
-                    else:
-                        # Poll for completion status a few times
-                        max_retries = 5
-                        for _ in range(max_retries):
-                            time.sleep(1)  # Short pause between status checks
-                            status_info = check_job_status(job_id)
-                            if status_info and status_info.get("status") == "completed":
-                                st.session_state.showing_report = True
-                                st.session_state.status_visible = False
-                                break
         
         # Status area - only show when processing is happening
         if st.session_state.current_job_id and st.session_state.status_visible:
@@ -147,8 +235,8 @@ def main():
                 st.session_state.showing_report = True
                 st.session_state.status_visible = False
             else:
-                # Check status periodically for processing jobs
-                status_info = check_job_status(job_id)
+                # Follow the job's progress stream until it completes or fails
+                status_info = follow_job(job_id, status_container)
                 
                 if status_info:
                     status = status_info["status"]
@@ -11,6 +11,13 @@ start_backend() {
     exec uvicorn main:app --host 0.0.0.0 --port 8000
 }
 
+# Start the job worker pool (processes the jobs queued by the backend)
+start_worker() {
+    echo "Starting job workers..."
+    cd /app/application_server/backend
+    exec python worker.py
+}
+
 # Start frontend service
 start_frontend() {
     echo "Starting Streamlit frontend service..."
@@ -24,6 +31,8 @@ start_all() {
     apt-get update && apt-get install -y tmux
     tmux new-session -d -s "backend" "cd /app/application_server/backend && uvicorn main:app --host 0.0.0.0 --port 8000"
     echo "Backend started in tmux session"
+    tmux new-session -d -s "worker" "cd /app/application_server/backend && python worker.py"
+    echo "Job workers started in tmux session"
     sleep 5  # Give the backend time to start
     cd /app/application_server/frontend
     exec streamlit run main.py --server.port=8501 --server.address=0.0.0.0
@@ -34,6 +43,9 @@ case "${SERVICE}" in
     backend)
         start_backend
         ;;
+    worker)
+        start_worker
+        ;;
     frontend)
         start_frontend
         ;;
@@ -42,7 +54,7 @@ case "${SERVICE}" in
         ;;
     *)
         echo "Unknown service: ${SERVICE}"
-        echo "Available services: backend, frontend, all"
+        echo "Available services: backend, worker, frontend, all"
         exit 1
         ;;
 esac 
\ No newline at end of file
@@ -0,0 +1,45 @@
+"""Benchmark of the case field extraction: single-pass FieldScanner vs the per-field regex reference.
+
+Run from the repository root:
+
+    python tests/bench_field_scanner.py [--pages 200] [--repeat 20]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.pdf_extractor import PDFExtractor
+from case_field_reference import reference_extract_fields, case_document
+
+def best_time(func, text, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(text)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", type=int, default=200, help="Pages of case comments per document")
+    parser.add_argument("--repeat", type=int, default=20, help="Runs per measurement (the best one is reported)")
+    args = parser.parse_args()
+
+    scanner = PDFExtractor("")._extract_fields
+    documents = {
+        "header + comments": case_document(args.pages),
+        "fields missing": case_document(args.pages, header=False),
+    }
+    for name, text in documents.items():
+        assert scanner(text) == reference_extract_fields(text)
+        reference = best_time(reference_extract_fields, text, args.repeat)
+        single_pass = best_time(scanner, text, args.repeat)
+        print(f"{name} ({len(text) / 1024:.0f} KB): reference {reference * 1000:.2f} ms, "
+              f"scanner {single_pass * 1000:.2f} ms, {reference / single_pass:.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+"""The case field extraction as it was before the FieldScanner, kept as the reference it must match.
+
+reference_extract_fields() is PDFExtractor._extract_fields from before the
+single-pass scanner (one regex search per field, then a line-by-line pass).
+random_case_text() builds case texts from header lines, near-misses and noise,
+for comparing the two extractors and for benchmarking them.
+"""
+
+import random
+import re
+
+from app.services.pdf_extractor import PDFExtractor
+
+def _safe_extract_value(line):
+    parts = line.split(':')
+    if len(parts) > 1:
+        return ':'.join(parts[1:]).strip()
+    return ""
+
+def reference_extract_fields(text):
+    parse_date = PDFExtractor("")._parse_date
+    lines = text.split('\n')
+    case_info = {
+        'case_number': '',
+        'product_version': '',
+        'product_name': '',
+        'customer_name': '',
+        'severity': '',
+        'status': '',
+        'subject': '',
+        'case_owner': '',
+        'date_created': None,
+        'date_closed': None
+    }
+
+    case_number_match = re.search(r'Case Number:?\s*(\d+)', text, re.IGNORECASE)
+    if case_number_match:
+        case_info['case_number'] = case_number_match.group(1).strip()
+
+    date_created_match = re.search(r'Date/Time Created\s+(\d{1,2}-\d{1,2}-\d{4}\s+\d{1,2}:\d{1,2}:\d{1,2})', text, re.IGNORECASE)
+    if date_created_match:
+        case_info['date_created'] = parse_date(date_created_match.group(1))
+
+    date_closed_match = re.search(r'Date/Time Closed\s+(\d{1,2}-\d{1,2}-\d{4}\s+\d{1,2}:\d{1,2}:\d{1,2})', text, re.IGNORECASE)
+    if date_closed_match:
+        case_info['date_closed'] = parse_date(date_closed_match.group(1))
+
+    product_name_match = re.search(r'Product Name\s+([^\n]+)', text)
+    if product_name_match:
+        case_info['product_name'] = product_name_match.group(1).strip()
+    else:
+        product_match = re.search(r'Product:?\s*([^:]+)', text, re.IGNORECASE)
+        if product_match:
+            full_product = product_match.group(1).strip()
+            product_parts = re.split(r'\s+(?=Contact|Email|Customer)', full_product)
+            if product_parts:
+                case_info['product_name'] = product_parts[0].strip()
+                version_match = re.search(r'Version\s+([0-9.]+)', product_parts[0])
+                if version_match:
+                    case_info['product_version'] = version_match.group(1).strip()
+
+    if len(case_info['product_name']) > 50:
+        tibco_match = re.search(r'TIBCO\s+[\w\s]+(?:Edition|Container|Enterprise)', case_info['product_name'])
+        if tibco_match:
+            case_info['product_name'] = tibco_match.group(0).strip()
+        else:
+            case_info['product_name'] = "TIBCO BusinessWorks"
+
+    if not case_info['product_version']:
+        version_match = re.search(r'Version\s+([0-9.]+)', text)
+        if version_match:
+            case_info['product_version'] = version_match.group(1).strip()
+
+    subject_match = re.search(r'Subject\s+(Application[^\n]+)', text)
+    if subject_match:
+        case_info['subject'] = subject_match.group(1).strip()
+    else:
+        subject_match = re.search(r'Subject:?\s*(.+?)(?=(?:\n\w+:|$))', text, re.IGNORECASE | re.DOTALL)
+        if subject_match:
+            subject = subject_match.group(1).strip()
+            subject = re.sub(r'\s+', ' ', subject)
+            if len(subject) > 100:
+                first_part = re.split(r'(?<=[.!?])\s+', subject)[0]
+                if first_part and len(first_part) > 20:
+                    subject = first_part
+                else:
+                    subject = subject[:100] + "..."
+            case_info['subject'] = subject
+
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+
+        if 'Customer' in line and not case_info['customer_name']:
+            customer_value = _safe_extract_value(line)
+            if customer_value and len(customer_value) > 1:
+                case_info['customer_name'] = customer_value
+
+        elif 'Severity' in line and not case_info['severity']:
+            severity_value = _safe_extract_value(line)
+            if severity_value and len(severity_value) > 0:
+                case_info['severity'] = severity_value
+
+        elif 'Status' in line and not case_info['status']:
+            status_value = _safe_extract_value(line)
+            if status_value and len(status_value) > 0:
+                case_info['status'] = status_value
+
+        elif 'Case Owner' in line and not case_info['case_owner']:
+            owner_value = _safe_extract_value(line)
+            if owner_value and len(owner_value) > 1:
+                case_info['case_owner'] = owner_value
+
+    return case_info
+
+# Header lines as they appear in case PDFs, near-misses of them, and comment noise
+CASE_TEXT_PIECES = [
+    "Case Number: {n}", "case number {n}", "CASE NUMBER:", "Case Number\nfoo",
+    "Subject Application {w}", "Subject: {w}\nmore words here", "subject {w}. Another sentence that is long " * 3,
+    "Product Name {w}", "Product: {w} Contact me", "product Version 1.2.3 {w}", "Products: {w}",
+    "Version {v}", "Version x", "Date/Time Created 12-03-2024 01:36:36", "date/time closed 1-2-2023 3:4:5",
+    "Date/Time Created bad", "Customer: {w}", "Customer:", "Customer: x", "Severity: {w}", "Severity:",
+    "Status: {w}", "Case Owner: {w}", "Case Owner: a", "Customer Status: {w}", "Status Severity x", "Key: value",
+    "{w}", "{w}: {w}", "TIBCO Enterprise Message Service long long long long long long Enterprise", "",
+    "Customer: a: b: c", "Case Status: open", "Comment: Case Owner changed",
+]
+WORDS = ["alpha", "Beta", "gamma.", "x", "Application", "Status", "Customer", "TIBCO"]
+
+def random_case_text(rng: random.Random, max_pieces: int = 40) -> str:
+    pieces = []
+    for _ in range(rng.randint(0, max_pieces)):
+        piece = rng.choice(CASE_TEXT_PIECES)
+        pieces.append(piece.format(
+            n=rng.randint(1, 99999999),
+            w=" ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 8))),
+            v=f"{rng.randint(0, 9)}.{rng.randint(0, 9)}",
+        ))
+    separator = rng.choice(["\n", "\n", " ", "\n\n  "])
+    return separator.join(pieces) + rng.choice(["", "\n"])
+
+CASE_HEADER = (
+    "Case Number: {case_number}\n"
+    "Subject Application fails to start after upgrade\n"
+    "Product Name TIBCO BusinessWorks Container Edition\n"
+    "Version 2.8.1\n"
+    "Date/Time Created 12-03-2024 01:36:36\n"
+    "Date/Time Closed 12-10-2024 11:02:00\n"
+    "Customer: ACME Corp\n"
+    "Severity: 2 - High\n"
+    "Status: Closed\n"
+    "Case Owner: Jane Roe\n"
+)
+
+def case_document(pages: int, header: bool = True, case_number: str = "2468298") -> str:
+    """A case text of the given number of pages: the header, then pages of case comments."""
+    parts = [CASE_HEADER.format(case_number=case_number)] if header else []
+    for page in range(pages):
+        parts.extend(f"Comment {page}-{line}: the engineer asked the customer to collect the logs and "
+                     f"confirm the configuration of the affected engine\n" for line in range(30))
+    return "".join(parts)
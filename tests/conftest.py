@@ -0,0 +1,7 @@
+import os
+import sys
+
+# Tests import the app package and the backend modules the way the CLI and the API do
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+sys.path.insert(0, os.path.join(ROOT_DIR, "application_server", "backend"))
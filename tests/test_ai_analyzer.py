@@ -0,0 +1,90 @@
+"""AIAnalyzer's handling of streamed Gemini responses, with a fake client."""
+
+import asyncio
+import datetime
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from app.models.audit import CaseInfo
+from app.services import ai_analyzer
+from app.services.ai_analyzer import AIAnalyzer, AuditAssessment, RATING_FIELDS, TEXT_FIELDS
+from app.services.llm_scheduler import LLMScheduler
+from app.services.prompt_budget import PromptBudget
+from app.services.response_cache import ResponseCache
+
+CASE_INFO = CaseInfo(case_number="2468298", product_version="2.8.1", product_name="TIBCO BusinessWorks",
+                     customer_name="ACME Corp", severity="2 - High", status="Closed",
+                     date_created=datetime.datetime(2024, 12, 3), date_closed=datetime.datetime(2024, 12, 10),
+                     subject="Application fails to start", case_owner="Jane Roe")
+
+RESPONSE = json.dumps({"ratings": {name: 4 for name in RATING_FIELDS},
+                       **{name: f"{name} text" for name in TEXT_FIELDS}})
+
+def usage(prompt, output):
+    return SimpleNamespace(prompt_token_count=prompt, candidates_token_count=output,
+                           total_token_count=prompt + output)
+
+def response_chunks():
+    # The object closes in the middle of the stream; the token counts only come with the last chunk
+    pieces = [RESPONSE[i:i + 40] for i in range(0, len(RESPONSE), 40)]
+    return ([SimpleNamespace(text=piece, usage_metadata=None) for piece in pieces]
+            + [SimpleNamespace(text="\n", usage_metadata=None),
+               SimpleNamespace(text="", usage_metadata=usage(1200, 300))])
+
+class FakeClient:
+    def __init__(self):
+        self.streams = 0
+        self.models = SimpleNamespace(generate_content_stream=self._stream)
+        self.aio = SimpleNamespace(models=SimpleNamespace(generate_content_stream=self._stream_async))
+
+    def _stream(self, model, contents, config):
+        self.streams += 1
+        return iter(response_chunks())
+
+    async def _stream_async(self, model, contents, config):
+        self.streams += 1
+
+        async def chunks():
+            for chunk in response_chunks():
+                yield chunk
+        return chunks()
+
+@pytest.fixture
+def analyzer(monkeypatch):
+    client = FakeClient()
+    monkeypatch.setattr(ai_analyzer.client_registry, "get_client", lambda project_id, location: client)
+    return AIAnalyzer(prompt_budget=PromptBudget("gemini-test", input_token_budget=100_000), scheduler=LLMScheduler(), structured_output=True)
+
+@pytest.mark.parametrize("use_async", [False, True])
+def test_streamed_response_records_token_counts_from_the_final_chunk(analyzer, use_async):
+    analysis_info = {}
+    fields = []
+    on_field = lambda name, value: fields.append(name)
+
+    if use_async:
+        report = asyncio.run(analyzer.analyze_case_async("case text", CASE_INFO, analysis_info=analysis_info,
+                                                         on_field=on_field))
+    else:
+        report = analyzer.analyze_case("case text", CASE_INFO, analysis_info=analysis_info, on_field=on_field)
+
+    assert report.ratings.communication == 4
+    token_usage = analysis_info["token_usage"]
+    assert (token_usage["prompt_tokens"], token_usage["output_tokens"], token_usage["total_tokens"]) == (1200, 300, 1500)
+    assert "estimated_input_tokens" in token_usage
+    # Every field is reported once, none after the object closed
+    assert sorted(fields) == sorted(AuditAssessment.model_fields)
+
+def test_cached_replays_are_not_counted_in_parse_stats(analyzer, tmp_path):
+    analyzer.response_cache = ResponseCache(str(tmp_path))
+    before = ai_analyzer.parse_stats.stats()["structured"]
+
+    analyzer.analyze_case("case text", CASE_INFO)
+    analysis_info = {}
+    analyzer.analyze_case("case text", CASE_INFO, analysis_info=analysis_info)
+
+    assert analysis_info["response_cache"] == "hit"
+    assert analysis_info["response_parse"] == "structured"
+    assert analyzer.client.streams == 1
+    assert ai_analyzer.parse_stats.stats()["structured"] == before + 1
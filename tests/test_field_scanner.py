@@ -0,0 +1,35 @@
+"""The single-pass field scanner must extract exactly what the per-field regex extractor did."""
+
+import json
+import os
+import random
+
+import pytest
+
+from app.services.pdf_extractor import PDFExtractor
+from case_field_reference import reference_extract_fields, random_case_text
+
+GOLDEN_PATH = os.path.join(os.path.dirname(__file__), "golden", "case_fields.json")
+
+with open(GOLDEN_PATH, 'r') as f:
+    GOLDEN_CASES = json.load(f)
+
+def as_json(fields):
+    return {name: value.isoformat() if hasattr(value, "isoformat") else value for name, value in fields.items()}
+
+@pytest.mark.parametrize("case", GOLDEN_CASES, ids=[case["name"] for case in GOLDEN_CASES])
+def test_golden_case_fields(case):
+    assert as_json(PDFExtractor("")._extract_fields(case["text"])) == case["expected"]
+
+def test_golden_corpus_matches_reference():
+    # Expected outputs come from the reference extractor; they are regenerated only deliberately
+    for case in GOLDEN_CASES:
+        assert as_json(reference_extract_fields(case["text"])) == case["expected"], case["name"]
+
+@pytest.mark.parametrize("seed", range(4))
+def test_random_texts_match_reference(seed):
+    rng = random.Random(seed)
+    extractor = PDFExtractor("")
+    for _ in range(1000):
+        text = random_case_text(rng)
+        assert extractor._extract_fields(text) == reference_extract_fields(text), repr(text)
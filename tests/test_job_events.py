@@ -0,0 +1,38 @@
+"""Waiting for job changes with ChangeNotifier."""
+
+import asyncio
+import threading
+
+from app.services.job_events import ChangeNotifier
+
+def test_wait_for_async_predicate_runs_off_the_loop():
+    notifier = ChangeNotifier()
+    state = {"version": 0}
+    checks = []
+
+    async def changed():
+        # Like the API's predicates: the store read runs in a thread
+        version = await asyncio.to_thread(lambda: (checks.append(threading.current_thread()), state["version"])[1])
+        return version > 0
+
+    async def main():
+        waiter = asyncio.create_task(notifier.wait_for("job", changed, timeout=5.0))
+        await asyncio.sleep(0.05)
+        assert not waiter.done()
+        state["version"] = 1
+        notifier.notify("job")
+        return await waiter
+
+    assert asyncio.run(main()) is True
+    assert threading.main_thread() not in checks
+
+def test_wait_for_polls_and_times_out():
+    notifier = ChangeNotifier()
+    calls = []
+
+    def never():
+        calls.append(1)
+        return False
+
+    assert asyncio.run(notifier.wait_for("job", never, timeout=0.2, poll_interval=0.05)) is False
+    assert len(calls) >= 3
@@ -0,0 +1,51 @@
+"""Store writes of the async analyze stage."""
+
+import asyncio
+import os
+import tempfile
+import threading
+from types import SimpleNamespace
+
+# The backend opens its job store on import; keep it out of the repository
+os.environ.setdefault("JOB_STORE_PATH", os.path.join(tempfile.mkdtemp(), "jobs.db"))
+
+import job_processing
+
+class FakeAnalyzer:
+    def __init__(self, **kwargs):
+        pass
+
+    async def analyze_case_async(self, text, case_info, use_cache, analysis_info, on_field):
+        for name in ("summary", "ratings", "recommendations"):
+            on_field(name, name.upper())
+            await asyncio.sleep(0)
+        analysis_info["response_cache"] = "miss"
+        return "report"
+
+def test_analyze_job_writes_to_the_store_off_the_event_loop(monkeypatch):
+    writes = []
+
+    def record(kind):
+        return lambda *args, **kwargs: writes.append((kind, args[1:], kwargs, threading.current_thread()))
+
+    monkeypatch.setattr(job_processing, "AIAnalyzer", FakeAnalyzer)
+    monkeypatch.setattr(job_processing, "publish_job_event", record("event"))
+    monkeypatch.setattr(job_processing, "update_job", record("update"))
+    work = {"job_id": "a", "parsed_document": SimpleNamespace(text="", case_info=None)}
+
+    async def run():
+        return await job_processing.analyze_job(work), threading.current_thread()
+
+    result, loop_thread = asyncio.run(run())
+
+    assert result["audit_report"] == "report"
+    assert all(thread is not loop_thread for *_, thread in writes)
+    # Field events keep their order and land before the final update
+    assert [(kind, args, kwargs) for kind, args, kwargs, _ in writes] == [
+        ("event", ("analyzing",), {}),
+        ("event", ("field", {"name": "summary", "value": "SUMMARY"}), {}),
+        ("event", ("field", {"name": "ratings", "value": "RATINGS"}), {}),
+        ("update", (), {"partial_ratings": "RATINGS"}),
+        ("event", ("field", {"name": "recommendations", "value": "RECOMMENDATIONS"}), {}),
+        ("update", (), {"response_cache": "miss"}),
+    ]
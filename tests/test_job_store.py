@@ -0,0 +1,142 @@
+"""Behavior of the job queue (leases, requeueing, events) in both job store implementations."""
+
+import pytest
+
+from app.services.job_store import JsonFileJobStore, SQLiteJobStore
+
+@pytest.fixture(params=["json", "sqlite"])
+def store(request, tmp_path):
+    if request.param == "json":
+        return JsonFileJobStore(str(tmp_path / "all_jobs.json"))
+    return SQLiteJobStore(str(tmp_path / "jobs.db"))
+
+def queue(store, *job_ids):
+    for job_id in job_ids:
+        store.save(job_id, {"job_id": job_id, "status": "pending"})
+
+def test_claim_next_leases_oldest_pending_job(store):
+    queue(store, "a", "b")
+
+    job_id, record = store.claim_next("w1", 60)
+
+    assert job_id == "a"
+    assert record["status"] == "processing"
+    assert record["lease_owner"] == "w1"
+    assert record["attempts"] == 1
+    assert store.claim_next("w2", 60)[0] == "b"
+    assert store.claim_next("w2", 60) is None
+
+def test_claim_next_skips_attached_jobs(store):
+    store.save("a", {"status": "pending", "attached_to": "leader"})
+    queue(store, "b")
+
+    assert store.claim_next("w1", 60)[0] == "b"
+    assert store.claim_next("w1", 60) is None
+
+def test_heartbeat_renews_only_leases_the_worker_holds(store):
+    queue(store, "a", "b")
+    store.claim_next("w1", 60)
+    store.claim_next("w2", 60)
+    expires = store.get("a")["lease_expires"]
+
+    held = store.heartbeat(["a", "b", "missing"], "w1", 120)
+
+    assert held == ["a"]
+    assert store.get("a")["lease_expires"] > expires
+
+def test_update_with_expected_lease_owner(store):
+    queue(store, "a")
+    store.claim_next("w1", 60)
+
+    assert store.update("a", {"status": "completed"}, expected={"lease_owner": "w2"}) is None
+    assert store.update("a", {"status": "completed"}, expected={"lease_owner": "w1"})["status"] == "completed"
+
+def test_requeue_expired_requeues_then_fails_after_max_attempts(store):
+    queue(store, "a")
+
+    for attempt in (1, 2):
+        store.claim_next("w1", -1)  # lease already expired: the worker died
+        assert store.requeue_expired(max_attempts=3) == (["a"], [])
+        record = store.get("a")
+        assert record["status"] == "pending"
+        assert record["lease_owner"] is None
+        assert record["attempts"] == attempt
+
+    store.claim_next("w1", -1)
+    assert store.requeue_expired(max_attempts=3) == ([], ["a"])
+    assert store.get("a")["status"] == "failed"
+    assert store.claim_next("w1", 60) is None
+
+def test_requeue_expired_leaves_live_leases(store):
+    queue(store, "a")
+    store.claim_next("w1", 60)
+
+    assert store.requeue_expired(max_attempts=3) == ([], [])
+    assert store.get("a")["lease_owner"] == "w1"
+
+def test_requeue_expired_releases_jobs_attached_to_a_finished_leader(store):
+    store.save("leader", {"status": "failed"})
+    store.save("a", {"status": "pending", "attached_to": "leader"})
+
+    assert store.requeue_expired(max_attempts=3) == (["a"], [])
+    assert store.get("a")["attached_to"] is None
+    assert store.claim_next("w1", 60)[0] == "a"
+
+def test_duplicate_case_attaches_and_receives_the_leaders_result(store):
+    store.save("leader", {"status": "processing", "case_number": "123"})
+    queue(store, "a")
+    store.claim_next("w1", 60)
+
+    record = store.update_or_attach("a", {"case_number": "123"}, expected={"lease_owner": "w1"})
+
+    assert record["attached_to"] == "leader"
+    assert record["status"] == "pending"
+    assert record["lease_owner"] is None
+    assert store.finish_attached("leader", {"status": "completed"}) == ["a"]
+    assert store.get("a")["status"] == "completed"
+
+def test_create_unless_active_returns_the_active_job(store):
+    assert store.create_unless_active("a", {"status": "pending", "content_hash": "h"}) is None
+    assert store.create_unless_active("b", {"status": "pending", "content_hash": "h"}) == "a"
+    assert store.get("b") is None
+
+def test_event_ids_increase_and_filter(store):
+    queue(store, "a", "b")
+    first = store.append_event("a", "uploaded", {"n": 1})
+    second = store.append_event("b", "uploaded", {"n": 2})
+    third = store.append_event("a", "done", {"n": 3})
+
+    assert first < second < third
+    assert store.last_event_id() == third
+    assert store.events_after(first) == [(second, "b", "uploaded", {"n": 2}), (third, "a", "done", {"n": 3})]
+    assert store.events_after(0, job_id="a") == [(first, "a", "uploaded", {"n": 1}), (third, "a", "done", {"n": 3})]
+    assert store.events_after(0, limit=1) == [(first, "a", "uploaded", {"n": 1})]
+
+@pytest.mark.parametrize("remove", ["clear", "delete", "prune"])
+def test_event_ids_keep_increasing_after_events_are_removed(store, remove):
+    queue(store, "a")
+    last = [store.append_event("a", "uploaded", {}) for _ in range(3)][-1]
+
+    if remove == "clear":
+        store.clear()
+    elif remove == "delete":
+        store.delete(["a"])
+    else:
+        assert store.prune_events(-1) == 3
+
+    # An event relay that saw `last` must still see the events recorded from now on
+    assert store.last_event_id() == last
+    next_id = store.append_event("b", "uploaded", {})
+    assert next_id > last
+    assert store.events_after(last) == [(next_id, "b", "uploaded", {})]
+
+def test_state_is_shared_between_store_instances(store, tmp_path):
+    # Two instances on the same path stand in for two processes
+    other = type(store)(store.path)
+    queue(store, "a")
+    event_id = store.append_event("a", "uploaded", {})
+
+    assert other.claim_next("w1", 60)[0] == "a"
+    assert store.get("a")["lease_owner"] == "w1"
+    assert other.events_after(0) == [(event_id, "a", "uploaded", {})]
+    assert other.append_event("a", "done", {}) > event_id
@@ -0,0 +1,175 @@
+"""Retries, backoff and the circuit breaker of the LLM scheduler, on a fake clock."""
+
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from google.genai import errors as genai_errors
+
+from app.services import llm_scheduler
+from app.services.llm_scheduler import CircuitBreaker, LLMScheduler, is_retryable
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        if seconds:
+            self.sleeps.append(seconds)
+        self.now += seconds
+
+    async def async_sleep(self, seconds):
+        self.sleep(seconds)
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(llm_scheduler, "time", SimpleNamespace(monotonic=clock.monotonic, sleep=clock.sleep))
+    monkeypatch.setattr(llm_scheduler.asyncio, "sleep", clock.async_sleep)
+    # Take the top of the jitter range so the backoff is predictable
+    monkeypatch.setattr(llm_scheduler.random, "uniform", lambda low, high: high)
+    return clock
+
+def api_error(code):
+    return genai_errors.APIError(code, {"error": {"message": "failed", "status": "ERROR"}})
+
+def failing(*errors, result="ok"):
+    """A call that raises the given errors in turn, then returns result."""
+    remaining = list(errors)
+    calls = []
+
+    def call():
+        calls.append(len(calls))
+        if remaining:
+            raise remaining.pop(0)
+        return result
+    return call, calls
+
+def scheduler(**kwargs):
+    # No rate limits, so the only sleeps are backoff and circuit waits
+    return LLMScheduler(requests_per_minute=0, tokens_per_minute=0, **kwargs)
+
+@pytest.mark.parametrize("error, retryable", [
+    (api_error(429), True), (api_error(503), True), (api_error(400), False), (api_error(403), False),
+    (ConnectionError("reset"), True), (TimeoutError(), True), (ValueError("bad"), False),
+])
+def test_is_retryable(error, retryable):
+    assert is_retryable(error) == retryable
+
+def test_retryable_errors_are_retried_with_exponential_backoff(clock):
+    llm = scheduler(base_delay=1.0, max_delay=5.0, failure_threshold=10)
+    call, calls = failing(api_error(429), api_error(503), ConnectionError("reset"), TimeoutError())
+    analysis_info = {}
+
+    assert llm.call(call, analysis_info=analysis_info) == "ok"
+
+    assert len(calls) == 5
+    # Full jitter up to base_delay * 2 ** attempt, capped at max_delay
+    assert clock.sleeps == [2.0, 4.0, 5.0, 5.0]
+    assert analysis_info["llm_retries"] == 4
+    assert llm.stats()["retries"] == 4
+    assert llm.breaker.state == "closed"
+    assert llm.breaker.consecutive_failures == 0
+
+def test_gives_up_after_max_attempts(clock):
+    llm = scheduler(max_attempts=3, failure_threshold=10)
+    error = api_error(500)
+    call, calls = failing(error, error, error, error)
+
+    with pytest.raises(genai_errors.APIError):
+        llm.call(call)
+
+    assert len(calls) == 3
+    assert llm.stats()["failures"] == 1
+
+def test_client_errors_are_not_retried(clock):
+    llm = scheduler()
+    call, calls = failing(api_error(400))
+
+    with pytest.raises(genai_errors.APIError):
+        llm.call(call)
+
+    assert len(calls) == 1
+    assert clock.sleeps == []
+    assert llm.breaker.consecutive_failures == 0
+
+def test_async_calls_retry_like_sync_calls(clock):
+    llm = scheduler(base_delay=1.0, failure_threshold=10)
+    call, calls = failing(api_error(429))
+
+    async def attempt():
+        return call()
+
+    assert asyncio.run(llm.call_async(attempt)) == "ok"
+    assert len(calls) == 2
+    assert clock.sleeps == [2.0]
+
+def test_circuit_breaker_opens_probes_and_closes(clock):
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30)
+
+    breaker.record_failure()
+    assert breaker.state == "closed"
+    assert breaker.wait_time() == 0
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert breaker.wait_time() == 30
+
+    clock.now += 30
+    # One probe goes through; other callers keep waiting for its outcome
+    assert breaker.wait_time() == 0
+    assert breaker.state == "half_open"
+    assert breaker.wait_time() == llm_scheduler.PROBE_POLL_SECONDS
+
+    breaker.record_success()
+    assert breaker.state == "closed"
+    assert breaker.wait_time() == 0
+    assert breaker.times_opened == 1
+
+def test_a_failed_probe_reopens_the_circuit(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10)
+    breaker.record_failure()
+    clock.now += 10
+    assert breaker.wait_time() == 0
+
+    breaker.record_failure()
+
+    assert breaker.state == "open"
+    assert breaker.times_opened == 2
+    assert breaker.wait_time() == 10
+
+def test_a_released_probe_lets_the_next_caller_probe(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10)
+    breaker.record_failure()
+    clock.now += 10
+    assert breaker.wait_time() == 0
+
+    breaker.release()
+
+    assert breaker.state == "half_open"
+    assert breaker.wait_time() == 0
+
+def test_calls_are_parked_while_the_circuit_is_open(clock):
+    llm = scheduler(base_delay=1.0, failure_threshold=1, reset_timeout=30)
+    call, calls = failing(api_error(503))
+
+    assert llm.call(call) == "ok"
+
+    # The retry waits out the backoff, then the rest of the reset timeout, then probes
+    assert clock.sleeps == [2.0, 28.0]
+    assert len(calls) == 2
+    assert llm.stats()["circuit"] == "closed"
+    assert llm.stats()["circuit_opened"] == 1
+
+def test_parked_calls_give_up_after_max_park_seconds(clock):
+    llm = scheduler(failure_threshold=1, reset_timeout=10, max_park_seconds=60)
+    llm.breaker.record_failure()
+    clock.now += 10
+    assert llm.breaker.wait_time() == 0  # another caller's probe that never finishes
+
+    with pytest.raises(RuntimeError):
+        llm.call(lambda: "ok")
+    assert sum(clock.sleeps) == 60
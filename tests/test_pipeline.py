@@ -0,0 +1,137 @@
+"""Stages, callbacks and concurrency of the Pipeline."""
+
+import asyncio
+import threading
+import time
+
+import pytest
+
+from app.services.pipeline import Pipeline, Stage
+
+class Recorder:
+    def __init__(self):
+        self.results = {}
+        self.errors = []
+        self.done = []
+        self.lock = threading.Lock()
+
+    def on_result(self, tag, result):
+        with self.lock:
+            self.results[tag] = result
+
+    def on_error(self, tag, stage_name, error):
+        with self.lock:
+            self.errors.append((tag, stage_name, str(error)))
+
+    def on_done(self, tag):
+        with self.lock:
+            self.done.append(tag)
+
+    def pipeline(self, stages):
+        return Pipeline(stages, on_result=self.on_result, on_error=self.on_error, on_done=self.on_done)
+
+def double(item):
+    return item * 2
+
+def test_items_pass_through_every_stage():
+    recorder = Recorder()
+    pipeline = recorder.pipeline([Stage("double", double, workers=3), Stage("add", lambda item: item + 1)])
+
+    pipeline.run(range(20))
+
+    assert recorder.results == {item: item * 2 + 1 for item in range(20)}
+    assert sorted(recorder.done) == list(range(20))
+    stats = pipeline.stats()
+    assert stats["double"]["completed"] == 20
+    assert stats["add"]["completed"] == 20
+    assert stats["add"]["in_flight"] == 0
+
+def test_none_ends_an_item_early_and_errors_are_reported_with_the_stage():
+    recorder = Recorder()
+
+    def check(item):
+        if item == 3:
+            raise ValueError("bad item")
+        return None if item % 2 else item
+
+    pipeline = recorder.pipeline([Stage("check", check), Stage("double", double)])
+    pipeline.run(range(6))
+
+    assert recorder.results == {0: 0, 2: 4, 4: 8}
+    assert recorder.errors == [(3, "check", "bad item")]
+    # Every item leaves the pipeline exactly once, whatever happened to it
+    assert sorted(recorder.done) == list(range(6))
+    assert pipeline.stats()["check"]["failed"] == 1
+
+def test_async_stage_keeps_up_to_workers_items_in_flight():
+    recorder = Recorder()
+    in_flight = []
+    peak = []
+    loop_threads = set()
+
+    async def analyze(item):
+        loop_threads.add(threading.current_thread())
+        in_flight.append(item)
+        peak.append(len(in_flight))
+        await asyncio.sleep(0.02)
+        in_flight.remove(item)
+        if item == 10:  # the item tagged 5, doubled by extract
+            raise RuntimeError("analysis failed")
+        return item * 10
+
+    pipeline = recorder.pipeline([Stage("extract", double), Stage("analyze", analyze, workers=4),
+                                  Stage("render", lambda item: item + 1)])
+    pipeline.run(range(12))
+
+    assert max(peak) == 4
+    assert len(loop_threads) == 1
+    assert recorder.results == {item: item * 20 + 1 for item in range(12) if item != 5}
+    assert recorder.errors == [(5, "analyze", "analysis failed")]
+    assert sorted(recorder.done) == list(range(12))
+
+def test_a_full_queue_holds_back_the_stage_feeding_it():
+    release = threading.Event()
+    extracted = []
+
+    def extract(item):
+        extracted.append(item)
+        return item
+
+    def analyze(item):
+        release.wait()
+        return item
+
+    recorder = Recorder()
+    pipeline = recorder.pipeline([Stage("extract", extract), Stage("analyze", analyze, queue_size=2)])
+    pipeline.start()
+    feeder = threading.Thread(target=lambda: [pipeline.submit(item, tag=item) for item in range(10)])
+    feeder.start()
+
+    time.sleep(0.2)
+    # One item in analysis, two queued for it and one extracted item waiting to be queued
+    assert len(extracted) == 4
+    release.set()
+    feeder.join()
+    pipeline.close()
+    pipeline.join()
+    assert sorted(recorder.results) == list(range(10))
+
+def test_process_stage_runs_module_level_functions():
+    recorder = Recorder()
+    pipeline = recorder.pipeline([Stage("double", double, workers=2, use_processes=True)])
+
+    pipeline.run(range(5))
+
+    assert recorder.results == {item: item * 2 for item in range(5)}
+
+def test_closed_pipeline_rejects_items():
+    pipeline = Pipeline([Stage("double", double)]).start()
+    pipeline.close()
+
+    with pytest.raises(RuntimeError):
+        pipeline.submit(1)
+    pipeline.join()
+
+def test_a_pipeline_needs_stages():
+    with pytest.raises(ValueError):
+        Pipeline([])
@@ -0,0 +1,85 @@
+"""Resumable uploads through the API: offsets, size checks and finalizing."""
+
+import os
+import tempfile
+
+# The backend opens its job store on import; keep it out of the repository
+os.environ.setdefault("JOB_STORE_PATH", os.path.join(tempfile.mkdtemp(), "jobs.db"))
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+
+PDF = b"%PDF-1.4\n3 0 obj << /Type /Page >> endobj\n%%EOF\n"
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    partial_dir = tmp_path / "partial"
+    partial_dir.mkdir()
+    monkeypatch.setattr(main, "UPLOAD_DIR", str(tmp_path))
+    monkeypatch.setattr(main, "PARTIAL_UPLOAD_DIR", str(partial_dir))
+    return TestClient(main.app)
+
+def start_upload(client, size=len(PDF)):
+    response = client.post("/uploads/", json={"filename": "case.pdf", "size": size})
+    assert response.status_code == 200
+    return response.json()["upload_id"]
+
+def put_chunk(client, upload_id, offset, data):
+    return client.put(f"/uploads/{upload_id}", params={"offset": offset}, content=data)
+
+def test_chunks_append_at_the_reported_offset(client):
+    upload_id = start_upload(client)
+
+    assert put_chunk(client, upload_id, 0, PDF[:10]).json()["offset"] == 10
+    assert client.get(f"/uploads/{upload_id}").json()["offset"] == 10
+    assert put_chunk(client, upload_id, 10, PDF[10:]).json()["offset"] == len(PDF)
+
+def test_a_chunk_at_the_wrong_offset_is_refused(client):
+    upload_id = start_upload(client)
+    put_chunk(client, upload_id, 0, PDF[:10])
+
+    # A retried chunk the server already has, and one that skips ahead
+    for offset in (0, 20):
+        response = put_chunk(client, upload_id, offset, PDF[offset:offset + 10])
+        assert response.status_code == 409
+    assert client.get(f"/uploads/{upload_id}").json()["offset"] == 10
+
+def test_a_chunk_past_the_declared_size_is_refused(client):
+    upload_id = start_upload(client)
+    put_chunk(client, upload_id, 0, PDF[:10])
+
+    response = put_chunk(client, upload_id, 10, PDF[10:] + b"extra")
+
+    assert response.status_code == 413
+    assert client.get(f"/uploads/{upload_id}").json()["offset"] == 10
+
+def test_uploads_over_the_limit_are_refused_up_front(client, monkeypatch):
+    monkeypatch.setattr(main, "MAX_UPLOAD_BYTES", 100)
+
+    response = client.post("/uploads/", json={"filename": "case.pdf", "size": 101})
+
+    assert response.status_code == 413
+
+def test_only_a_complete_upload_is_finalized(client, tmp_path):
+    upload_id = start_upload(client)
+    put_chunk(client, upload_id, 0, PDF[:10])
+
+    assert client.post(f"/uploads/{upload_id}/finalize").status_code == 409
+
+    put_chunk(client, upload_id, 10, PDF[10:])
+    response = client.post(f"/uploads/{upload_id}/finalize")
+
+    assert response.status_code == 200
+    job_id = response.json()["job_id"]
+    assert main.get_job(job_id)["page_count"] == 1
+    assert (tmp_path / f"{upload_id}_case.pdf").read_bytes() == PDF
+    assert os.listdir(tmp_path / "partial") == []
+    # The upload is gone once finalized
+    assert client.post(f"/uploads/{upload_id}/finalize").status_code == 404
+    assert client.get(f"/uploads/{upload_id}").status_code == 404
+
+def test_unknown_uploads_are_not_found(client):
+    assert client.get("/uploads/not-an-id").status_code == 404
+    assert put_chunk(client, "8c4b5d3e-0000-4000-8000-000000000000", 0, b"x").status_code == 404
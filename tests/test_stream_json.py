@@ -0,0 +1,87 @@
+"""Incremental parsing of streamed JSON responses."""
+
+import json
+
+import pytest
+
+from app.services.stream_json import MAX_PREFIX_CHARS, IncrementalJSONParser, MalformedStreamError
+
+DOCUMENT = {
+    "summary": 'Customer said "it fails}" after the {upgrade], see C:\\logs',
+    "ratings": {"initial_response": {"score": 4, "comments": ["fast", "clear, friendly"]}},
+    "timeline": [[1, 2], {"at": "2024-03-12"}],
+    "resolved": True,
+}
+RESPONSE = "```json\n" + json.dumps(DOCUMENT, indent=2) + "\n```"
+
+def feed_in_chunks(parser, text, size):
+    completed = []
+    for start in range(0, len(text), size):
+        completed.extend(parser.feed(text[start:start + size]))
+    return completed
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 16, len(RESPONSE)])
+def test_members_split_across_chunks_are_decoded_once_complete(size):
+    parser = IncrementalJSONParser(strict=True)
+
+    completed = feed_in_chunks(parser, RESPONSE, size)
+
+    assert completed == list(DOCUMENT.items())
+    assert parser.fields == DOCUMENT
+    assert parser.complete
+    assert json.loads(parser.document) == DOCUMENT
+
+def test_every_split_point_gives_the_same_fields():
+    for split in range(len(RESPONSE) + 1):
+        parser = IncrementalJSONParser(strict=True)
+        completed = parser.feed(RESPONSE[:split]) + parser.feed(RESPONSE[split:])
+        assert completed == list(DOCUMENT.items()), split
+
+def test_a_member_is_reported_when_the_next_separator_arrives():
+    parser = IncrementalJSONParser()
+
+    assert parser.feed('{"summary": "a, b"') == []
+    assert parser.feed(', "ratings": {"x": 1}') == [("summary", "a, b")]
+    assert parser.feed("}") == [("ratings", {"x": 1})]
+    assert parser.complete
+
+def test_text_after_the_object_is_ignored():
+    parser = IncrementalJSONParser(strict=True)
+
+    assert parser.feed('{"a": 1}') == [("a", 1)]
+    assert parser.feed(' trailing, {"b": 2}') == []
+    assert parser.fields == {"a": 1}
+    assert parser.document == '{"a": 1}'
+
+def test_strict_mode_aborts_on_an_invalid_member():
+    parser = IncrementalJSONParser(strict=True)
+    parser.feed('{"a": 1, ')
+
+    with pytest.raises(MalformedStreamError):
+        parser.feed('"b": tru, "c": 3}')
+    assert parser.fields == {"a": 1}
+
+def test_lenient_mode_skips_an_invalid_member():
+    parser = IncrementalJSONParser()
+
+    completed = parser.feed('{"a": 1, "b": tru, "c": 3}')
+
+    assert completed == [("a", 1), ("c", 3)]
+    assert parser.complete
+    # The raw text stays available for the repair parsing after the stream
+    assert parser.document == '{"a": 1, "b": tru, "c": 3}'
+
+@pytest.mark.parametrize("strict", [True, False])
+def test_mismatched_brackets_abort_the_parse(strict):
+    parser = IncrementalJSONParser(strict=strict)
+
+    with pytest.raises(MalformedStreamError):
+        parser.feed('{"a": [1, 2}')
+
+def test_a_response_without_an_object_is_rejected():
+    parser = IncrementalJSONParser()
+    parser.feed("x" * MAX_PREFIX_CHARS)
+
+    with pytest.raises(MalformedStreamError):
+        parser.feed("x")
+    assert not parser.complete
@@ -0,0 +1,73 @@
+"""Checks, hashing and page counting of uploads as their chunks arrive."""
+
+import hashlib
+
+import pytest
+
+from app.services.upload_probe import UploadProbe, UploadRejected
+
+PDF = (b"%PDF-1.4\n1 0 obj << /Type /Catalog /Pages 2 0 R >> endobj\n"
+       b"2 0 obj << /Type /Pages /Kids [3 0 R 4 0 R 5 0 R] /Count 3 >> endobj\n"
+       b"3 0 obj << /Type /Page /Parent 2 0 R >> endobj\n"
+       b"4 0 obj << /Type/Page/Parent 2 0 R >> endobj\n"
+       b"5 0 obj << /Type     /Page\n/Parent 2 0 R >> endobj\n%%EOF")
+
+def probe_in_chunks(data, size, max_bytes=None):
+    probe = UploadProbe(max_bytes=max_bytes)
+    for start in range(0, len(data), size):
+        probe.feed(data[start:start + size])
+    probe.finish()
+    return probe
+
+@pytest.mark.parametrize("size", [1, 2, 5, 13, 64, len(PDF)])
+def test_pages_are_counted_whatever_the_chunk_size(size):
+    probe = probe_in_chunks(PDF, size)
+
+    assert probe.page_count == 3
+    assert probe.size == len(PDF)
+    assert probe.content_hash == hashlib.sha256(PDF).hexdigest()
+
+def test_markers_split_at_any_point_are_counted_once():
+    for split in range(1, len(PDF)):
+        probe = UploadProbe()
+        probe.feed(PDF[:split])
+        probe.feed(PDF[split:])
+        probe.finish()
+        assert probe.page_count == 3, split
+
+@pytest.mark.parametrize("size", [1, 3, 100])
+def test_a_marker_at_the_end_of_the_file_counts(size):
+    assert probe_in_chunks(b"%PDF-1.7 /Type /Page", size).page_count == 1
+    assert probe_in_chunks(b"%PDF-1.7 /Type /Pages", size).page_count is None
+
+def test_pdfs_without_page_objects_report_no_page_count():
+    # Page objects inside compressed object streams aren't visible in the raw bytes
+    assert probe_in_chunks(b"%PDF-1.5\nstream x\x9c\x03\x00 endstream", 4).page_count is None
+
+def test_uploads_over_the_limit_are_rejected_as_they_cross_it():
+    probe = UploadProbe(max_bytes=100)
+    probe.feed(b"%PDF-" + b"x" * 45)
+    probe.feed(b"x" * 50)
+
+    with pytest.raises(UploadRejected) as rejected:
+        probe.feed(b"x")
+    assert rejected.value.status_code == 413
+
+def test_files_that_are_not_pdfs_are_rejected_once_the_header_is_missed():
+    with pytest.raises(UploadRejected) as rejected:
+        UploadProbe().feed(b"PK\x03\x04" + b"x" * 1020)
+    assert rejected.value.status_code == 400
+
+    short = UploadProbe()
+    short.feed(b"PK\x03\x04 a small zip file")
+    with pytest.raises(UploadRejected):
+        short.finish()
+
+def test_the_header_may_follow_a_preamble_or_span_chunks():
+    # PDF readers accept the header anywhere in the first 1024 bytes
+    assert probe_in_chunks(b"\xef\xbb\xbf junk " * 50 + b"%PDF-1.4 /Type /Page ", 7).page_count == 1
+    assert probe_in_chunks(b"%PDF-1.4", 1).size == 8
+
+def test_empty_uploads_are_rejected():
+    with pytest.raises(UploadRejected):
+        UploadProbe().finish()
@@ -0,0 +1,82 @@
+"""Claim loop and graceful stop of the backend's job workers."""
+
+import os
+import tempfile
+import threading
+import time
+
+# The backend opens its job store on import; keep it out of the repository
+os.environ.setdefault("JOB_STORE_PATH", os.path.join(tempfile.mkdtemp(), "jobs.db"))
+
+import pytest
+
+import worker
+from app.services.job_store import SQLiteJobStore
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    store = SQLiteJobStore(str(tmp_path / "jobs.db"))
+    monkeypatch.setattr(worker, "JOB_STORE", store)
+    monkeypatch.setattr(worker, "JOB_POLL_SECONDS", 0.01)
+    return store
+
+def wait_until(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+def test_graceful_stop_releases_jobs_in_flight(store):
+    for job_id in ("a", "b"):
+        store.save(job_id, {"job_id": job_id, "status": "pending", "file_path": f"{job_id}.pdf"})
+    job_worker = worker.JobWorker("w1")
+    submitted = []
+    # Jobs submitted to the pipeline stay in flight until the worker stops
+    job_worker.pipeline.submit = lambda work, tag: submitted.append(tag)
+    thread = threading.Thread(target=job_worker.run, daemon=True)
+    thread.start()
+
+    wait_until(lambda: len(submitted) == 2)
+    assert store.get("a")["lease_owner"] == "w1"
+    job_worker.stop()
+    thread.join(timeout=5)
+
+    assert not thread.is_alive()
+    for job_id in ("a", "b"):
+        record = store.get(job_id)
+        assert record["status"] == "pending"
+        assert record["lease_owner"] is None
+        # The interrupted claim doesn't count towards JOB_MAX_ATTEMPTS
+        assert record["attempts"] == 0
+    assert store.claim_next("w2", 60) is not None
+
+def test_finished_jobs_free_their_slot(store):
+    store.save("a", {"job_id": "a", "status": "pending", "file_path": "a.pdf"})
+    job_worker = worker.JobWorker("w1")
+    job_worker._slots = threading.Semaphore(1)
+    submitted = []
+    job_worker.pipeline.submit = lambda work, tag: submitted.append(tag)
+    thread = threading.Thread(target=job_worker.run, daemon=True)
+    thread.start()
+
+    wait_until(lambda: submitted == ["a"])
+    store.save("b", {"job_id": "b", "status": "pending", "file_path": "b.pdf"})
+    time.sleep(0.1)
+    assert submitted == ["a"]  # no free slot while "a" is in flight
+
+    store.update("a", {"status": "completed", "lease_owner": None, "lease_expires": None})
+    job_worker._job_done("a")
+    wait_until(lambda: submitted == ["a", "b"])
+    job_worker.stop()
+    thread.join(timeout=5)
+    assert store.get("a")["status"] == "completed"
+
+def test_requeue_expired_jobs_fails_jobs_out_of_attempts(store, monkeypatch):
+    monkeypatch.setattr(worker, "JOB_MAX_ATTEMPTS", 1)
+    monkeypatch.setattr(worker, "publish_job_state", lambda job_id, event: store.append_event(job_id, event, {}))
+    store.save("a", {"job_id": "a", "status": "pending"})
+    store.claim_next("gone", -1)
+
+    assert worker.requeue_expired_jobs() == ([], ["a"])
+    assert store.get("a")["status"] == "failed"
+    assert [event for _, _, event, _ in store.events_after(0, job_id="a")] == ["failed"]